@@ -0,0 +1,294 @@
+import asyncio
+import contextlib
+import contextvars
+import io
+import json
+import threading
+import time
+import uuid
+import wave
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+class BudgetExceededError(Exception):
+    """Raised before a call when it would exceed a budget and no downgrade is allowed."""
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+def current_request_id() -> Optional[str]:
+    """Id of the request this task is serving, stamped on the usage it records."""
+    return _request_id.get()
+
+@contextlib.contextmanager
+def request_scope(request_id: Optional[str] = None) -> Iterator[str]:
+    """Attribute usage recorded inside the block to ``request_id`` (a new id by default).
+
+    A call shared by several requests (see SingleFlight) is attributed to
+    the request that started it; the others record a copy marked ``shared``.
+    """
+    token = _request_id.set(request_id or uuid.uuid4().hex)
+    try:
+        yield _request_id.get()
+    finally:
+        _request_id.reset(token)
+
+_collector: contextvars.ContextVar[Optional[List["UsageRecord"]]] = contextvars.ContextVar(
+    "usage_collector", default=None)
+
+@contextlib.contextmanager
+def collect_usage() -> Iterator[List["UsageRecord"]]:
+    """Also collect the usage recorded inside the block into the yielded list."""
+    records: List[UsageRecord] = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+@dataclass
+class UsageRecord:
+    """Usage of a single upstream request."""
+    model: str
+    kind: str  # transcription | chat | image | embedding
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    audio_seconds: float = 0.0
+    images: int = 0
+    request_id: Optional[str] = field(default_factory=current_request_id)
+    timestamp: float = field(default_factory=time.time)
+    shared: bool = False  # Copy for a request that joined another's call; not counted in totals
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+@dataclass
+class Budget:
+    """Usage limits for one model, or for every model when ``model`` is None.
+
+    ``max_*`` limits cap the ledger's running totals; ``max_request_tokens``
+    caps a single call. When a limit would be exceeded the call is moved to
+    ``downgrade_to`` if set, otherwise it is refused.
+    """
+    model: Optional[str] = None
+    max_tokens: Optional[int] = None
+    max_audio_seconds: Optional[float] = None
+    max_images: Optional[int] = None
+    max_request_tokens: Optional[int] = None
+    downgrade_to: Optional[str] = None
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+def wav_duration(audio_bytes: bytes) -> float:
+    """Duration in seconds of WAV data, or 0.0 if it isn't a readable WAV."""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), 'rb') as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return 0.0
+
+
+class Reservation:
+    """Estimated usage held against a ledger's budgets until the call's actual usage is recorded.
+
+    Leaving the ``with`` block without ``settle`` (e.g. the call failed)
+    releases the estimate.
+    """
+
+    def __init__(self, ledger: "UsageLedger", model: str, tokens: int, audio_seconds: float, images: int):
+        self.ledger = ledger
+        self.model = model
+        self.usage = {'prompt_tokens': tokens, 'audio_seconds': audio_seconds, 'images': images}
+        self.released = False
+
+    def settle(self, record: UsageRecord):
+        """Replace the estimate with the call's actual usage."""
+        self.release()
+        self.ledger.record(record)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            reserved = self.ledger._reserved[self.model]
+            for key, value in self.usage.items():
+                reserved[key] -= value
+
+    def __enter__(self) -> "Reservation":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class UsageLedger:
+    """In-memory usage aggregation with budget checks and periodic flush to a JSONL file.
+
+    Budgets count usage reserved by calls still in flight (see ``reserve``),
+    so concurrent calls cannot overshoot them together. Call ``aclose`` on
+    shutdown to write the records since the last flush.
+    """
+
+    def __init__(self, store_path: Optional[str] = None, budgets: Optional[List[Budget]] = None,
+                 flush_interval: float = 30.0):
+        self.store_path = Path(store_path) if store_path else None
+        self.budgets = list(budgets or [])
+        self.flush_interval = flush_interval
+        self._totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._reserved: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._pending: List[UsageRecord] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None
+        self._write_lock = threading.Lock()
+
+    def record(self, record: UsageRecord):
+        collector = _collector.get()
+        if collector is not None:
+            collector.append(record)
+        if not record.shared:
+            totals = self._totals[record.model]
+            totals['requests'] += 1
+            totals['prompt_tokens'] += record.prompt_tokens
+            totals['completion_tokens'] += record.completion_tokens
+            totals['audio_seconds'] += record.audio_seconds
+            totals['images'] += record.images
+        self._pending.append(record)
+        if self._flush_task is None and self.store_path:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return  # No event loop: records wait for flush() or aclose()
+            self.start_periodic_flush()
+
+    def by_model(self) -> Dict[str, Dict[str, float]]:
+        return {model: dict(totals) for model, totals in self._totals.items()}
+
+    def totals(self, model: Optional[str] = None) -> Dict[str, float]:
+        """Aggregated usage for one model, or summed over all models."""
+        combined: Dict[str, float] = defaultdict(float)
+        for name, totals in self._totals.items():
+            if model is None or name == model:
+                for key, value in totals.items():
+                    combined[key] += value
+        return dict(combined)
+
+    def reserve(self, model: str, tokens: int = 0, audio_seconds: float = 0.0, images: int = 0) -> Reservation:
+        """``check`` the call, then hold its estimated usage until it is settled or released.
+
+        The reservation's ``model`` is the one to call.
+        """
+        model = self.check(model, tokens, audio_seconds, images)
+        reservation = Reservation(self, model, tokens, audio_seconds, images)
+        reserved = self._reserved[model]
+        for key, value in reservation.usage.items():
+            reserved[key] += value
+        return reservation
+
+    def _committed(self, model: Optional[str]) -> Dict[str, float]:
+        """Recorded plus reserved usage for one model, or summed over all models."""
+        committed = defaultdict(float, self.totals(model))
+        for name, reserved in self._reserved.items():
+            if model is None or name == model:
+                for key, value in reserved.items():
+                    committed[key] += value
+        return committed
+
+    def check(self, model: str, tokens: int = 0, audio_seconds: float = 0.0, images: int = 0) -> str:
+        """Return the model to use for a call with the given estimated usage.
+
+        Raises BudgetExceededError if the call fits neither the requested
+        model's budgets nor any configured downgrade.
+        """
+        seen = set()
+        while True:
+            violated = self._violated_budget(model, tokens, audio_seconds, images)
+            if violated is None:
+                return model
+            seen.add(model)
+            if violated.downgrade_to and violated.downgrade_to not in seen:
+                print(f"Budget exceeded for {model}; downgrading to {violated.downgrade_to}")
+                model = violated.downgrade_to
+                continue
+            raise BudgetExceededError(
+                f"Request for {model} exceeds budget {violated.model or 'global'}: "
+                f"tokens={tokens}, audio_seconds={audio_seconds:.1f}, images={images}"
+            )
+
+    def _violated_budget(self, model: str, tokens: int, audio_seconds: float, images: int) -> Optional[Budget]:
+        for budget in self.budgets:
+            if budget.model is not None and budget.model != model:
+                continue
+            totals = self._committed(budget.model)
+            used_tokens = totals.get('prompt_tokens', 0) + totals.get('completion_tokens', 0)
+            if budget.max_request_tokens is not None and tokens > budget.max_request_tokens:
+                return budget
+            if budget.max_tokens is not None and tokens and used_tokens + tokens > budget.max_tokens:
+                return budget
+            if (budget.max_audio_seconds is not None and audio_seconds
+                    and totals.get('audio_seconds', 0) + audio_seconds > budget.max_audio_seconds):
+                return budget
+            if budget.max_images is not None and images and totals.get('images', 0) + images > budget.max_images:
+                return budget
+        return None
+
+    def flush(self) -> int:
+        """Append records collected since the last flush to the store. Returns the count written."""
+        if not self.store_path:
+            return 0
+        return self._write(self._take_pending())
+
+    def _take_pending(self) -> List[UsageRecord]:
+        # Called on the loop thread, where records are added, so none slip between read and reset
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _write(self, records: List[UsageRecord]) -> int:
+        if not records:
+            return 0
+        with self._write_lock:
+            self.store_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.store_path, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(asdict(record)) + "\n")
+        return len(records)
+
+    def start_periodic_flush(self):
+        """Flush every ``flush_interval`` seconds from a background task.
+
+        Started by the first record when the ledger has a store.
+        """
+        if self._flush_task is None and self.store_path:
+            self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._writing = loop.run_in_executor(None, self._write, self._take_pending())
+            await self._writing
+
+    async def aclose(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._writing is not None:
+            # A write already on a pool thread keeps running; let it land before the last records
+            await asyncio.wait([self._writing])
+            self._writing = None
+        self.flush()
+
+    @staticmethod
+    def load(store_path: str) -> List[Dict[str, Any]]:
+        """Read flushed records back for offline analysis."""
+        path = Path(store_path)
+        if not path.exists():
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
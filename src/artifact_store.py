@@ -0,0 +1,218 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    input_sha256 TEXT NOT NULL,
+    input_name TEXT,
+    transcription TEXT,
+    response_text TEXT,
+    image_prompt TEXT,
+    image_sha256 TEXT,
+    transcription_model TEXT,
+    chat_model TEXT,
+    image_model TEXT,
+    transcribe_seconds REAL,
+    respond_seconds REAL,
+    image_seconds REAL,
+    total_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at);
+CREATE INDEX IF NOT EXISTS runs_input ON runs (input_sha256, created_at);
+CREATE INDEX IF NOT EXISTS runs_transcription_model ON runs (transcription_model, created_at);
+CREATE INDEX IF NOT EXISTS runs_chat_model ON runs (chat_model, created_at);
+CREATE INDEX IF NOT EXISTS runs_image_model ON runs (image_model, created_at);
+"""
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@dataclass
+class RunRecord:
+    """One pipeline run: its input, outputs, the models used and per-stage seconds."""
+    input_sha256: str
+    input_name: Optional[str] = None
+    transcription: Optional[str] = None
+    response_text: Optional[str] = None
+    image_prompt: Optional[str] = None
+    image_sha256: Optional[str] = None
+    transcription_model: Optional[str] = None
+    chat_model: Optional[str] = None
+    image_model: Optional[str] = None
+    transcribe_seconds: Optional[float] = None
+    respond_seconds: Optional[float] = None
+    image_seconds: Optional[float] = None
+    total_seconds: Optional[float] = None
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = field(default_factory=time.time)
+
+_COLUMNS = list(RunRecord.__dataclass_fields__)
+
+
+class ArtifactStore:
+    """Run history in SQLite plus a content-addressed blob directory.
+
+    Blobs live at ``blobs/<first two hex digits>/<sha256>`` and are written
+    once, so identical images are stored once however many runs produce
+    them. All methods block; async callers run them on a worker thread.
+    """
+
+    def __init__(self, root: str = "output/store"):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "index.sqlite3"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def has_blob(self, digest: str) -> bool:
+        return self.blob_path(digest).exists()
+
+    def put_bytes(self, data: bytes) -> str:
+        """Store ``data`` if it isn't stored yet; returns its sha256."""
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.has_blob(digest):
+            self._write_blob(digest, lambda f: f.write(data))
+        return digest
+
+    def put_file(self, path: str) -> str:
+        """Store a copy of the file at ``path`` if it isn't stored yet; returns its sha256."""
+        digest = sha256_file(path)
+        if not self.has_blob(digest):
+            def _copy(f):
+                with open(path, 'rb') as source:
+                    shutil.copyfileobj(source, f, 1024 * 1024)
+            self._write_blob(digest, _copy)
+        return digest
+
+    def _write_blob(self, digest: str, write):
+        target = self.blob_path(digest)
+        target.parent.mkdir(exist_ok=True)
+        # Write under a unique name then rename, so readers never see half a blob
+        temp = target.with_name(f".{digest}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp, 'wb') as f:
+                write(f)
+            os.replace(temp, target)
+        finally:
+            temp.unlink(missing_ok=True)
+
+    def materialize(self, digest: str, destination: str) -> str:
+        """Copy the blob to ``destination``.
+
+        Always a copy, never a hard link: outputs get rewritten in place by
+        later runs, which would otherwise overwrite the stored blob.
+        """
+        source = self.blob_path(digest)
+        if not source.exists():
+            raise FileNotFoundError(f"Blob not found: {digest}")
+        destination_path = Path(destination)
+        destination_path.parent.mkdir(parents=True, exist_ok=True)
+        temp = destination_path.with_name(f".{destination_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(source, temp)
+            os.replace(temp, destination_path)
+        finally:
+            temp.unlink(missing_ok=True)
+        return destination
+
+    def record_run(self, run: RunRecord) -> str:
+        values = asdict(run)
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT INTO runs ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                [values[name] for name in _COLUMNS]
+            )
+        return run.run_id
+
+    def _select(self, where: str = "", params: tuple = (), limit: int = 100) -> List[RunRecord]:
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM runs {where} ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, params + (limit,)).fetchall()
+        return [RunRecord(**dict(row)) for row in rows]
+
+    def get_run(self, run_id: str) -> Optional[RunRecord]:
+        runs = self._select("WHERE run_id = ?", (run_id,), limit=1)
+        return runs[0] if runs else None
+
+    def find_by_input(self, input_sha256: str, transcription_model: Optional[str] = None,
+                      chat_model: Optional[str] = None, image_model: Optional[str] = None,
+                      limit: int = 1) -> List[RunRecord]:
+        """Latest runs for an input, optionally only those produced by the given models."""
+        clauses = ["input_sha256 = ?"]
+        params: List[Any] = [input_sha256]
+        for column, value in (("transcription_model", transcription_model),
+                              ("chat_model", chat_model), ("image_model", image_model)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return self._select("WHERE " + " AND ".join(clauses), tuple(params), limit)
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              model: Optional[str] = None, limit: int = 100) -> List[RunRecord]:
+        """Runs in ``[since, until)`` (epoch seconds), newest first; ``model`` matches any stage."""
+        clauses, params = self._time_range(since, until)
+        if model is not None:
+            clauses.append("(transcription_model = ? OR chat_model = ? OR image_model = ?)")
+            params += [model, model, model]
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        return self._select(where, tuple(params), limit)
+
+    def latency_by_day(self, since: Optional[float] = None,
+                       until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Run count and mean seconds per stage, grouped by UTC day and chat model."""
+        clauses, params = self._time_range(since, until)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        sql = f"""
+            SELECT date(created_at, 'unixepoch') AS day, chat_model, COUNT(*) AS runs,
+                   AVG(transcribe_seconds) AS transcribe_seconds,
+                   AVG(respond_seconds) AS respond_seconds,
+                   AVG(image_seconds) AS image_seconds,
+                   AVG(total_seconds) AS total_seconds
+            FROM runs {where}
+            GROUP BY day, chat_model ORDER BY day, chat_model
+        """
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, tuple(params)).fetchall()]
+
+    @staticmethod
+    def _time_range(since: Optional[float], until: Optional[float]):
+        clauses: List[str] = []
+        params: List[Any] = []
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        return clauses, params
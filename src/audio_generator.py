@@ -0,0 +1,131 @@
+import argparse
+import random
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+@dataclass
+class SignalConfig:
+    """Parameters for a synthetic speech-like test signal."""
+    duration: float = 2.0
+    sample_rate: int = 16000
+    channels: int = 1
+    pitch: float = 120.0  # Fundamental frequency of the voiced source (Hz)
+    formants: Sequence[float] = (500.0, 1500.0, 2500.0)  # Vocal tract resonances (Hz)
+    formant_bandwidth: float = 120.0
+    syllable_rate: float = 4.0  # Amplitude envelope cycles per second
+    noise_level: float = 0.02
+    silence_every: float = 0.0  # Insert a silence gap every N seconds (0 disables)
+    silence_length: float = 0.3
+    amplitude: float = 0.8
+    block_seconds: float = 1.0
+    seed: Optional[int] = None
+
+def _harmonic_weights(config: SignalConfig) -> Tuple[np.ndarray, np.ndarray]:
+    """Harmonics of the pitch below Nyquist, weighted by Gaussian formant resonances."""
+    nyquist = config.sample_rate / 2
+    harmonics = np.arange(config.pitch, min(nyquist, 4000.0), config.pitch)
+    if len(harmonics) == 0:
+        harmonics = np.array([min(config.pitch, nyquist / 2)])
+
+    formants = np.asarray(config.formants, dtype=np.float64)
+    if len(formants):
+        distance = (harmonics[:, None] - formants[None, :]) / config.formant_bandwidth
+        weights = np.exp(-0.5 * distance ** 2).sum(axis=1) + 1e-3
+    else:
+        weights = np.ones_like(harmonics)
+
+    # Scale so the mixture can never exceed 1.0 before the envelope is applied
+    return harmonics, weights / weights.sum()
+
+def generate_blocks(config: SignalConfig) -> Iterator[np.ndarray]:
+    """Yield int16 PCM blocks shaped (frames, channels) without holding the whole signal."""
+    rng = np.random.default_rng(config.seed)
+    harmonics, weights = _harmonic_weights(config)
+    total = int(config.duration * config.sample_rate)
+    block = max(1, int(config.block_seconds * config.sample_rate))
+    two_pi = 2 * np.pi
+
+    for start in range(0, total, block):
+        n = min(block, total - start)
+        t = (start + np.arange(n)) / config.sample_rate
+
+        # All harmonics at once: (harmonics, frames) phase matrix collapsed by the weights
+        voiced = weights @ np.sin(two_pi * harmonics[:, None] * t[None, :])
+        envelope = 0.5 * (1 - np.cos(two_pi * config.syllable_rate * t))
+        signal = voiced * envelope
+
+        if config.silence_every > 0:
+            in_gap = np.mod(t, config.silence_every) >= config.silence_every - config.silence_length
+            signal[in_gap] = 0.0
+
+        frames = np.repeat(signal[:, None], config.channels, axis=1)
+        if config.noise_level > 0:
+            frames += config.noise_level * rng.standard_normal(frames.shape)
+
+        frames = np.clip(frames * config.amplitude, -1.0, 1.0)
+        yield (frames * 32767).astype(np.int16)
+
+def write_wav_stream(filename: str, config: SignalConfig) -> str:
+    """Write the signal to a 16-bit WAV file one block at a time."""
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(config.channels)
+        wav.setsampwidth(2)  # 2 bytes per sample (16-bit)
+        wav.setframerate(config.sample_rate)
+        for block in generate_blocks(config):
+            wav.writeframes(block.tobytes())
+    return filename
+
+def corpus_configs(count: int, base: Optional[SignalConfig] = None, seed: int = 0) -> List[SignalConfig]:
+    """Build a reproducible set of varied configs (rates, channels, pitch, gaps)."""
+    base = base or SignalConfig()
+    rng = random.Random(seed)
+    configs = []
+    for i in range(count):
+        configs.append(replace(
+            base,
+            sample_rate=rng.choice([8000, 16000, 22050, 44100]),
+            channels=rng.choice([1, 1, 2]),
+            pitch=rng.uniform(85.0, 255.0),
+            formants=tuple(f * rng.uniform(0.85, 1.15) for f in base.formants),
+            syllable_rate=rng.uniform(2.5, 6.0),
+            noise_level=rng.uniform(0.0, 0.05),
+            silence_every=rng.choice([0.0, 1.5, 3.0]),
+            seed=seed + i,
+        ))
+    return configs
+
+def _write_corpus_item(args: Tuple[str, SignalConfig]) -> str:
+    filename, config = args
+    return write_wav_stream(filename, config)
+
+def create_corpus(output_dir: str, configs: Sequence[SignalConfig],
+                  max_workers: Optional[int] = None, prefix: str = "clip") -> List[str]:
+    """Fabricate one WAV per config across worker processes."""
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    jobs = [(str(output / f"{prefix}_{i:05d}.wav"), config) for i, config in enumerate(configs)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        files = list(executor.map(_write_corpus_item, jobs, chunksize=max(1, len(jobs) // 64)))
+
+    print(f"Created {len(files)} test audio files in: {output}")
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic speech-like WAV files for load tests")
+    parser.add_argument("--output-dir", default="output/corpus")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    configs = corpus_configs(args.count, SignalConfig(duration=args.duration), seed=args.seed)
+    create_corpus(args.output_dir, configs, max_workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import io
+import wave
+from typing import Iterator, NamedTuple
+
+class WavInfo(NamedTuple):
+    channels: int
+    sample_width: int
+    frame_rate: int
+    frames: int
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.channels * self.sample_width
+
+    @property
+    def duration(self) -> float:
+        return self.frames / float(self.frame_rate)
+
+class AudioWindow(NamedTuple):
+    index: int
+    start: float  # seconds
+    end: float
+    pcm: bytes  # raw frames, no header
+
+def read_wav(audio_bytes: bytes):
+    """Parse WAV data into its parameters and raw PCM frames."""
+    with wave.open(io.BytesIO(audio_bytes), 'rb') as wav_file:
+        info = WavInfo(wav_file.getnchannels(), wav_file.getsampwidth(),
+                       wav_file.getframerate(), wav_file.getnframes())
+        return info, wav_file.readframes(info.frames)
+
+def encode_wav(info: WavInfo, pcm: bytes) -> bytes:
+    """Wrap raw frames in a WAV header with the given parameters."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(info.channels)
+        wav_file.setsampwidth(info.sample_width)
+        wav_file.setframerate(info.frame_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+def slice_wav(audio_bytes: bytes, start: float, end: float) -> bytes:
+    """WAV data for the [start, end) seconds of the input."""
+    info, pcm = read_wav(audio_bytes)
+    first = int(start * info.frame_rate) * info.frame_bytes
+    last = int(end * info.frame_rate) * info.frame_bytes
+    return encode_wav(info, pcm[first:last])
+
+def iter_windows(info: WavInfo, pcm: bytes, window_seconds: float) -> Iterator[AudioWindow]:
+    """Fixed-size windows over raw frames; the last window may be shorter."""
+    frames_per_window = max(1, int(window_seconds * info.frame_rate))
+    step = frames_per_window * info.frame_bytes
+    for index, offset in enumerate(range(0, len(pcm), step)):
+        first_frame = offset // info.frame_bytes
+        chunk = pcm[offset:offset + step]
+        yield AudioWindow(
+            index,
+            first_frame / info.frame_rate,
+            (first_frame + len(chunk) // info.frame_bytes) / info.frame_rate,
+            chunk,
+        )
@@ -0,0 +1,166 @@
+import asyncio
+import sys
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit open for {name}; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Whether an error says the backend is unhealthy, as opposed to a bad or refused request.
+
+    Connection errors, timeouts, 5xx and 404 (route or model not deployed)
+    count; other 4xx responses and local errors don't.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status in (404, 408)
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, openai.APIConnectionError)
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures, or when the
+    failure rate over the last ``window_size`` calls reaches ``error_rate``
+    (given at least ``min_calls``). Open fails fast for ``reset_timeout``
+    seconds, then half-open lets ``half_open_calls`` trial requests through:
+    one success closes the circuit, a failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        error_rate: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 10,
+        reset_timeout: float = 30.0,
+        half_open_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = is_backend_failure
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.outcomes = deque(maxlen=window_size)  # True for failure
+        self.opened_at = 0.0
+        self.trials = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        """Admit a call or raise CircuitOpenError; every admitted call must be reported back."""
+        if self.state == OPEN:
+            if self._retry_after() > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self._retry_after())
+            self.state = HALF_OPEN
+            self.trials = 0
+        if self.state == HALF_OPEN:
+            if self.trials >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self.trials += 1
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.outcomes.append(False)
+        if self.state == HALF_OPEN:
+            print(f"Circuit closed for {self.name}")
+            self.state = CLOSED
+            self.outcomes.clear()
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.outcomes.append(True)
+        failures = sum(self.outcomes)
+        if (self.state == HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+                or (len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate)):
+            self._open()
+
+    def record_ignored(self):
+        """The call ended without saying anything about the backend (cancelled or a client error)."""
+        if self.state == HALF_OPEN:
+            self.trials = max(0, self.trials - 1)
+
+    def _open(self):
+        if self.state != OPEN:
+            print(f"Circuit opened for {self.name} after {self.consecutive_failures} consecutive failure(s)")
+            self.times_opened += 1
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trials = 0
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        self.allow()
+        try:
+            result = await fn()
+        except BaseException as e:
+            if isinstance(e, Exception) and self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_ignored()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'recent_error_rate': round(sum(self.outcomes) / len(self.outcomes), 3) if self.outcomes else 0.0,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+        }
+
+class CircuitBreakerRegistry:
+    """One breaker per (base URL, route, model), created on first use with shared settings."""
+
+    def __init__(self, **settings: Any):
+        self.settings = settings
+        self._breakers: Dict[Tuple[str, str, str], CircuitBreaker] = {}
+
+    def get(self, base_url: str, route: str, model: str) -> CircuitBreaker:
+        key = (base_url, route, model)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(f"{route} ({model}) at {base_url}", **self.settings)
+            self._breakers[key] = breaker
+        return breaker
+
+    def is_open(self, base_url: str, route: str, model: str) -> bool:
+        breaker = self._breakers.get((base_url, route, model))
+        return breaker is not None and breaker.state == OPEN and breaker._retry_after() > 0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {f"{route}|{model}|{base_url}": breaker.snapshot()
+                for (base_url, route, model), breaker in self._breakers.items()}
+
+    def items(self):
+        return self._breakers.items()
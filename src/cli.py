@@ -0,0 +1,407 @@
+"""Command line entry point for the multi-modal agent.
+
+Only argparse is imported at module load; the agent, dotenv and the HTTP
+stack are imported inside each subcommand so ``--help`` and cheap commands
+start quickly when run as short-lived jobs.
+"""
+import argparse
+import json
+import os
+import sys
+
+DEFAULT_BASE_URL = "https://aips-ai-gateway.ue1.dev.ai-platform.int.wexfabric.com"
+
+def load_api_key(env_var: str = "API_KEY") -> str:
+    from dotenv import load_dotenv
+
+    # Load environment variables
+    load_dotenv()
+    api_key = os.getenv(env_var)
+    if not api_key:
+        raise ValueError(f"Please set {env_var} in your .env file")
+    return api_key
+
+def load_credentials(args):
+    """The API key, and a key pool when ``--api-keys-env`` names a set variable."""
+    from dotenv import load_dotenv
+    from key_pool import KeyPool
+
+    load_dotenv()
+    key_pool = KeyPool.from_env(args.api_keys_env) if args.api_keys_env else None
+    if key_pool is not None:
+        return os.getenv(args.api_key_env) or key_pool.primary, key_pool
+    return load_api_key(args.api_key_env), None
+
+BUDGET_LIMITS = {'max_tokens': int, 'max_audio_seconds': float, 'max_images': int,
+                 'max_request_tokens': int, 'downgrade_to': str}
+
+def parse_budget(value: str):
+    """A Budget from ``[model:]limit=value,...``; without a model it caps all models together.
+
+    e.g. ``azure-gpt-4o:max_tokens=200000,downgrade_to=azure-gpt-4o-mini``
+    """
+    from accounting import Budget
+
+    split = value.split("=", 1)[0].rfind(":")  # The model is whatever precedes the first limit
+    model, limits = value[:max(split, 0)], value[split + 1:]
+    kwargs = {}
+    for item in filter(None, limits.split(",")):
+        name, _, raw = item.partition("=")
+        name = name.strip()
+        if name not in BUDGET_LIMITS or not raw:
+            raise argparse.ArgumentTypeError(
+                f"Bad budget limit {item!r}; expected one of {', '.join(BUDGET_LIMITS)} as name=value")
+        try:
+            kwargs[name] = BUDGET_LIMITS[name](raw.strip())
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bad value for {name}: {raw!r}")
+    if not kwargs:
+        raise argparse.ArgumentTypeError(f"Budget {value!r} sets no limits")
+    return Budget(model=model or None, **kwargs)
+
+def make_ledger(args):
+    """A usage ledger for ``--usage-log`` and ``--budget``, or None for the agent's default."""
+    if not getattr(args, "usage_log", None) and not getattr(args, "budget", None):
+        return None
+    from accounting import UsageLedger
+    return UsageLedger(args.usage_log, budgets=args.budget)
+
+def make_agent(args):
+    from multi_modal_agent import MultiModalAgent
+    store = None
+    if getattr(args, "store", None):
+        from artifact_store import ArtifactStore
+        store = ArtifactStore(args.store)
+    vector_index = None
+    if getattr(args, "index", None):
+        from vector_index import VectorIndex
+        vector_index = VectorIndex(args.index)
+    window_cache = None
+    if getattr(args, "window_cache", None):
+        from window_cache import WindowCache
+        window_cache = WindowCache(args.window_cache)
+    memory_profiler = None
+    if getattr(args, "memory_log", None):
+        from memory_profile import MemoryProfiler
+        memory_profiler = MemoryProfiler(args.memory_log)
+    cpu_profiler = None
+    if getattr(args, "profile_dir", None):
+        from cpu_profile import CpuProfiler
+        cpu_profiler = CpuProfiler(args.profile_dir, sample_rate=args.profile_rate, mode=args.profiler)
+    api_key, key_pool = load_credentials(args)
+    return MultiModalAgent(api_key, args.base_url, key_pool=key_pool, ledger=make_ledger(args),
+                           memory_profiler=memory_profiler, cpu_profiler=cpu_profiler,
+                           store=store, vector_index=vector_index,
+                           window_seconds=getattr(args, "window_seconds", None),
+                           window_cache=window_cache)
+
+def run_with_agent(args, action):
+    """Run ``action(agent)`` on a fresh agent and close it afterwards."""
+    import asyncio
+
+    async def _run():
+        agent = make_agent(args)
+        try:
+            return await action(agent)
+        finally:
+            await agent.close()
+
+    return asyncio.run(_run())
+
+def cmd_transcribe(args):
+    if not args.timestamps:
+        return run_with_agent(args, lambda agent: agent.transcribe_audio(args.audio))
+
+    async def _timestamps(agent):
+        with open(args.audio, "rb") as f:
+            audio_bytes = f.read()
+        index = await agent.transcribe_timestamps(audio_bytes, granularity=args.timestamps)
+        if args.index_out:
+            index.save(args.index_out)
+        return index.to_dict()
+    return run_with_agent(args, _timestamps)
+
+def cmd_transcript(args):
+    from transcript_index import TranscriptIndex
+
+    index = TranscriptIndex.load(args.index)
+    if args.at is not None:
+        segment = index.at(args.at)
+        return segment._asdict() if segment else None
+    if args.search:
+        return index.search(args.search, case_sensitive=args.case_sensitive)
+    return index.to_dict()
+
+def cmd_respond(args):
+    return run_with_agent(args, lambda agent: agent.generate_response(args.text))
+
+def cmd_image(args):
+    from pathlib import Path
+
+    async def _image(agent):
+        return await agent.generate_images(args.prompt, Path(args.output_dir), n=args.n,
+                                           sizes=args.size, name=args.name)
+    return run_with_agent(args, _image)
+
+def cmd_pipeline(args):
+    from pathlib import Path
+    return run_with_agent(args, lambda agent: agent.process_input(
+        args.audio, Path(args.output_dir), reuse=not args.no_reuse, deadline=args.deadline
+    ))
+
+def cmd_search(args):
+    return run_with_agent(args, lambda agent: agent.search_transcripts(
+        args.query, k=args.k, exact=not args.approximate
+    ))
+
+def expand_inputs(paths):
+    """Audio files named directly, plus the ``*.wav`` files of any directories, in a stable order."""
+    from pathlib import Path
+    files = []
+    for path in paths:
+        if Path(path).is_dir():
+            files.extend(str(p) for p in sorted(Path(path).glob("*.wav")))
+        else:
+            files.append(path)
+    return files
+
+def cmd_batch(args):
+    if args.processes > 1:
+        return run_local_workers(args)
+    from sharded_batch import ShardRunner, claim_shard
+
+    inputs = expand_inputs(args.inputs)
+
+    async def _batch(agent):
+        manifests = []
+        while True:
+            if args.shard == "auto":
+                shard = claim_shard(args.root, args.shards, stale_after=args.stale_after)
+                if shard is None:
+                    return manifests
+            else:
+                shard = int(args.shard)
+            runner = ShardRunner(agent, args.root, shard, args.shards, concurrency=args.concurrency,
+                                 reuse=not args.no_reuse, deadline=args.deadline)
+            manifest = await runner.run(inputs)
+            manifests.append({k: v for k, v in manifest.items() if k != 'inputs'})
+            if args.shard != "auto":
+                return manifests
+    return run_with_agent(args, _batch)
+
+def run_local_workers(args):
+    """Start ``--processes`` copies of this batch command on this host, each claiming shards until none are left."""
+    import subprocess
+    from sharded_batch import merge_shards
+
+    argv, skip = [], False
+    for arg in args.argv:
+        if skip:
+            skip = False
+        elif arg == "--processes":
+            skip = True
+        elif not arg.startswith("--processes="):
+            argv.append(arg)
+    command = [sys.executable, os.path.abspath(__file__), *argv, "--shard", "auto"]
+    workers = [subprocess.Popen(command) for _ in range(args.processes)]
+    codes = [worker.wait() for worker in workers]
+    report = merge_shards(args.root, args.shards, stale_after=args.stale_after)
+    report['worker_exit_codes'] = codes
+    return report
+
+def cmd_merge(args):
+    from sharded_batch import merge_shards
+    report = merge_shards(args.root, args.shards, stale_after=args.stale_after)
+    if not args.verbose:
+        report.pop('shard_reports')
+    return report
+
+def cmd_memory_report(args):
+    from memory_profile import memory_report
+    return memory_report(args.log, top=args.top)
+
+def cmd_profile(args):
+    from cpu_profile import render_profile
+    print(render_profile(args.path, top=args.top, threads=args.thread))
+
+def parse_date(value: str) -> float:
+    """Epoch seconds for an ISO date or datetime (UTC when no offset is given)."""
+    from datetime import datetime, timezone
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def cmd_runs(args):
+    from dataclasses import asdict
+    from artifact_store import ArtifactStore
+
+    since = parse_date(args.since) if args.since else None
+    until = parse_date(args.until) if args.until else None
+    with ArtifactStore(args.store) as store:
+        if args.latency:
+            return store.latency_by_day(since, until)
+        if args.input_hash:
+            runs = store.find_by_input(args.input_hash, limit=args.limit)
+        else:
+            runs = store.query(since, until, model=args.model, limit=args.limit)
+        return [asdict(run) for run in runs]
+
+def cmd_models(args):
+    return run_with_agent(args, lambda agent: agent.list_models())
+
+def cmd_serve(args):
+    from service import create_app, serve
+    api_key, key_pool = load_credentials(args)
+    app = create_app(api_key, args.base_url, key_pool=key_pool, ledger=make_ledger(args),
+                     max_inflight=args.max_inflight, max_queue=args.max_queue,
+                     output_dir=args.output_dir, request_timeout=args.request_timeout,
+                     max_upstream=args.max_upstream)
+    serve(app, host=args.host, port=args.port)
+
+def add_profile_arguments(parser: argparse.ArgumentParser, default_rate: float):
+    parser.add_argument("--memory-log", help="Trace allocations per stage and append them to this JSON lines file")
+    parser.add_argument("--profile-dir", help="Write CPU profiles of sampled requests here")
+    parser.add_argument("--profile-rate", type=float, default=default_rate,
+                        help=f"Fraction of requests to profile (default: {default_rate})")
+    parser.add_argument("--profiler", choices=["sampler", "cprofile"], default="sampler",
+                        help="Stack sampler (collapsed stacks for flame graphs) or cProfile (.prof)")
+
+def add_window_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--window-seconds", type=float,
+                        help="Transcribe long audio in windows of this length, re-sending only changed windows")
+    parser.add_argument("--window-cache", help="JSON file keeping window transcriptions between runs")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="WEX AI Platform multi-modal agent")
+    parser.add_argument("--base-url", default=os.getenv("BASE_URL", DEFAULT_BASE_URL))
+    parser.add_argument("--api-key-env", default="API_KEY",
+                        help="Environment variable holding the API key (default: API_KEY)")
+    parser.add_argument("--api-keys-env", default="API_KEYS",
+                        help="Environment variable with comma-separated keys to rotate between (default: API_KEYS)")
+    parser.add_argument("--usage-log", help="Append usage records (tokens, audio seconds, images) to this JSON lines file")
+    parser.add_argument("--budget", action="append", type=parse_budget, default=[],
+                        help="Usage limit, repeatable: [model:]max_tokens=N,max_audio_seconds=S,max_images=N,"
+                             "max_request_tokens=N,downgrade_to=MODEL")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    transcribe = subparsers.add_parser("transcribe", help="Transcribe an audio file")
+    transcribe.add_argument("audio")
+    add_window_arguments(transcribe)
+    transcribe.add_argument("--timestamps", choices=["segment", "word"],
+                            help="Return segment or word timestamps (verbose_json)")
+    transcribe.add_argument("--index-out", help="Save the timestamped transcript as an index file")
+    transcribe.set_defaults(func=cmd_transcribe)
+
+    transcript = subparsers.add_parser("transcript", help="Query a saved transcript index")
+    transcript.add_argument("index")
+    transcript.add_argument("--at", type=float, help="Segment spoken at this many seconds")
+    transcript.add_argument("--search", help="Find where a phrase was said")
+    transcript.add_argument("--case-sensitive", action="store_true")
+    transcript.set_defaults(func=cmd_transcript)
+
+    respond = subparsers.add_parser("respond", help="Generate a JSON response and image prompt for text")
+    respond.add_argument("text")
+    respond.set_defaults(func=cmd_respond)
+
+    image = subparsers.add_parser("image", help="Generate images for a prompt")
+    image.add_argument("prompt")
+    image.add_argument("--output-dir", default="output")
+    image.add_argument("--name", default="image")
+    image.add_argument("--n", type=int, default=1)
+    image.add_argument("--size", action="append", help="Image size, repeatable (default: 1024x1024)")
+    image.set_defaults(func=cmd_image)
+
+    pipeline = subparsers.add_parser("pipeline", help="Transcribe, respond and generate an image")
+    pipeline.add_argument("audio")
+    pipeline.add_argument("--output-dir", default="output")
+    add_window_arguments(pipeline)
+    pipeline.add_argument("--store", help="Artifact store directory to record runs in (e.g. output/store)")
+    pipeline.add_argument("--deadline", type=float, help="Give up after this many seconds overall")
+    pipeline.add_argument("--index", help="Vector index directory of past transcripts (e.g. output/index)")
+    pipeline.add_argument("--no-reuse", action="store_true",
+                          help="Always call the gateway, even for audio or transcripts seen before")
+    add_profile_arguments(pipeline, default_rate=1.0)
+    pipeline.set_defaults(func=cmd_pipeline)
+
+    search = subparsers.add_parser("search", help="Find past transcripts similar to a query")
+    search.add_argument("query")
+    search.add_argument("--index", default="output/index")
+    search.add_argument("--k", type=int, default=5)
+    search.add_argument("--approximate", action="store_true", help="Signature pre-filter instead of a full scan")
+    search.set_defaults(func=cmd_search)
+
+    runs = subparsers.add_parser("runs", help="Query recorded pipeline runs")
+    runs.add_argument("--store", default="output/store")
+    runs.add_argument("--since", help="ISO date or datetime, inclusive")
+    runs.add_argument("--until", help="ISO date or datetime, exclusive")
+    runs.add_argument("--model", help="Only runs that used this model in any stage")
+    runs.add_argument("--input-hash", help="Only runs on audio with this sha256")
+    runs.add_argument("--limit", type=int, default=20)
+    runs.add_argument("--latency", action="store_true", help="Mean stage seconds per day and chat model")
+    runs.set_defaults(func=cmd_runs)
+
+    batch = subparsers.add_parser("batch", help="Run one or more shards of a batch (hosts share --root)")
+    batch.add_argument("inputs", nargs="+", help="Audio files or directories of .wav files; same list on every host")
+    batch.add_argument("--root", default="output/batch", help="Shared directory for shard manifests and outputs")
+    batch.add_argument("--shards", type=int, required=True, help="Total number of shards")
+    batch.add_argument("--shard", default="auto",
+                       help="Shard index to run, or 'auto' to claim unowned or stalled shards until none are left")
+    batch.add_argument("--processes", type=int, default=1, help="Local worker processes to start, then merge")
+    batch.add_argument("--concurrency", type=int, default=4, help="Inputs in flight per worker and usable API key")
+    batch.add_argument("--stale-after", type=float, default=300.0,
+                       help="Seconds without a heartbeat before a shard counts as stalled")
+    batch.add_argument("--deadline", type=float, help="Give up on an input after this many seconds")
+    batch.add_argument("--no-reuse", action="store_true")
+    add_profile_arguments(batch, default_rate=0.01)
+    batch.set_defaults(func=cmd_batch)
+
+    merge = subparsers.add_parser("merge", help="Combine shard results and report stragglers")
+    merge.add_argument("--root", default="output/batch")
+    merge.add_argument("--shards", type=int, help="Expected shard count (default: as found on disk)")
+    merge.add_argument("--stale-after", type=float, default=300.0)
+    merge.add_argument("--verbose", action="store_true", help="Include every shard's report")
+    merge.set_defaults(func=cmd_merge)
+
+    memory = subparsers.add_parser("memory-report", help="Which stages and source lines drive memory growth")
+    memory.add_argument("--log", default="output/memory.jsonl", help="File written with --memory-log")
+    memory.add_argument("--top", type=int, default=10, help="Allocation sites to list")
+    memory.set_defaults(func=cmd_memory_report)
+
+    profile = subparsers.add_parser("profile", help="Print collapsed stacks (or a pstats summary) of CPU profiles")
+    profile.add_argument("path", help="A .collapsed or .prof file, or a directory of .collapsed files to merge")
+    profile.add_argument("--thread", help="Only stacks of threads whose name starts with this (e.g. MainThread)")
+    profile.add_argument("--top", type=int, default=20, help="Functions to list for .prof files")
+    profile.set_defaults(func=cmd_profile)
+
+    models = subparsers.add_parser("models", help="List available models")
+    models.set_defaults(func=cmd_models)
+
+    serve = subparsers.add_parser("serve", help="Run the HTTP service (requires uvicorn)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--max-inflight", type=int, default=16)
+    serve.add_argument("--max-queue", type=int, default=64)
+    serve.add_argument("--output-dir", default="output/service")
+    serve.add_argument("--max-upstream", type=int,
+                       help="Concurrent gateway calls, shared between interactive and batch (x-priority) requests")
+    serve.add_argument("--request-timeout", type=float,
+                       help="Longest any request may run, in seconds; clients may ask for less")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    args.argv = list(argv) if argv is not None else sys.argv[1:]
+    try:
+        result = args.func(args)
+    except Exception as e:
+        print(f"Error: {type(e).__name__}: {str(e)}", file=sys.stderr)
+        return 1
+    if result is not None:
+        print(json.dumps(result, indent=2, default=str))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Sampled CPU profiles of individual pipeline requests.
+
+A ``CpuProfiler`` picks roughly ``sample_rate`` of requests and profiles
+each of them, writing one file per request:
+
+- ``sampler`` (default): a background thread records every thread's
+  stack every ``interval`` seconds and writes collapsed stacks
+  (``frame;frame;frame count`` lines), ready for flamegraph.pl,
+  speedscope or inferno. Time the event loop spends waiting for
+  responses shows up as its selector ``select``/``poll`` frame.
+- ``cprofile``: deterministic cProfile output (``.prof``) for pstats or
+  snakeviz. Only one such profile can run at a time; requests sampled
+  while one is running are not profiled.
+
+Both see the whole process, so requests running alongside a profiled one
+show up in its profile too. Requests that aren't sampled only pay for a
+random draw.
+"""
+import contextlib
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+SAMPLER = "sampler"
+CPROFILE = "cprofile"
+
+# Leaf frames of threads parked waiting for work; left out of top frames
+IDLE_FRAMES = ("_worker (thread.py:", "wait (threading.py:", "get (queue.py:")
+
+def frame_name(code) -> str:
+    """A frame as py-spy writes it: ``function (file.py:first_line)``."""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Counts the stacks of all other threads every ``interval`` seconds.
+
+    Counts are in units of ``interval``, so a stack's count times the
+    interval approximates the wall time spent in it.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            # A busy thread holding the GIL delays our wake-up; weight the stacks seen
+            # by the time that passed so CPU-bound code isn't under-counted
+            now = time.perf_counter()
+            weight = max(1, round((now - last) / self.interval))
+            last = now
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += weight
+            self.samples += 1
+
+    def collapsed(self) -> List[str]:
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+class RequestProfile:
+    def __init__(self, label: str, path: Path, mode: str):
+        self.label = label
+        self.path = path
+        self.mode = mode
+        self.seconds = 0.0
+        self.samples: Optional[int] = None
+        self.top: List[Dict[str, Any]] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {'input': self.label, 'mode': self.mode, 'path': str(self.path), 'seconds': round(self.seconds, 4),
+                'top': self.top}
+        if self.samples is not None:
+            data['samples'] = self.samples
+        return data
+
+class CpuProfiler:
+    """Profiles about ``sample_rate`` of requests into ``output_dir``, one file each."""
+
+    def __init__(self, output_dir: str = "output/profiles", sample_rate: float = 0.01,
+                 mode: str = SAMPLER, interval: float = 0.005, top: int = 10, seed: Optional[int] = None):
+        if mode not in (SAMPLER, CPROFILE):
+            raise ValueError(f"Unknown profiler mode {mode!r}; expected {SAMPLER!r} or {CPROFILE!r}")
+        self.output_dir = Path(output_dir)
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval
+        self.top = top
+        self._random = random.Random(seed)
+        self._counter = itertools.count(1)
+        self._cprofile_busy = False
+        self.profiled = 0
+        self.skipped = 0
+
+    def sample(self) -> bool:
+        """Whether to profile the next request."""
+        if self.sample_rate >= 1.0:
+            chosen = True
+        else:
+            chosen = self._random.random() < self.sample_rate
+        if chosen and self.mode == CPROFILE and self._cprofile_busy:
+            self.skipped += 1
+            return False
+        return chosen
+
+    def _path(self, label: str, suffix: str) -> Path:
+        stem = re.sub(r"[^A-Za-z0-9._-]+", "_", Path(label).stem)[:60] or "request"
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return self.output_dir / f"{stamp}-{os.getpid()}-{next(self._counter):04d}-{stem}{suffix}"
+
+    @contextlib.contextmanager
+    def request(self, label: str) -> Iterator[RequestProfile]:
+        """Profile everything the process does until the block exits."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.profiled += 1
+        with (self._cprofile if self.mode == CPROFILE else self._sampled)(label) as profile:
+            yield profile
+
+    @contextlib.contextmanager
+    def _sampled(self, label: str) -> Iterator[RequestProfile]:
+        profile = RequestProfile(label, self._path(label, ".collapsed"), SAMPLER)
+        sampler = StackSampler(self.interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield profile
+        finally:
+            sampler.stop()
+            profile.seconds = time.perf_counter() - started
+            profile.samples = sampler.samples
+            profile.path.write_text("\n".join(sampler.collapsed()) + "\n")
+            profile.top = top_frames(sampler.stacks, self.top)
+
+    @contextlib.contextmanager
+    def _cprofile(self, label: str) -> Iterator[RequestProfile]:
+        profile = RequestProfile(label, self._path(label, ".prof"), CPROFILE)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a coverage tool) owns the hooks; run unprofiled
+            print(f"cProfile unavailable: {e}")
+            yield profile
+            return
+        self._cprofile_busy = True
+        started = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            profiler.disable()
+            self._cprofile_busy = False
+            profile.seconds = time.perf_counter() - started
+            profiler.dump_stats(str(profile.path))
+            ranked = sorted(pstats.Stats(profiler).stats.items(), key=lambda item: -item[1][2])[:self.top]
+            profile.top = [{'frame': f"{name} ({os.path.basename(file)}:{line})", 'self_seconds': round(tt, 4),
+                            'calls': nc} for (file, line, name), (cc, nc, tt, ct, callers) in ranked]
+
+def top_frames(stacks: Counter, n: int = 10) -> List[Dict[str, Any]]:
+    """Frames that were on top of the stack most often (self time), with their share of busy samples.
+
+    Idle pool threads are skipped; the event loop waiting on the network
+    is kept, as its selector frame.
+    """
+    leaves: Counter = Counter()
+    for stack, count in stacks.items():
+        leaf = stack.rsplit(";", 1)[-1]
+        if not leaf.startswith(IDLE_FRAMES):
+            leaves[leaf] += count
+    total = sum(leaves.values()) or 1
+    return [{'frame': frame, 'samples': count, 'share': round(count / total, 3)}
+            for frame, count in leaves.most_common(n)]
+
+def merge_collapsed(paths: Iterable[Path]) -> Counter:
+    """Sum collapsed stacks from several profiles (e.g. all slow requests of a run)."""
+    stacks: Counter = Counter()
+    for path in paths:
+        for line in Path(path).read_text().splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+def render_profile(path: str, top: int = 20, threads: Optional[str] = None) -> str:
+    """Collapsed stacks of a profile or a directory of them; for a ``.prof`` file, a pstats summary.
+
+    ``threads`` keeps only stacks of threads whose name starts with it
+    (e.g. ``MainThread`` for the event loop).
+    """
+    target = Path(path)
+    if target.suffix == ".prof":
+        out = io.StringIO()
+        pstats.Stats(str(target), stream=out).sort_stats("tottime").print_stats(top)
+        return out.getvalue()
+    paths = sorted(target.glob("*.collapsed")) if target.is_dir() else [target]
+    stacks = merge_collapsed(paths)
+    if threads:
+        stacks = Counter({s: c for s, c in stacks.items() if s.startswith(threads)})
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
@@ -1,37 +1,89 @@
+import asyncio
 import numpy as np
 import wave
 import math
+from typing import Optional
+
+# Common speech frequencies (300-3400 Hz band)
+SPEECH_FREQUENCIES = [300, 1000, 2000, 3000]
+
+def synthesize_speech(t: np.ndarray) -> np.ndarray:
+    """Render the speech-like signal for the given time points (unnormalized)."""
+    # Shared envelope applied to every frequency, summed in one vectorized pass
+    amplitude = np.exp(-t) * np.sin(2 * np.pi * 5 * t)
+    frequencies = np.asarray(SPEECH_FREQUENCIES, dtype=np.float64)[:, None]
+    return amplitude * np.sin(2 * np.pi * frequencies * t[None, :]).sum(axis=0)
+
+def render_speech_segment(descriptor, sample_rate: int, start: int, stop: int) -> float:
+    """Worker: render samples [start, stop) into a shared float32 buffer, return the segment peak."""
+    from worker_pool import SharedPCMBuffer
+
+    buffer = SharedPCMBuffer.attach(descriptor)
+    try:
+        t = np.arange(start, stop) / sample_rate
+        segment = synthesize_speech(t)
+        buffer.array()[start:stop, 0] = segment
+        return float(np.max(np.abs(segment))) if len(segment) else 0.0
+    finally:
+        buffer.close()
+
+def write_pcm16_wav(filename: str, audio: np.ndarray, sample_rate: int, peak: Optional[float] = None):
+    """Normalize float samples to 16-bit PCM and save as a mono WAV file."""
+    peak = peak if peak is not None else float(np.max(np.abs(audio)))
+    if peak > 0:
+        audio = audio / peak
+    pcm = np.int16(audio * 32767)
+
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(1)  # Mono
+        wav.setsampwidth(2)  # 2 bytes per sample (16-bit)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
 
 def create_speech_audio(filename: str = "test_speech.wav", duration: float = 2.0):
     """Create a test audio file that simulates speech frequencies."""
     # Audio parameters
     sample_rate = 16000  # Common for speech
-    
+
     # Time array
     t = np.linspace(0, duration, int(sample_rate * duration), False)
-    
-    # Create a signal that mimics speech frequencies (300-3400 Hz)
-    frequencies = [300, 1000, 2000, 3000]  # Common speech frequencies
-    audio = np.zeros_like(t)
-    
-    for freq in frequencies:
-        # Add frequency with varying amplitude
-        amplitude = np.exp(-t) * np.sin(2 * np.pi * 5 * t)  # Envelope
-        audio += amplitude * np.sin(2 * np.pi * freq * t)
-    
-    # Normalize and convert to 16-bit PCM
-    audio = audio / np.max(np.abs(audio))
-    audio = np.int16(audio * 32767)
-    
+
     # Save as WAV file
-    with wave.open(filename, 'wb') as wav:
-        wav.setnchannels(1)  # Mono
-        wav.setsampwidth(2)  # 2 bytes per sample (16-bit)
-        wav.setframerate(sample_rate)
-        wav.writeframes(audio.tobytes())
-    
+    write_pcm16_wav(filename, synthesize_speech(t), sample_rate)
+
+    print(f"Created test speech audio file: {filename}")
+    return filename
+
+async def create_speech_audio_async(filename: str = "test_speech.wav", duration: float = 2.0,
+                                    pool=None, segment_seconds: float = 10.0):
+    """Create the speech test file with synthesis spread across worker processes.
+
+    Segments are rendered into a shared-memory buffer so the samples are never
+    pickled, and normalization plus the WAV write run in a thread.
+    """
+    from worker_pool import SharedPCMBuffer, WorkerPool
+
+    owns_pool = pool is None
+    pool = pool or WorkerPool()
+    sample_rate = 16000
+    num_samples = int(sample_rate * duration)
+    segment = max(1, int(sample_rate * segment_seconds))
+
+    try:
+        with SharedPCMBuffer.create(num_samples, dtype="float32") as buffer:
+            peaks = await asyncio.gather(*[
+                pool.run_cpu(render_speech_segment, buffer.descriptor, sample_rate,
+                             start, min(start + segment, num_samples))
+                for start in range(0, num_samples, segment)
+            ])
+            await pool.run_io(write_pcm16_wav, filename, buffer.array()[:, 0],
+                              sample_rate, max(peaks, default=0.0))
+    finally:
+        if owns_pool:
+            pool.shutdown()
+
     print(f"Created test speech audio file: {filename}")
     return filename
 
 if __name__ == "__main__":
-    create_speech_audio("test_speech.wav", duration=2.0) 
\ No newline at end of file
+    create_speech_audio("test_speech.wav", duration=2.0)
@@ -0,0 +1,86 @@
+import asyncio
+import contextlib
+import contextvars
+import time
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+class DeadlineExceeded(Exception):
+    """A request ran out of time. Not a TimeoutError, so it never counts against a backend's health."""
+
+    def __init__(self, stage: str, budget: Optional[float] = None):
+        detail = f" ({budget:.2f}s budget)" if budget is not None else ""
+        super().__init__(f"Deadline exceeded in {stage} stage{detail}")
+        self.stage = stage
+        self.budget = budget
+
+class Deadline:
+    """An absolute point in time (monotonic clock) by which work must finish."""
+
+    def __init__(self, at: float):
+        self.at = at
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+    def share(self, fraction: float) -> "Deadline":
+        """A sub-deadline for ``fraction`` of the time left; never later than this one."""
+        return Deadline(min(self.at, time.monotonic() + self.remaining() * fraction))
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Seconds left, optionally capped by a per-call timeout."""
+        return self.remaining() if cap is None else min(cap, self.remaining())
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the request being served by this task, if any.
+
+    Tasks inherit it from the task that created them, so it reaches every
+    HTTP call made on the request's behalf. A call shared through
+    ``SingleFlight`` runs under the deadline of the request that started
+    it, which requests only join when it is no earlier than their own.
+    """
+    return _current.get()
+
+@contextlib.contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+def call_timeout(default: float) -> float:
+    """Timeout for one outbound call: ``default`` unless the current deadline is sooner."""
+    deadline = current_deadline()
+    return default if deadline is None else deadline.timeout(default)
+
+async def run_stage(stage: str, share: float, fn: Callable[[], Awaitable[T]]) -> T:
+    """Run ``fn`` within ``share`` of the current deadline's remaining time.
+
+    On expiry the stage's task is cancelled, which aborts its in-flight
+    requests, and DeadlineExceeded is raised. Without a deadline ``fn``
+    simply runs.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return await fn()
+    stage_deadline = deadline.share(share)
+    budget = stage_deadline.remaining()
+    with deadline_scope(stage_deadline):
+        try:
+            return await asyncio.wait_for(fn(), budget)
+        except asyncio.TimeoutError:
+            if stage_deadline.expired:
+                raise DeadlineExceeded(stage, budget) from None
+            raise
@@ -0,0 +1,107 @@
+import asyncio
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+class DNSCache:
+    """Caches resolved addresses per host for ``ttl`` seconds."""
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, host: str, port: int = 443) -> List[str]:
+        """Addresses for ``host``, from the cache when the entry is still fresh."""
+        key = (host, port)
+        cached = self._fresh(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        # One lookup per host even when many connections open at once
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = self._fresh(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+
+            self.misses += 1
+            loop = asyncio.get_running_loop()
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            self._entries[key] = (time.monotonic() + self.ttl, addresses)
+            return addresses
+
+    def invalidate(self, host: Optional[str] = None):
+        if host is None:
+            self._entries.clear()
+        else:
+            for key in [k for k in self._entries if k[0] == host]:
+                del self._entries[key]
+
+    def _fresh(self, key: Tuple[str, int]) -> Optional[List[str]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+
+class CachedDNSBackend:
+    """httpcore network backend that connects to addresses from a DNSCache.
+
+    TLS still uses the original hostname for SNI and certificate checks,
+    because httpcore passes the request origin to ``start_tls`` separately.
+    """
+
+    def __init__(self, cache: DNSCache, backend=None):
+        import httpcore
+
+        self.cache = cache
+        self.backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        import httpcore
+
+        addresses = await self.cache.resolve(host, port)
+        last_error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self.backend.connect_tcp(address, port, timeout=timeout,
+                                                      local_address=local_address,
+                                                      socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        # Every cached address failed; the record may be stale
+        self.cache.invalidate(host)
+        raise last_error or httpcore.ConnectError(f"No addresses for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+
+def build_transport(cache: DNSCache, verify=False, http2: bool = False, limits=None):
+    """httpx transport whose connections resolve through ``cache``."""
+    import httpx
+
+    kwargs = {"verify": verify, "http2": http2}
+    if limits is not None:
+        kwargs["limits"] = limits
+    transport = httpx.AsyncHTTPTransport(**kwargs)
+    # httpx doesn't expose the network backend; set it on the underlying httpcore pool, and
+    # refuse to go on without the cache if a new httpx or httpcore has moved it
+    pool = getattr(transport, "_pool", None)
+    if not hasattr(pool, "_network_backend"):
+        import httpcore
+        raise RuntimeError(
+            f"Cannot install the DNS cache: httpx {httpx.__version__} / httpcore {httpcore.__version__} "
+            "no longer keep the network backend at transport._pool._network_backend"
+        )
+    pool._network_backend = CachedDNSBackend(cache)
+    return transport
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+EmbedFn = Callable[[List[str]], Awaitable[Sequence[Sequence[float]]]]
+
+class EmbeddingBatcher:
+    """Micro-batches concurrent ``embed`` calls into single embeddings requests.
+
+    The first caller opens a batch and waits up to ``max_delay`` seconds for
+    others to join; the batch is sent as soon as it holds ``max_batch``
+    texts. Each caller gets back the vector for its own text.
+    """
+
+    def __init__(self, embed_many: EmbedFn, max_batch: int = 64, max_delay: float = 0.01):
+        self.embed_many = embed_many
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending = set()  # strong references so in-flight batches aren't collected
+        self.requests = 0
+        self.texts = 0
+
+    async def embed(self, text: str) -> Sequence[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    async def embed_all(self, texts: Sequence[str]) -> List[Sequence[float]]:
+        return list(await asyncio.gather(*[self.embed(text) for text in texts]))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        self.requests += 1
+        self.texts += len(batch)
+        try:
+            vectors = await self.embed_many([text for text, _ in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
@@ -0,0 +1,164 @@
+import binascii
+import io
+import time
+from typing import BinaryIO, Callable, Dict, List, Optional
+
+class Base64FieldStreamDecoder:
+    """Incremental scanner for a JSON response body that base64-decodes every
+    ``b64_json`` string value straight into a sink as the bytes arrive.
+
+    Only a bounded chunk of encoded text is held at a time, so an image never
+    exists as a full JSON string, a decoded ``str`` and a ``bytes`` object at
+    once. ``url`` values are collected for responses that link to the image
+    instead. The n-th encoded image in the body is written to ``open_sink(n)``.
+    """
+
+    def __init__(self, open_sink: Callable[[int], BinaryIO], field: str = "b64_json",
+                 chunk_size: int = 64 * 1024):
+        self.open_sink = open_sink
+        self.field = field.encode()
+        # Decode in multiples of 4 encoded characters
+        self.chunk_size = max(4, chunk_size - chunk_size % 4)
+        self.urls: List[str] = []
+        self.bytes_written: Dict[int, int] = {}
+        # perf_counter() timestamp at which each image finished decoding
+        self.finished_at: Dict[int, float] = {}
+
+        self._mode = "scan"        # scan | string | base64
+        self._expect_value = False
+        self._is_value = False
+        self._key: bytes = b""
+        self._string = bytearray()
+        self._escape = False
+        self._pending = bytearray()
+        self._sink: Optional[BinaryIO] = None
+        self._index = 0
+
+    @property
+    def images(self) -> int:
+        return len(self.bytes_written)
+
+    def feed(self, data: bytes):
+        pos = 0
+        end = len(data)
+        while pos < end:
+            if self._mode == "base64":
+                pos = self._feed_base64(data, pos)
+            elif self._mode == "string":
+                pos = self._feed_string(data, pos)
+            else:
+                pos = self._feed_scan(data, pos)
+
+    def close(self):
+        """Finish decoding; raises if the body ended inside a string."""
+        if self._mode != "scan":
+            raise ValueError("Truncated image response: body ended inside a JSON string")
+
+    def _feed_scan(self, data: bytes, pos: int) -> int:
+        char = data[pos]
+        if char == 0x22:  # '"'
+            if self._expect_value and self._key == self.field:
+                self._start_image()
+                self._mode = "base64"
+            else:
+                self._string.clear()
+                self._mode = "string"
+            self._is_value = self._expect_value
+            self._expect_value = False
+        elif char == 0x3A:  # ':'
+            self._key = bytes(self._string)
+            self._expect_value = True
+        elif char not in b" \t\r\n":
+            self._expect_value = False
+        return pos + 1
+
+    def _feed_string(self, data: bytes, pos: int) -> int:
+        end = len(data)
+        while pos < end:
+            char = data[pos]
+            pos += 1
+            if self._escape:
+                self._escape = False
+                self._string.append(char)
+            elif char == 0x5C:  # '\\'
+                self._escape = True
+            elif char == 0x22:
+                self._mode = "scan"
+                if self._is_value and self._key == b"url":
+                    self.urls.append(self._string.decode("utf-8"))
+                return pos
+            else:
+                self._string.append(char)
+        return pos
+
+    def _feed_base64(self, data: bytes, pos: int) -> int:
+        end = len(data)
+        while pos < end:
+            if self._escape:
+                # JSON may escape '/' as '\/'; other escapes (line breaks) aren't base64
+                self._escape = False
+                if data[pos] == 0x2F:
+                    self._pending.append(0x2F)
+                pos += 1
+                continue
+
+            # Copy at most one chunk at a time, even when the transport hands us more
+            window = min(end, pos + self.chunk_size)
+            quote = data.find(b'"', pos, window)
+            backslash = data.find(b"\\", pos, quote if quote != -1 else window)
+            stop = backslash if backslash != -1 else (quote if quote != -1 else window)
+            self._pending += data[pos:stop]
+            self._flush(final=False)
+            pos = stop
+
+            if backslash != -1:
+                self._escape = True
+                pos += 1
+            elif quote != -1:
+                self._flush(final=True)
+                self._finish_image()
+                self._mode = "scan"
+                return quote + 1
+        return pos
+
+    def _start_image(self):
+        self._sink = self.open_sink(self._index)
+        self.bytes_written[self._index] = 0
+        self._pending.clear()
+
+    def _flush(self, final: bool):
+        if not final and len(self._pending) < self.chunk_size:
+            return
+        usable = len(self._pending) if final else len(self._pending) - len(self._pending) % 4
+        if not usable:
+            return
+        decoded = binascii.a2b_base64(self._pending[:usable])
+        del self._pending[:usable]
+        self._sink.write(decoded)
+        self.bytes_written[self._index] += len(decoded)
+
+    def _finish_image(self):
+        self.finished_at[self._index] = time.perf_counter()
+        self._sink = None
+        self._index += 1
+
+
+def feed_all(decoder: Base64FieldStreamDecoder, chunks: List[bytes]):
+    """Feed several body chunks in order; one call per batch when decoding on a worker thread."""
+    for chunk in chunks:
+        decoder.feed(chunk)
+
+
+def decode_to_memory(body_chunks, field: str = "b64_json") -> List[memoryview]:
+    """Decode every image in an iterable of body chunks into in-memory buffers."""
+    buffers: List[io.BytesIO] = []
+
+    def open_sink(index: int) -> BinaryIO:
+        buffers.append(io.BytesIO())
+        return buffers[-1]
+
+    decoder = Base64FieldStreamDecoder(open_sink, field=field)
+    for chunk in body_chunks:
+        decoder.feed(chunk)
+    decoder.close()
+    return [buffer.getbuffer() for buffer in buffers]
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+ACTIVE = "active"
+RESTING = "resting"  # Out of quota or rate limited until rest_until
+REMOVED = "removed"
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+class NoUsableKeyError(Exception):
+    """Every key in the pool has been removed; ``retry_after`` is when one may be back."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"No usable API key; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+def mask(key: str) -> str:
+    """A key as it may appear in logs and metrics."""
+    return f"...{key[-4:]}" if len(key) > 8 else "..."
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds from a rate-limit reset header: ``"12"``, ``"1.5s"``, ``"6m0s"`` or ``"20ms"``."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts) if parts else None
+
+def _int_header(headers, name: str) -> Optional[int]:
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+class PooledKey:
+    def __init__(self, key: str):
+        self.key = key
+        self.state = ACTIVE
+        self.remaining: Optional[int] = None  # Requests left in the window; None until a response says
+        self.limit: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.reset_at = 0.0
+        self.rest_until = 0.0
+        self.strikes = 0
+        self.last_used = 0  # Pool-wide sequence number of the last request it signed
+        self.requests = 0
+        self.rejections = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'key': mask(self.key),
+            'state': self.state,
+            'remaining_requests': self.remaining,
+            'remaining_tokens': self.remaining_tokens,
+            'requests': self.requests,
+            'rejections': self.rejections,
+        }
+
+class KeyPool:
+    """API keys for one backend, spread across requests by remaining quota.
+
+    Each request gets the active key with the most requests left in its
+    rate-limit window (from ``x-ratelimit-*`` response headers, counting
+    down locally between responses); ties go to the least recently used
+    key, so equal keys take turns. A key out of quota or answered with 429
+    rests until its window resets. ``max_strikes`` consecutive 401/403
+    responses remove a key for good; as many consecutive 429s remove it for
+    ``cooldown`` seconds.
+
+    The pool attaches to an httpx client through event hooks and only
+    touches requests to its own backend, so downloads from other hosts
+    never see a key.
+    """
+
+    def __init__(self, keys: Sequence[str], max_strikes: int = 3, cooldown: float = 300.0,
+                 default_rest: float = 1.0):
+        keys = list(dict.fromkeys(k for k in keys if k))
+        if not keys:
+            raise ValueError("KeyPool needs at least one key")
+        self.keys = [PooledKey(k) for k in keys]
+        self._by_key = {k.key: k for k in self.keys}
+        self.max_strikes = max_strikes
+        self.cooldown = cooldown
+        # Rest after a 401/403, or a 429 that carries no retry-after or reset header
+        self.default_rest = default_rest
+        self._sequence = 0
+
+    @classmethod
+    def from_env(cls, env_var: str = "API_KEYS", **kwargs) -> Optional["KeyPool"]:
+        """Pool from a comma-separated environment variable, or None when it isn't set."""
+        keys = [k.strip() for k in os.getenv(env_var, "").split(",") if k.strip()]
+        return cls(keys, **kwargs) if keys else None
+
+    @property
+    def primary(self) -> str:
+        return self.keys[0].key
+
+    def usable(self) -> int:
+        """Keys not removed (active or resting)."""
+        return sum(1 for k in self.keys if k.state != REMOVED)
+
+    def _refresh(self, now: float):
+        for k in self.keys:
+            if k.state == RESTING and now >= k.rest_until:
+                k.state = ACTIVE
+            elif k.state == REMOVED and k.rest_until and now >= k.rest_until:
+                print(f"API key {mask(k.key)} back in rotation after cooldown")
+                k.state, k.strikes = ACTIVE, 0
+            if k.reset_at and now >= k.reset_at:
+                # Window over: the quota is unknown again until the next response
+                k.remaining = k.remaining_tokens = None
+                k.reset_at = 0.0
+
+    def _pick(self, now: float) -> Optional[PooledKey]:
+        candidates = [k for k in self.keys if k.state == ACTIVE]
+        if not candidates:
+            return None
+        # Unknown quota ranks above any known count, so fresh keys get tried
+        return max(candidates, key=lambda k: (float("inf") if k.remaining is None else k.remaining, -k.last_used))
+
+    async def acquire(self) -> str:
+        """A key for the next request, waiting while every usable key is resting."""
+        while True:
+            now = time.monotonic()
+            self._refresh(now)
+            chosen = self._pick(now)
+            if chosen is not None:
+                self._sequence += 1
+                chosen.last_used = self._sequence
+                chosen.requests += 1
+                if chosen.remaining is not None:
+                    chosen.remaining -= 1
+                    if chosen.remaining <= 0 and chosen.reset_at > now:
+                        chosen.state, chosen.rest_until = RESTING, chosen.reset_at
+                return chosen.key
+            resting = [k.rest_until for k in self.keys if k.state == RESTING]
+            if not resting:
+                returning = [k.rest_until for k in self.keys if k.state == REMOVED and k.rest_until]
+                raise NoUsableKeyError(max(0.0, min(returning) - now) if returning else self.cooldown)
+            await asyncio.sleep(max(0.001, min(resting) - now))
+
+    def observe(self, key: str, status: int, headers) -> None:
+        """Update a key from the status and rate-limit headers of a response it was used for."""
+        k = self._by_key.get(key)
+        if k is None:
+            return
+        now = time.monotonic()
+        remaining = _int_header(headers, "x-ratelimit-remaining-requests")
+        if remaining is not None:
+            k.remaining = remaining
+            k.limit = _int_header(headers, "x-ratelimit-limit-requests") or k.limit
+        tokens = _int_header(headers, "x-ratelimit-remaining-tokens")
+        if tokens is not None:
+            k.remaining_tokens = tokens
+        resets = [parse_reset(headers.get(name)) for name in
+                  ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+        reset = max((r for r in resets if r is not None), default=None)
+        if reset is not None:
+            k.reset_at = now + reset
+
+        if status in (401, 403):
+            k.strikes += 1
+            k.rejections += 1
+            if k.strikes >= self.max_strikes:
+                if k.state != REMOVED:
+                    print(f"API key {mask(k.key)} removed after {k.strikes} authentication failures")
+                k.state, k.rest_until = REMOVED, 0.0
+            else:
+                k.state, k.rest_until = RESTING, now + self.default_rest
+        elif status == 429:
+            k.strikes += 1
+            k.rejections += 1
+            if k.strikes >= self.max_strikes:
+                if k.state != REMOVED:
+                    print(f"API key {mask(k.key)} removed for {self.cooldown:.0f}s after {k.strikes} rate limits")
+                k.state, k.rest_until = REMOVED, now + self.cooldown
+            else:
+                retry_after = parse_reset(headers.get("retry-after"))
+                rest = retry_after if retry_after is not None else (reset if reset is not None else self.default_rest)
+                k.state, k.rest_until = RESTING, now + rest
+        elif status < 400:
+            k.strikes = 0
+            if k.state == ACTIVE and (k.remaining == 0 or k.remaining_tokens == 0) and k.reset_at > now:
+                k.state, k.rest_until = RESTING, k.reset_at
+
+    def install(self, client, base_url: str):
+        """Sign ``client``'s requests to ``base_url`` with pool keys and learn from the responses."""
+        import httpx
+
+        backend = httpx.URL(base_url)
+
+        def _ours(url) -> bool:
+            return url.host == backend.host and url.port == backend.port
+
+        async def _sign(request):
+            if _ours(request.url):
+                key = await self.acquire()
+                request.headers["Authorization"] = f"Bearer {key}"
+                request.extensions["pool_key"] = key
+
+        async def _observe(response):
+            key = response.request.extensions.get("pool_key")
+            if key is not None:
+                self.observe(key, response.status_code, response.headers)
+
+        client.event_hooks["request"].append(_sign)
+        client.event_hooks["response"].append(_observe)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        self._refresh(time.monotonic())
+        return [k.snapshot() for k in self.keys]
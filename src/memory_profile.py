@@ -0,0 +1,212 @@
+"""Opt-in memory attribution per pipeline stage, built on tracemalloc.
+
+Each profiled request records, per stage, the net bytes still allocated
+when the stage ends (growth), the peak above the stage's starting point,
+and the source lines whose allocations grew most. Records are appended to
+a JSON lines file; ``memory_report`` aggregates them by stage and line.
+
+tracemalloc sees the whole process, so figures are exact only when
+requests run one at a time. When they overlap, growth includes the other
+requests' allocations and each request's start resets the peak the others
+are tracking, so peaks can come out too high or too low; such records are
+marked ``overlapped`` and left out of the report's peak figures. Tracing
+itself slows allocation-heavy code noticeably; leave it off in normal runs.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+def max_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # Linux reports KiB
+
+def _site(frame) -> str:
+    filename = frame.filename
+    if not os.path.isabs(filename) or filename.startswith(os.getcwd() + os.sep):
+        filename = os.path.relpath(filename)
+    return f"{filename}:{frame.lineno}"
+
+class RequestMemory:
+    """Memory figures for one request, filled in as its stages finish."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.stages: List[Dict[str, Any]] = []
+        self.start_bytes = 0
+        self.peak_absolute = 0
+        self.peak_bytes = 0
+        self.allocated_bytes = 0
+        self.max_rss_bytes: Optional[int] = None
+        self.error: Optional[str] = None
+        self.overlapped = False  # Another profiled request ran at the same time
+
+    def to_dict(self, sites: bool = True) -> Dict[str, Any]:
+        stages = self.stages if sites else [{k: v for k, v in s.items() if k != 'top'} for s in self.stages]
+        data = {
+            'input': self.label,
+            'peak_bytes': self.peak_bytes,
+            'allocated_bytes': self.allocated_bytes,
+            'max_rss_bytes': self.max_rss_bytes,
+            'stages': stages,
+        }
+        if self.error:
+            data['error'] = self.error
+        if self.overlapped:
+            data['overlapped'] = True
+        return data
+
+_current: contextvars.ContextVar[Optional[RequestMemory]] = contextvars.ContextVar("request_memory", default=None)
+
+class MemoryProfiler:
+    """Measures stages with tracemalloc snapshots and logs one record per request to ``path``.
+
+    ``top`` allocation sites are kept per stage; ``frames`` is the traceback
+    depth tracemalloc stores (1 attributes to the allocating line only).
+    """
+
+    def __init__(self, path: Optional[str] = None, top: int = 10, frames: int = 1):
+        self.path = path
+        self.top = top
+        self.frames = frames
+        self._started_tracing = False
+        self._active: List[RequestMemory] = []
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_FILTERS)
+
+    @contextlib.contextmanager
+    def request(self, label: str) -> Iterator[RequestMemory]:
+        """Profile a request; stages run inside it are attributed to it."""
+        self.start()
+        profile = RequestMemory(label)
+        if self._active:
+            profile.overlapped = True
+            for other in self._active:
+                other.overlapped = True
+        self._active.append(profile)
+        profile.start_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        token = _current.set(profile)
+        try:
+            yield profile
+        except BaseException as e:
+            profile.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            _current.reset(token)
+            self._active.remove(profile)
+            current, peak = tracemalloc.get_traced_memory()
+            profile.peak_bytes = max(profile.peak_absolute, peak) - profile.start_bytes
+            profile.allocated_bytes = current - profile.start_bytes
+            profile.max_rss_bytes = max_rss_bytes()
+            self._log(profile)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure one stage of the current request (a no-op outside ``request``)."""
+        profile = _current.get()
+        if profile is None:
+            yield
+            return
+        before = self._snapshot()
+        start, peak = tracemalloc.get_traced_memory()
+        # Keep the request-wide peak before resetting it for this stage
+        profile.peak_absolute = max(profile.peak_absolute, peak)
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            end, peak = tracemalloc.get_traced_memory()
+            profile.peak_absolute = max(profile.peak_absolute, peak)
+            diff = self._snapshot().compare_to(before, "lineno")
+            profile.stages.append({
+                'stage': name,
+                'seconds': round(time.perf_counter() - started, 4),
+                'allocated_bytes': end - start,
+                'peak_bytes': peak - start,
+                'top': [{'site': _site(stat.traceback[0]), 'size_diff': stat.size_diff,
+                         'count_diff': stat.count_diff}
+                        for stat in diff[:self.top] if stat.size_diff],
+            })
+
+    def _log(self, profile: RequestMemory):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(profile.to_dict()) + "\n")
+
+def memory_report(path: str, top: int = 10) -> Dict[str, Any]:
+    """Which stages and source lines drive memory growth, across the requests logged in ``path``."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+
+    exact = [r for r in records if not r.get('overlapped')]
+    by_stage: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    sites: Dict[tuple, Dict[str, int]] = defaultdict(lambda: {'size_diff': 0, 'count_diff': 0, 'requests': 0})
+    for record in records:
+        for stage in record['stages']:
+            by_stage[stage['stage']].append({**stage, 'overlapped': record.get('overlapped', False)})
+            for site in stage['top']:
+                entry = sites[(stage['stage'], site['site'])]
+                entry['size_diff'] += site['size_diff']
+                entry['count_diff'] += site['count_diff']
+                entry['requests'] += 1
+
+    stages = {}
+    for name, items in by_stage.items():
+        allocated = [s['allocated_bytes'] for s in items]
+        peaks = [s['peak_bytes'] for s in items if not s.get('overlapped')]
+        stages[name] = {
+            'calls': len(items),
+            'total_allocated_bytes': sum(allocated),
+            'mean_allocated_bytes': sum(allocated) // len(items),
+            'mean_peak_bytes': sum(peaks) // len(peaks) if peaks else None,
+            'max_peak_bytes': max(peaks, default=None),
+        }
+    ranked = sorted(sites.items(), key=lambda item: -item[1]['size_diff'])[:top]
+    return {
+        'requests': len(records),
+        'failed': sum(1 for r in records if r.get('error')),
+        'overlapped': len(records) - len(exact),
+        'max_request_peak_bytes': max((r['peak_bytes'] for r in exact), default=0),
+        'max_rss_bytes': max((r.get('max_rss_bytes') or 0 for r in records), default=0),
+        'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['total_allocated_bytes'])),
+        'top_sites': [{'stage': stage, 'site': site, **totals} for (stage, site), totals in ranked],
+    }
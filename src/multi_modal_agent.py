@@ -1,32 +1,289 @@
-import requests
-import json
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Sequence
 from pathlib import Path
-import base64
+import asyncio
+import hashlib
+import io
 import os
-import httpx
-from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import time
+from dataclasses import replace
+from worker_pool import WorkerPool, read_file_bytes
+from image_stream import Base64FieldStreamDecoder, feed_all
+from single_flight import SingleFlight, fingerprint
+from dns_cache import DNSCache, build_transport
+from accounting import UsageLedger, UsageRecord, collect_usage, current_request_id, request_scope, wav_duration
+from prompt_control import compress_transcript, estimate_tokens
+from structured_output import RESPONSE_SCHEMA, StructuredOutputError, parse_structured, repair_prompt
+from audio_windows import encode_wav, iter_windows, read_wav, slice_wav
+from speculative import intent_similarity
+from embeddings import EmbeddingBatcher
+from circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from deadline import Deadline, DeadlineExceeded, call_timeout, current_deadline, deadline_scope, run_stage
+
+if TYPE_CHECKING:
+    # Optional features are imported where first used, so importing the agent stays cheap
+    from artifact_store import ArtifactStore
+    from vector_index import VectorIndex
+    from window_cache import WindowCache
+    from transcript_index import TranscriptIndex
+    from scheduler import PriorityScheduler
+    from key_pool import KeyPool
+    from memory_profile import MemoryProfiler
+    from cpu_profile import CpuProfiler
+
+def indexed_image_path(output_path: str, index: int) -> str:
+    """Path for the index-th image of a response; the first keeps ``output_path``."""
+    if index == 0:
+        return output_path
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}_{index}{path.suffix}"))
 
 class MultiModalAgent:
-    def __init__(self, api_key: str, base_url: str):
-        """Initialize the multi-modal agent."""
+    TRANSCRIPTION_MODEL = "whisper-1"
+    CHAT_MODEL = "azure-gpt-4o"
+    IMAGE_MODEL = "bedrock-titan-image-generator-v1"
+    EMBEDDING_MODEL = "azure-text-embedding-3-small"
+    # Fraction of the time left on a request's deadline each stage may use when it
+    # starts; time a stage doesn't use rolls over to the later ones
+    STAGE_SHARES = {'transcribe': 0.3, 'respond': 0.45, 'image': 1.0}
+    # Image body collected before it is handed to a pool thread to decode and write
+    DECODE_BATCH_BYTES = 256 * 1024
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        worker_pool: Optional[WorkerPool] = None,
+        http2: bool = False,
+        dns_ttl: float = 300.0,
+        ledger: Optional[UsageLedger] = None,
+        max_prompt_tokens: int = 4000,
+        max_repair_attempts: int = 1,
+        store: Optional["ArtifactStore"] = None,
+        vector_index: Optional["VectorIndex"] = None,
+        reuse_similarity: float = 0.95,
+        window_seconds: Optional[float] = None,
+        window_cache: Optional["WindowCache"] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+        scheduler: Optional["PriorityScheduler"] = None,
+        key_pool: Optional["KeyPool"] = None,
+        memory_profiler: Optional["MemoryProfiler"] = None,
+        cpu_profiler: Optional["CpuProfiler"] = None
+    ):
+        """Initialize the multi-modal agent.
+
+        With a ``key_pool``, every request to ``base_url`` is signed with a key
+        from the pool instead of ``api_key``.
+        """
+        self.key_pool = key_pool
+        if key_pool is not None and not api_key:
+            api_key = key_pool.primary
         self.api_key = api_key
         self.base_url = base_url
+        self.http2 = http2
+        # Resolved gateway addresses are reused for dns_ttl seconds
+        self.dns_cache = DNSCache(ttl=dns_ttl)
+        # Blocking file I/O and CPU-heavy post-processing run here, off the event loop
+        self.worker_pool = worker_pool or WorkerPool()
+        # Identical concurrent requests share one upstream call; with a scheduler, only
+        # requests of the same priority, as a shared call is admitted at its starter's
+        priority_key = None
+        if scheduler is not None:
+            from scheduler import current_priority as priority_key
+        self.single_flight = SingleFlight(scope=priority_key)
+        # Tokens, audio seconds and images per model; budgets are checked before each call
+        self.ledger = ledger or UsageLedger()
+        # Transcripts longer than this are deduplicated and summarized before chat
+        self.max_prompt_tokens = max_prompt_tokens
+        # Re-asks allowed when a chat reply can't be parsed or repaired locally
+        self.max_repair_attempts = max_repair_attempts
+        # Optional run history and content-addressed outputs, for reuse and analysis
+        self.store = store
+        # Past transcripts by embedding; a close enough match reuses its response
+        self.vector_index = vector_index
+        self.reuse_similarity = reuse_similarity
+        # Concurrent embedding calls are sent as one request
+        self.embedder = EmbeddingBatcher(self.embed_texts)
+        # Long recordings are transcribed in windows of this many seconds,
+        # re-sending only windows whose audio changed
+        self.window_seconds = window_seconds
+        self._window_cache = window_cache
+        # Per (base URL, route, model): a failing backend is skipped instead of waited on
+        self.breakers = breakers or CircuitBreakerRegistry()
+        # Optional admission of outbound calls by priority (see scheduler.priority_scope)
+        self.scheduler = scheduler
+        # Opt-in tracemalloc measurements per stage of process_input
+        self.memory_profiler = memory_profiler
+        # Opt-in CPU profiles of a sampled subset of process_input calls
+        self.cpu_profiler = cpu_profiler
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "multipart/form-data"
         }
         
-        # Create OpenAI client with proper SSL handling and longer timeout
-        self.client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=self.base_url,
-            http_client=DefaultAsyncHttpxClient(
-                verify=False,  # Disable SSL verification for development
+        # httpx and openai are imported and the clients built on first use,
+        # so short-lived jobs that never make a request don't pay for them
+        self._http_client = None
+        self._client = None
+        print(f"Initialized client with base URL: {self.base_url}")
+
+    @property
+    def window_cache(self) -> "WindowCache":
+        """Window transcriptions by content; an in-memory cache unless one was passed in."""
+        if self._window_cache is None:
+            from window_cache import WindowCache
+            self._window_cache = WindowCache()
+        return self._window_cache
+
+    @property
+    def http_client(self):
+        """One connection pool shared by the OpenAI client and raw gateway requests."""
+        if self._http_client is None:
+            import httpx
+            from openai import DefaultAsyncHttpxClient
+
+            self._http_client = DefaultAsyncHttpxClient(
+                transport=build_transport(
+                    self.dns_cache,
+                    verify=False,  # Disable SSL verification for development
+                    http2=self.http2
+                ),
                 timeout=httpx.Timeout(300.0, connect=60.0)  # Increase timeout to 5 minutes
             )
-        )
-        print(f"Initialized client with base URL: {self.base_url}")
+            if self.key_pool is not None:
+                self.key_pool.install(self._http_client, self.base_url)
+        return self._http_client
+
+    @http_client.setter
+    def http_client(self, value):
+        if value is not None and self.key_pool is not None:
+            self.key_pool.install(value, self.base_url)
+        self._http_client = value
+
+    @property
+    def client(self):
+        """OpenAI client with proper SSL handling and longer timeout."""
+        if self._client is None:
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self.http_client
+            )
+        return self._client
+
+    async def _guarded(self, route: str, model: str, fn):
+        """Call ``fn`` through the circuit breaker for this route and model, and the scheduler if any."""
+        async def _call():
+            try:
+                if self.scheduler is None:
+                    return await fn()
+                async with self.scheduler.slot():
+                    return await fn()
+            except Exception as e:
+                if self.key_pool is not None:
+                    from key_pool import NoUsableKeyError
+                    if isinstance(e.__cause__, NoUsableKeyError):
+                        raise e.__cause__  # The SDK wraps errors from event hooks as connection errors
+                # Running out of our own time says nothing about the backend's health
+                deadline = current_deadline()
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded(route) from e
+                raise
+
+        return await self.breakers.get(self.base_url, route, model).call(_call)
+
+    async def _coalesced(self, stage: str, key: str, fn):
+        """``fn()``, shared with identical concurrent calls (see SingleFlight) within the request deadline.
+
+        The shared call keeps the deadline of the request that started it;
+        requests that would be cut short by it start their own call. Usage
+        is recorded for the starting request, and requests that joined get
+        a copy marked shared.
+        """
+        started = False
+
+        async def call():
+            nonlocal started
+            started = True
+            with collect_usage() as records:
+                return await fn(), records
+
+        deadline = current_deadline()
+        try:
+            result, records = await self.single_flight.do(key, call, deadline.at if deadline is not None else None)
+        except asyncio.TimeoutError:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded(stage) from None
+            raise
+        if not started:
+            for record in records:
+                self.ledger.record(replace(record, request_id=current_request_id(), shared=True))
+        return result
+
+    @staticmethod
+    def _deadline_kwargs() -> Dict[str, Any]:
+        """``timeout`` for an SDK call when the request has a deadline; otherwise the client default."""
+        deadline = current_deadline()
+        return {} if deadline is None else {'timeout': deadline.timeout()}
+
+    async def close(self):
+        """Close the API clients (if they were created) and shut down the worker pool."""
+        if self._client is not None:
+            await self._client.close()
+        elif self._http_client is not None:
+            await self._http_client.aclose()
+        await self.ledger.aclose()
+        self.worker_pool.shutdown(wait=False)
+
+    async def warmup(self, connections: int = 2, probe_health: bool = True) -> Dict[str, Any]:
+        """Pay DNS, TCP and TLS setup before the first real request.
+
+        Resolves the gateway host into the DNS cache, then sends ``connections``
+        concurrent ``/health`` probes so that many pooled connections are open.
+        With HTTP/2 the probes share a single multiplexed connection.
+        Failures are reported, not raised; warm-up is best effort.
+        """
+        import httpx
+
+        url = httpx.URL(self.base_url)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        result: Dict[str, Any] = {'host': url.host}
+
+        started = time.perf_counter()
+        try:
+            result['addresses'] = await self.dns_cache.resolve(url.host, port)
+        except OSError as e:
+            result['error'] = f"DNS resolution failed: {e}"
+            return result
+        result['dns_seconds'] = time.perf_counter() - started
+
+        if probe_health:
+            health_url = str(url.copy_with(path="/health", query=None))
+
+            async def _probe():
+                try:
+                    response = await self.http_client.get(
+                        health_url, headers={"Authorization": f"Bearer {self.api_key}"}
+                    )
+                    return response.status_code
+                except httpx.HTTPError as e:
+                    return f"{type(e).__name__}: {str(e)}"
+
+            started = time.perf_counter()
+            result['health'] = await asyncio.gather(*[_probe() for _ in range(max(1, connections))])
+            result['connect_seconds'] = time.perf_counter() - started
+
+        print(f"Warm-up complete: {result}")
+        return result
+
+    async def list_models(self) -> list:
+        """List model ids available at the gateway."""
+        async def _list():
+            models = await self.client.models.list()
+            return [model.id for model in models.data]
+
+        return await self._coalesced("models", fingerprint("models", self.base_url), _list)
 
     async def transcribe_audio(self, audio_file_path: str) -> str:
         """Transcribe audio file using OpenAI's Whisper model"""
@@ -34,32 +291,213 @@ class MultiModalAgent:
         if not os.path.exists(audio_file_path):
             raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
         
-        # Prepare the multipart form data
-        files = {
-            'file': ('audio.wav', open(audio_file_path, 'rb'), 'audio/wav'),
-            'model': (None, 'whisper-1')
-        }
+        # Read the file in a worker thread so large uploads don't block the loop
+        audio_bytes = await self.worker_pool.run_io(read_file_bytes, audio_file_path)
+        return await self.transcribe_bytes(audio_bytes)
+
+    async def transcribe_bytes(self, audio_bytes: bytes) -> str:
+        """Transcribe in-memory WAV data.
+
+        With ``window_seconds`` set, recordings longer than one window are
+        transcribed window by window (see ``transcribe_incremental``).
+        """
+        if self.window_seconds and wav_duration(audio_bytes) > self.window_seconds:
+            return await self.transcribe_incremental(audio_bytes, self.window_seconds)
+        return await self._transcribe_shared(audio_bytes)
+
+    async def _transcribe_shared(self, audio_bytes: bytes, granularity: Optional[str] = None):
+        # Key on the audio content so the same recording under any path is sent once
+        key = fingerprint("transcribe", self.base_url, self.TRANSCRIPTION_MODEL, granularity, audio_bytes)
+        if granularity is None:
+            return await self._coalesced("transcribe", key, lambda: self._transcribe_bytes(audio_bytes))
+        return await self._coalesced("transcribe", key, lambda: self._transcribe_verbose(audio_bytes, granularity))
+
+    async def transcribe_incremental(self, audio_bytes: bytes, window_seconds: float = 30.0,
+                                     max_concurrency: int = 4) -> str:
+        """Transcribe fixed-size PCM windows, sending only windows not transcribed before.
+
+        Windows are fingerprinted by content, so when a recording is
+        re-submitted after being appended to, only the new audio (plus the
+        previously partial last window) is uploaded; cached text for the
+        other windows is merged back in order. Words cut at a window
+        boundary may be transcribed less accurately than in one pass.
+        """
+        results = await self._transcribe_windows(audio_bytes, window_seconds, None, max_concurrency)
+        return " ".join(text.strip() for _, text in results if text.strip())
+
+    async def transcribe_timestamps(self, audio_bytes: bytes, granularity: str = "segment",
+                                    window_seconds: Optional[float] = None,
+                                    max_concurrency: int = 4) -> "TranscriptIndex":
+        """Transcribe with ``verbose_json`` segment or word timestamps.
+
+        Long audio is split into windows as in ``transcribe_incremental``
+        (``window_seconds`` defaults to the agent's setting); each window's
+        timestamps are shifted by its offset and merged into one timeline.
+        """
+        if granularity not in ("segment", "word"):
+            raise ValueError("granularity must be 'segment' or 'word'")
+        window_seconds = window_seconds or self.window_seconds
+        if window_seconds and wav_duration(audio_bytes) > window_seconds:
+            results = await self._transcribe_windows(audio_bytes, window_seconds, granularity, max_concurrency)
+            windows = [(window.start, window.end, result) for window, result in results]
+        else:
+            result = await self._transcribe_shared(audio_bytes, granularity)
+            windows = [(0.0, wav_duration(audio_bytes) or None, result)]
+        from transcript_index import TranscriptIndex, window_segments
+
+        segments = window_segments(windows, granularity)
+        return TranscriptIndex.from_segments(segments)
+
+    async def _transcribe_windows(self, audio_bytes: bytes, window_seconds: float,
+                                  granularity: Optional[str], max_concurrency: int):
+        """``(window, result)`` for each window, uploading only windows missing from the cache."""
+        from window_cache import window_key
+
+        info, pcm = read_wav(audio_bytes)
+        windows = list(iter_windows(info, pcm, window_seconds))
+        model = self.TRANSCRIPTION_MODEL if granularity is None else f"{self.TRANSCRIPTION_MODEL}:{granularity}"
+        keys = [window_key(model, info, window) for window in windows]
+        results = [self.window_cache.get(key) for key in keys]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _window(i: int):
+            async with semaphore:
+                results[i] = await self._transcribe_shared(encode_wav(info, windows[i].pcm), granularity)
+            self.window_cache.put(keys[i], results[i])
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        print(f"Transcribing {len(missing)} of {len(windows)} windows ({window_seconds:.0f}s each)")
+        await asyncio.gather(*[_window(i) for i in missing])
+        snapshot = self.window_cache.snapshot()
+        if snapshot is not None:
+            await self.worker_pool.run_io(self.window_cache.write, snapshot)
+        return list(zip(windows, results))
+
+    async def _transcribe_bytes(self, audio_bytes: bytes) -> str:
+        result = await self._transcription_request(audio_bytes)
+        return result['text']
+
+    async def _transcribe_verbose(self, audio_bytes: bytes, granularity: str) -> Dict[str, Any]:
+        result = await self._transcription_request(audio_bytes, {
+            'response_format': (None, 'verbose_json'),
+            'timestamp_granularities[]': (None, granularity)
+        })
+        # Keep only what the transcript index needs; this is what the window cache stores
+        return {key: result[key] for key in ('text', 'duration', 'segments', 'words') if key in result}
+
+    async def _transcription_request(self, audio_bytes: bytes,
+                                     fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        audio_seconds = wav_duration(audio_bytes)
+        with self.ledger.reserve(self.TRANSCRIPTION_MODEL, audio_seconds=audio_seconds) as reservation:
+            model = reservation.model
         
-        # Make the API request
-        url = f"{self.base_url}/audio/transcriptions"
+            # Prepare the multipart form data
+            files = {
+                'file': ('audio.wav', audio_bytes, 'audio/wav'),
+                'model': (None, model),
+                **(fields or {})
+            }
         
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.post(
-                url,
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                files=files,
-                timeout=30.0
-            )
-            
-            if response.status_code != 200:
-                print(f"Error response: {response.text}")
-                response.raise_for_status()
+            # Make the API request
+            url = f"{self.base_url}/audio/transcriptions"
+        
+            async def _post():
+                response = await self.http_client.post(
+                    url,
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    files=files,
+                    timeout=call_timeout(30.0)
+                )
             
-            result = response.json()
-            return result['text']
+                if response.status_code != 200:
+                    print(f"Error response: {response.text}")
+                    response.raise_for_status()
+                return response.json()
+        
+            result = await self._guarded("audio/transcriptions", model, _post)
+            reservation.settle(UsageRecord(model=model, kind="transcription", audio_seconds=audio_seconds))
+        return result
 
     async def generate_response(self, text: str) -> Dict[str, Any]:
         """Generate chat completion response using Azure GPT-4."""
+        key = fingerprint("respond", self.base_url, self.CHAT_MODEL, text)
+        result = await self._coalesced("respond", key, lambda: self._generate_response(text))
+        # Callers may mutate the parsed dict; don't let coalesced callers share it
+        return dict(result)
+
+    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts with one embeddings request."""
+        tokens = sum(estimate_tokens(text, self.EMBEDDING_MODEL) for text in texts)
+        with self.ledger.reserve(self.EMBEDDING_MODEL, tokens=tokens) as reservation:
+            model = reservation.model
+            response = await self._guarded(
+                "embeddings", model,
+                lambda: self.client.embeddings.create(model=model, input=texts, **self._deadline_kwargs())
+            )
+            usage = getattr(response, 'usage', None)
+            reservation.settle(UsageRecord(
+                model=model,
+                kind="embedding",
+                prompt_tokens=getattr(usage, 'prompt_tokens', None) or tokens
+            ))
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def embed_text(self, text: str) -> List[float]:
+        """Embed one text; concurrent calls are batched into a single request."""
+        key = fingerprint("embed", self.base_url, self.EMBEDDING_MODEL, text)
+        return await self._coalesced("embed", key, lambda: self.embedder.embed(text))
+
+    async def search_transcripts(self, query: str, k: int = 5, exact: bool = True) -> List[Dict[str, Any]]:
+        """Past runs whose transcripts are semantically closest to ``query``."""
+        if self.vector_index is None:
+            raise ValueError("No vector index configured")
+        vector = await self.embed_text(query)
+        return await self.worker_pool.run_io(self.vector_index.search, vector, k, exact)
+
+    async def prepare_transcript(self, text: str) -> str:
+        """Bound the transcript's token count so chat latency doesn't grow with audio length."""
+        if estimate_tokens(text, self.CHAT_MODEL) <= self.max_prompt_tokens:
+            return text
+        compressed = await compress_transcript(
+            text, self._summarize_chunk, self.max_prompt_tokens, model=self.CHAT_MODEL
+        )
+        print(f"Compressed transcript from {len(text)} to {len(compressed)} characters")
+        return compressed
+
+    async def _summarize_chunk(self, chunk: str, target_tokens: int) -> str:
+        messages = [
+            {
+                "role": "system",
+                "content": "Summarize this transcript excerpt concisely. Keep names, numbers, "
+                           "questions and requests. Reply with the summary only."
+            },
+            {"role": "user", "content": chunk}
+        ]
+        return await self._chat(messages, extra_tokens=target_tokens, max_tokens=target_tokens, temperature=0)
+
+    async def _chat(self, messages: List[Dict[str, str]], extra_tokens: int = 0, **kwargs) -> str:
+        """One chat completion with a budget check beforehand and usage recorded afterwards."""
+        estimated_tokens = sum(estimate_tokens(m["content"], self.CHAT_MODEL) for m in messages) + extra_tokens
+        with self.ledger.reserve(self.CHAT_MODEL, tokens=estimated_tokens) as reservation:
+            model = reservation.model
+        
+            response = await self._guarded("chat/completions", model, lambda: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                **{**self._deadline_kwargs(), **kwargs}
+            ))
+        
+            usage = getattr(response, 'usage', None)
+            reservation.settle(UsageRecord(
+                model=model,
+                kind="chat",
+                prompt_tokens=getattr(usage, 'prompt_tokens', None) or estimated_tokens,
+                completion_tokens=getattr(usage, 'completion_tokens', None) or 0
+            ))
+        return response.choices[0].message.content or ""
+
+    async def _generate_response(self, text: str) -> Dict[str, Any]:
+        text = await self.prepare_transcript(text)
         messages = [
             {
                 "role": "system",
@@ -73,86 +511,531 @@ class MultiModalAgent:
             }
         ]
         
-        response = await self.client.chat.completions.create(
-            model="azure-gpt-4o",
-            messages=messages,
-            response_format={"type": "json_object"},
-            temperature=0.7
-        )
+        raw = await self._chat(messages, response_format={"type": "json_object"}, temperature=0.7)
         
-        try:
-            return json.loads(response.choices[0].message.content)
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
-            print(f"Raw response: {response.choices[0].message.content}")
-            raise
+        # Cheap local repair first; only re-ask the model when that fails
+        for attempt in range(self.max_repair_attempts + 1):
+            try:
+                return parse_structured(raw, RESPONSE_SCHEMA)
+            except StructuredOutputError as e:
+                print(f"Error decoding JSON: {e}")
+                print(f"Raw response: {raw}")
+                if attempt == self.max_repair_attempts:
+                    raise
+                repair_messages = messages + [
+                    {"role": "assistant", "content": raw},
+                    {"role": "user", "content": repair_prompt(raw, e.errors)}
+                ]
+                raw = await self._chat(repair_messages, response_format={"type": "json_object"}, temperature=0)
 
     async def generate_image(self, prompt: str, output_path: str) -> str:
         """Generate image using Bedrock Titan."""
+        key = fingerprint("image", self.base_url, self.IMAGE_MODEL, prompt, output_path)
+        return await self._coalesced("image", key, lambda: self._generate_image(prompt, output_path))
+
+    async def _generate_image(self, prompt: str, output_path: str) -> str:
+        await self._generate_image_files(prompt, output_path)
+        return output_path
+
+    async def generate_images(
+        self,
+        prompt: str,
+        output_dir: Path,
+        n: int = 1,
+        sizes: Optional[Sequence[str]] = None,
+        name: str = "image"
+    ) -> List[Dict[str, Any]]:
+        """Generate ``n`` variants of a prompt for each size.
+
+        Each size is one request asking for ``n`` images; sizes run concurrently.
+        Returns one entry per image with its path, size and seconds to completion.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        sizes = list(sizes or ["1024x1024"])
+
+        results = await asyncio.gather(*[
+            self._generate_image_files(prompt, str(output_dir / f"{name}_{size}.png"), size=size, n=n)
+            for size in sizes
+        ])
+        return [image for images in results for image in images]
+
+    async def generate_image_batch(
+        self,
+        prompts: Sequence[str],
+        output_dir: Path,
+        n: int = 1,
+        sizes: Optional[Sequence[str]] = None,
+        max_concurrency: int = 4
+    ) -> List[List[Dict[str, Any]]]:
+        """Generate images for several prompts concurrently, at most ``max_concurrency`` at once."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _one(index: int, prompt: str):
+            async with semaphore:
+                return await self.generate_images(prompt, output_dir, n=n, sizes=sizes,
+                                                  name=f"prompt_{index:03d}")
+
+        return await asyncio.gather(*[_one(i, prompt) for i, prompt in enumerate(prompts)])
+
+    async def _generate_image_files(
+        self,
+        prompt: str,
+        output_path: str,
+        size: str = "1024x1024",
+        n: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Run one image request, streaming each returned image into its own file."""
+        print(f"Generating image with prompt: {prompt}")
+        reservation = self.ledger.reserve(self.IMAGE_MODEL, images=n)
+        model = reservation.model
+        payload = {"model": model, "prompt": prompt, "size": size}
+        if n > 1:
+            payload["n"] = n
+        sinks = {}
+        opened = set()  # Every file written, streamed or downloaded, to remove on failure
+
+        def open_sink(index: int):
+            opened.add(indexed_image_path(output_path, index))
+            sinks[index] = open(indexed_image_path(output_path, index), 'wb')
+            return sinks[index]
+
+        started = time.perf_counter()
         try:
-            print(f"Generating image with prompt: {prompt}")
-            
-            # Use the OpenAI client for image generation with minimal parameters
-            response = await self.client.images.generate(
-                model="bedrock-titan-image-generator-v1",
-                prompt=prompt,
-                size="1024x1024"
-            )
-            
+            decoder = await self._stream_image_response(payload, open_sink)
             print("Image generation successful!")
-            
-            # Handle the response
-            if hasattr(response.data[0], 'b64_json'):
-                # If we get base64 data
-                image_bytes = base64.b64decode(response.data[0].b64_json)
-                with open(output_path, 'wb') as f:
-                    f.write(image_bytes)
-                print("Saved base64 image data")
-            elif hasattr(response.data[0], 'url'):
-                # If we get a URL
-                image_url = response.data[0].url
-                print(f"Image URL received: {image_url}")
-                
-                async with httpx.AsyncClient(verify=False) as client:
-                    image_response = await client.get(image_url)
-                    image_response.raise_for_status()
-                    
-                    with open(output_path, 'wb') as f:
-                        f.write(image_response.content)
+
+            for sink in sinks.values():
+                sink.close()
+
+            images = []
+            if decoder.images:
+                for index, written in decoder.bytes_written.items():
+                    images.append({
+                        'path': indexed_image_path(output_path, index),
+                        'index': index,
+                        'size': size,
+                        'bytes': written,
+                        'seconds': decoder.finished_at[index] - started
+                    })
+                print(f"Saved base64 image data ({len(images)} image(s))")
+            elif decoder.urls:
+                # If we get URLs, download them in parallel
+                print(f"Image URL(s) received: {decoder.urls}")
+
+                async def _download(index: int, image_url: str):
+                    path = indexed_image_path(output_path, index)
+                    opened.add(path)
+                    written = await self._download_to_file(image_url, path)
+                    return {'path': path, 'index': index, 'size': size, 'bytes': written,
+                            'seconds': time.perf_counter() - started}
+
+                downloads = [asyncio.ensure_future(_download(i, u)) for i, u in enumerate(decoder.urls)]
+                try:
+                    images = await asyncio.gather(*downloads)
+                except BaseException:
+                    # Stop the other downloads before their files are removed below
+                    for download in downloads:
+                        download.cancel()
+                    await asyncio.gather(*downloads, return_exceptions=True)
+                    raise
                 print("Saved image from URL")
-            
-            print(f"Image saved to: {output_path}")
-            return output_path
+            else:
+                raise ValueError("Image response contained neither b64_json nor url data")
 
-        except Exception as e:
-            print(f"Error in image generation: {type(e).__name__}: {str(e)}")
-            if isinstance(e, httpx.HTTPError):
-                print(f"Response content: {e.response.text if hasattr(e, 'response') else 'No response'}")
+            reservation.settle(UsageRecord(model=model, kind="image", images=len(images)))
+            for image in images:
+                print(f"Image saved to: {image['path']}")
+            return list(images)
+
+        except BaseException as e:
+            reservation.release()
+            # Also on cancellation: never leave partially written images behind
+            for sink in sinks.values():
+                sink.close()
+            for path in opened:
+                Path(path).unlink(missing_ok=True)
+            if isinstance(e, Exception):
+                print(f"Error in image generation: {type(e).__name__}: {str(e)}")
+                import httpx
+                if isinstance(e, httpx.HTTPStatusError):
+                    print(f"Response content: {e.response.text}")
             raise
 
-    async def process_input(self, audio_file_path: str, output_dir: Path) -> Dict[str, str]:
-        """Process voice input and generate multi-modal response."""
+    async def generate_image_bytes(self, prompt: str, size: str = "1024x1024") -> memoryview:
+        """Generate an image and return its decoded bytes without touching disk."""
+        buffers = []
+
+        def open_sink(index: int):
+            buffers.append(io.BytesIO())
+            return buffers[-1]
+
+        with self.ledger.reserve(self.IMAGE_MODEL, images=1) as reservation:
+            model = reservation.model
+            decoder = await self._stream_image_response(
+                {"model": model, "prompt": prompt, "size": size}, open_sink
+            )
+            reservation.settle(UsageRecord(model=model, kind="image", images=max(1, decoder.images)))
+        if buffers:
+            return buffers[0].getbuffer()
+        if decoder.urls:
+            response = await self.http_client.get(decoder.urls[0])
+            response.raise_for_status()
+            return memoryview(response.content)
+        raise ValueError("Image response contained neither b64_json nor url data")
+
+    async def _stream_image_response(self, payload: Dict[str, Any], open_sink) -> Base64FieldStreamDecoder:
+        """POST an image generation request and decode the body as it streams in.
+
+        Bypasses the SDK response models so the base64 payload is never
+        materialized as a whole; it is decoded chunk by chunk into the sinks.
+        """
+        url = f"{self.base_url}/images/generations"
+        decoder = Base64FieldStreamDecoder(open_sink)
+
+        async def _stream():
+            async with self.http_client.stream(
+                "POST", url, headers={"Authorization": f"Bearer {self.api_key}"}, json=payload,
+                **self._deadline_kwargs()
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    print(f"Error response: {response.text}")
+                    response.raise_for_status()
+
+                # Decoding and the sinks' writes happen on a pool thread, a batch of chunks
+                # at a time and in order, so the loop only moves bytes off the socket
+                batch, size = [], 0
+                async for chunk in response.aiter_bytes():
+                    batch.append(chunk)
+                    size += len(chunk)
+                    if size >= self.DECODE_BATCH_BYTES:
+                        await self._off_loop(feed_all, decoder, batch)
+                        batch, size = [], 0
+                await self._off_loop(feed_all, decoder, batch)
+                decoder.close()
+
+        await self._guarded("images/generations", payload["model"], _stream)
+        return decoder
+
+    async def _download_to_file(self, url: str, output_path: str) -> int:
+        written = 0
+        async with self.http_client.stream("GET", url) as response:
+            response.raise_for_status()
+            f = await self._off_loop(open, output_path, 'wb')
+            try:
+                async for chunk in response.aiter_bytes():
+                    written += await self._off_loop(f.write, chunk)
+            finally:
+                await self._off_loop(f.close)
+        return written
+
+    async def _off_loop(self, fn, *args):
+        """Run blocking file work on the pool's threads; on cancellation, let it finish first.
+
+        Callers clean up the files it writes when cancelled, which must not
+        race a write still running on the thread.
+        """
+        future = asyncio.ensure_future(self.worker_pool.run_io(fn, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait([future])
+            raise
+
+    async def process_input(
+        self,
+        audio_file_path: str,
+        output_dir: Path,
+        speculative: bool = False,
+        speculative_seconds: float = 15.0,
+        similarity_threshold: float = 0.6,
+        reuse: bool = True,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Process voice input and generate multi-modal response.
+
+        ``deadline`` bounds the whole request in seconds. Each stage gets a
+        share of the time left (``STAGE_SHARES``), HTTP timeouts are cut to
+        fit, and on expiry in-flight requests are cancelled, partial output
+        files removed and DeadlineExceeded raised. A deadline set by the
+        caller's context (e.g. the HTTP service) applies the same way. Calls
+        are only shared with concurrent requests whose deadline is no
+        earlier, so sharing never cuts a request's timeouts short.
+
+        With ``speculative`` set, long recordings start chat and image work
+        from the first ``speculative_seconds`` of audio while the full file is
+        still being transcribed; see ``_process_speculative``.
+
+        With an artifact store configured, every run is recorded there and,
+        if ``reuse`` is set, a previous run on identical audio with the same
+        models is served from the store instead of calling the gateway. With
+        a vector index, a transcript whose embedding is within
+        ``reuse_similarity`` of an indexed one reuses that response and
+        skips the chat model.
+
+        With a ``memory_profiler``, each stage's memory growth, peak and top
+        allocation sites are logged, and the result carries a ``memory``
+        summary next to its ``timings``. With a ``cpu_profiler``, sampled
+        requests are profiled to a file of their own, named in ``profile``.
+
+        Usage records of the request carry its ``request_id``, which is
+        also returned.
+        """
+        args = (audio_file_path, output_dir, speculative, speculative_seconds, similarity_threshold, reuse)
+
+        async def _run():
+            if deadline is None:
+                return await self._process_input(*args)
+            with deadline_scope(Deadline.after(deadline)):
+                return await run_stage('pipeline', 1.0, lambda: self._process_input(*args))
+
+        async def _measured():
+            if self.memory_profiler is None:
+                return await _run()
+            with self.memory_profiler.request(audio_file_path) as memory:
+                result = await _run()
+            result['memory'] = memory.to_dict(sites=False)
+            return result
+
+        async def _profiled():
+            if self.cpu_profiler is None or not self.cpu_profiler.sample():
+                return await _measured()
+            with self.cpu_profiler.request(audio_file_path) as profile:
+                result = await _measured()
+            result['profile'] = profile.to_dict()
+            return result
+
+        # Keep the caller's request id (e.g. the HTTP service's) if it set one
+        with request_scope(current_request_id()) as request_id:
+            result = await _profiled()
+        result['request_id'] = request_id
+        return result
+
+    async def _stage(self, name: str, fn):
+        """Run one pipeline stage within its deadline share, measuring memory when profiling."""
+        if self.memory_profiler is None:
+            return await run_stage(name, self.STAGE_SHARES[name], fn)
+        with self.memory_profiler.stage(name):
+            return await run_stage(name, self.STAGE_SHARES[name], fn)
+
+    async def _process_input(
+        self,
+        audio_file_path: str,
+        output_dir: Path,
+        speculative: bool,
+        speculative_seconds: float,
+        similarity_threshold: float,
+        reuse: bool
+    ) -> Dict[str, Any]:
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        # 1. Transcribe audio to text
-        text = await self.transcribe_audio(audio_file_path)
-        print(f"Transcribed text: {text}")
+        if not os.path.exists(audio_file_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
+        started = time.perf_counter()
+        audio_bytes = await self.worker_pool.run_io(read_file_bytes, audio_file_path)
+        final_path = str(output_dir / 'response.png')
+        input_sha256 = hashlib.sha256(audio_bytes).hexdigest()
+        
+        if self.store is not None and reuse:
+            cached = await self._reuse_run(input_sha256, final_path)
+            if cached is not None:
+                return cached
+        
+        if speculative and wav_duration(audio_bytes) >= speculative_seconds * 1.5:
+            result = await self._process_speculative(
+                audio_bytes, output_dir, speculative_seconds, similarity_threshold
+            )
+            vector = None  # No similarity lookup ran, so the transcript is embedded when indexed
+        else:
+            # 1. Transcribe audio to text
+            transcribe_started = time.perf_counter()
+            text = await self._stage('transcribe', lambda: self.transcribe_bytes(audio_bytes))
+            transcribe_seconds = time.perf_counter() - transcribe_started
+            print(f"Transcribed text: {text}")
+            
+            # 2 and 3. Generate response (or reuse one for a near-identical transcript), image prompt and image
+            vector, similar = await self._find_similar(text) if reuse else (None, None)
+            result = await self._respond_and_draw(text, final_path, similar['payload'] if similar else None)
+            result['timings']['transcribe'] = transcribe_seconds
+            if similar:
+                result['similar_run'] = {'score': similar['score'], 'run_id': similar['payload'].get('run_id')}
+        result['timings']['total'] = time.perf_counter() - started
         
+        if self.store is not None:
+            result['run_id'] = await self._record_run(input_sha256, audio_file_path, result)
+        if self.vector_index is not None:
+            await self._index_transcript(result, vector)
+        return result
+
+    async def _find_similar(self, text: str):
+        """Embed ``text`` and return it with the closest indexed run, if close enough to reuse.
+
+        Embedding is an optimization here: failures are reported and the
+        response is generated as usual.
+        """
+        if self.vector_index is None:
+            return None, None
+        try:
+            vector = await self.embed_text(text)
+            matches = await self.worker_pool.run_io(self.vector_index.search, vector, 1)
+        except Exception as e:
+            print(f"Similarity lookup failed: {type(e).__name__}: {str(e)}")
+            return None, None
+        if matches and matches[0]['score'] >= self.reuse_similarity:
+            print(f"Reusing response of a similar transcript (similarity {matches[0]['score']:.3f})")
+            return vector, matches[0]
+        return vector, None
+
+    async def _index_transcript(self, result: Dict[str, Any], vector: Optional[List[float]] = None):
+        payload = {key: result.get(key) for key in ('run_id', 'transcription', 'response_text', 'image_prompt')}
+        try:
+            if vector is None:
+                vector = await self.embed_text(result['transcription'])
+            await self.worker_pool.run_io(self.vector_index.add, [vector], [payload])
+        except Exception as e:
+            print(f"Indexing transcript failed: {type(e).__name__}: {str(e)}")
+
+    async def _respond_and_draw(self, text: str, image_path: str,
+                                prior: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         # 2. Generate response and image prompt
-        response = await self.generate_response(text)
+        started = time.perf_counter()
+        if prior is not None:
+            response = {'response': prior['response_text'], 'image_prompt': prior['image_prompt']}
+        else:
+            response = await self._stage('respond', lambda: self.generate_response(text))
         text_response = response['response']
         image_prompt = response['image_prompt']
         print(f"Generated response: {text_response}")
         print(f"Image prompt: {image_prompt}")
         
         # 3. Generate image
-        image_path = await self.generate_image(
-            image_prompt, 
-            str(output_dir / 'response.png')
-        )
+        image_started = time.perf_counter()
+        image_error = None
+        try:
+            image_path = await self._stage('image', lambda: self.generate_image(image_prompt, image_path))
+        except CircuitOpenError as e:
+            # The image backend is known to be down: return the text now instead of waiting on it
+            print(f"Skipping image generation: {e}")
+            image_path, image_error = None, str(e)
         
-        return {
+        result = {
             'transcription': text,
             'response_text': text_response,
-            'image_file': image_path
-        } 
\ No newline at end of file
+            'image_prompt': image_prompt,
+            'image_file': image_path,
+            'timings': {
+                'respond': image_started - started,
+                'image': time.perf_counter() - image_started,
+            }
+        }
+        if image_error:
+            result['image_error'] = image_error
+        return result
+
+    async def _reuse_run(self, input_sha256: str, image_path: str) -> Optional[Dict[str, Any]]:
+        runs = await self.worker_pool.run_io(
+            self.store.find_by_input, input_sha256, self.TRANSCRIPTION_MODEL,
+            self.CHAT_MODEL, self.IMAGE_MODEL
+        )
+        if not runs or not runs[0].image_sha256 or not self.store.has_blob(runs[0].image_sha256):
+            return None
+        run = runs[0]
+        await self.worker_pool.run_io(self.store.materialize, run.image_sha256, image_path)
+        print(f"Reusing stored run {run.run_id}")
+        return {
+            'transcription': run.transcription,
+            'response_text': run.response_text,
+            'image_prompt': run.image_prompt,
+            'image_file': image_path,
+            'run_id': run.run_id,
+            'reused': True,
+        }
+
+    async def _record_run(self, input_sha256: str, audio_file_path: str, result: Dict[str, Any]) -> str:
+        image_sha256 = None
+        if result['image_file']:
+            image_sha256 = await self.worker_pool.run_io(self.store.put_file, result['image_file'])
+        from artifact_store import RunRecord
+
+        timings = result['timings']
+        run = RunRecord(
+            input_sha256=input_sha256,
+            input_name=os.path.basename(audio_file_path),
+            transcription=result['transcription'],
+            response_text=result['response_text'],
+            image_prompt=result['image_prompt'],
+            image_sha256=image_sha256,
+            transcription_model=self.TRANSCRIPTION_MODEL,
+            chat_model=self.CHAT_MODEL,
+            image_model=self.IMAGE_MODEL,
+            transcribe_seconds=timings.get('transcribe'),
+            respond_seconds=timings.get('respond'),
+            image_seconds=timings.get('image'),
+            total_seconds=timings.get('total'),
+        )
+        return await self.worker_pool.run_io(self.store.record_run, run)
+
+    async def _process_speculative(
+        self,
+        audio_bytes: bytes,
+        output_dir: Path,
+        speculative_seconds: float,
+        similarity_threshold: float
+    ) -> Dict[str, Any]:
+        """Draft the response from a transcribed prefix while the full transcription runs.
+
+        The draft is kept when the full transcript stays on the same subject
+        (local content-word similarity at or above ``similarity_threshold``);
+        otherwise it is cancelled and the response regenerated from the full
+        text.
+        """
+        final_path = str(output_dir / 'response.png')
+        prefix = slice_wav(audio_bytes, 0.0, speculative_seconds)
+        started = time.perf_counter()
+        full_task = asyncio.ensure_future(self.transcribe_bytes(audio_bytes))
+        draft_task = None
+        draft_path = str(output_dir / 'response.draft.png')
+        try:
+            partial = await self.transcribe_bytes(prefix)
+            print(f"Partial transcription ({speculative_seconds:.0f}s): {partial}")
+            draft_task = asyncio.ensure_future(self._respond_and_draw(partial, draft_path))
+            
+            text = await full_task
+            transcribe_seconds = time.perf_counter() - started
+            print(f"Transcribed text: {text}")
+            similarity = intent_similarity(partial, text)
+            
+            if similarity >= similarity_threshold:
+                result = await draft_task
+                if result['image_file']:
+                    os.replace(draft_path, final_path)
+                    result['image_file'] = final_path
+                result['transcription'] = text
+                print(f"Speculative draft kept (similarity {similarity:.2f})")
+            else:
+                print(f"Speculative draft discarded (similarity {similarity:.2f}); regenerating")
+                await self._cancel_draft(draft_task, draft_path)
+                result = await self._respond_and_draw(text, final_path)
+        except BaseException:
+            full_task.cancel()
+            await asyncio.gather(full_task, return_exceptions=True)
+            if draft_task is not None:
+                await self._cancel_draft(draft_task, draft_path)
+            raise
+        
+        result['timings']['transcribe'] = transcribe_seconds
+        result['speculation'] = {
+            'kept': similarity >= similarity_threshold,
+            'similarity': similarity,
+            'partial_transcription': partial,
+        }
+        return result
+
+    async def _cancel_draft(self, draft_task: asyncio.Future, draft_path: str):
+        draft_task.cancel()
+        # asyncio.wait doesn't raise, so our own cancellation still propagates
+        await asyncio.wait({draft_task})
+        if not draft_task.cancelled():
+            draft_task.exception()
+        Path(draft_path).unlink(missing_ok=True)
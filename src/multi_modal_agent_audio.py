@@ -3,40 +3,108 @@ import asyncio
 from pathlib import Path
 import httpx
 import json
-from typing import Optional, BinaryIO
+from typing import Optional, BinaryIO, List, Sequence, Union
+from single_flight import SingleFlight, fingerprint
+
+AudioInput = Union[str, Path, BinaryIO]
 
 class MultiModalAgentAudio:
-    """Simplified MultiModal Agent for audio processing only"""
+    """Simplified MultiModal Agent for audio processing only.
+
+    Keeps one HTTP client (and its connection pool) for its lifetime and
+    selects the transcription model once, so it can serve many requests.
+    Use ``async with`` or call ``aclose()`` when done.
+    """
     
-    def __init__(self, api_key: str, base_url: str):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        quiet: bool = False,
+        max_concurrency: int = 4,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
         self.api_key = api_key
         self.base_url = base_url
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Accept": "application/json"
         }
+        self.quiet = quiet
+        self.max_concurrency = max_concurrency
+        self.single_flight = SingleFlight()
+        self._client = http_client
+        self._selected_model: Optional[str] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Long-lived client reused across requests."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                verify=False,
+                headers=self.headers,
+                timeout=30.0,
+                limits=httpx.Limits(max_keepalive_connections=self.max_concurrency)
+            )
+        return self._client
+    
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.aclose()
+    
+    def _log(self, message: str):
+        if not self.quiet:
+            print(message)
     
     async def list_models(self) -> dict:
         """List available models"""
+        # Concurrent transcriptions share one catalog request
+        return await self.single_flight.do(fingerprint("models", self.base_url), self._list_models)
+    
+    async def _list_models(self) -> dict:
         url = f"{self.base_url}/v1/models"
         
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.get(
-                url,
-                headers=self.headers,
-                timeout=30.0
-            )
-            
-            if response.status_code != 200:
-                print(f"Error response: {response.text}")
-                response.raise_for_status()
-            
-            return response.json()
+        response = await self.client.get(url, headers=self.headers)
+        
+        if response.status_code != 200:
+            print(f"Error response: {response.text}")
+            response.raise_for_status()
+        
+        return response.json()
+    
+    async def select_model(self) -> str:
+        """First catalog model that mentions 'speech', 'audio' or 'whisper', cached after the first lookup."""
+        if self._selected_model:
+            return self._selected_model
+        
+        models = await self.list_models()
+        if self._selected_model:
+            return self._selected_model
+        
+        self._log("\nAvailable models:")
+        for model_info in models.get('data', []):
+            self._log(f"- {model_info['id']}")
+        
+        for model_info in models.get('data', []):
+            model_id = model_info['id'].lower()
+            if 'speech' in model_id or 'audio' in model_id or 'whisper' in model_id:
+                self._selected_model = model_info['id']
+                self._log(f"\nSelected model: {self._selected_model}")
+                return self._selected_model
+        
+        raise ValueError("No suitable audio transcription model found")
     
     async def transcribe_audio(
         self,
         audio_file: BinaryIO,
-        model: Optional[str] = None,  # Will be set after checking available models
+        model: Optional[str] = None,  # Selected from the model catalog when not given
         language: Optional[str] = None,
         prompt: Optional[str] = None
     ) -> dict:
@@ -52,23 +120,7 @@ class MultiModalAgentAudio:
         Returns:
             dict: Transcription result
         """
-        # Check available models first
-        models = await self.list_models()
-        print("\nAvailable models:")
-        for model_info in models.get('data', []):
-            print(f"- {model_info['id']}")
-        
-        # Use first available model that mentions 'speech' or 'audio'
-        if not model:
-            for model_info in models.get('data', []):
-                model_id = model_info['id'].lower()
-                if 'speech' in model_id or 'audio' in model_id or 'whisper' in model_id:
-                    model = model_info['id']
-                    print(f"\nSelected model: {model}")
-                    break
-        
-        if not model:
-            raise ValueError("No suitable audio transcription model found")
+        model = model or await self.select_model()
         
         # Prepare the multipart form data
         files = {
@@ -85,22 +137,43 @@ class MultiModalAgentAudio:
         # Make the API request
         url = f"{self.base_url}/v1/audio/transcriptions"
         
-        print(f"\nSending transcription request to: {url}")
-        print(f"Model: {model}")
+        self._log(f"\nSending transcription request to: {url}")
+        self._log(f"Model: {model}")
         
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.post(
-                url,
-                headers=self.headers,
-                files=files,
-                timeout=30.0
-            )
-            
-            if response.status_code != 200:
-                print(f"Error response: {response.text}")
-                response.raise_for_status()
-            
-            return response.json()
+        response = await self.client.post(url, headers=self.headers, files=files)
+        
+        if response.status_code != 200:
+            print(f"Error response: {response.text}")
+            response.raise_for_status()
+        
+        return response.json()
+    
+    async def transcribe_many(
+        self,
+        audio_files: Sequence[AudioInput],
+        model: Optional[str] = None,
+        language: Optional[str] = None,
+        prompt: Optional[str] = None,
+        return_exceptions: bool = True
+    ) -> List[Union[dict, BaseException]]:
+        """Transcribe several files concurrently (at most ``max_concurrency`` at once), in input order.
+        
+        Paths are opened only while their request is in flight. With
+        ``return_exceptions`` a failed file yields its exception instead of
+        cancelling the rest.
+        """
+        model = model or await self.select_model()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def _one(audio: AudioInput) -> dict:
+            async with semaphore:
+                if isinstance(audio, (str, Path)):
+                    with open(audio, 'rb') as audio_file:
+                        return await self.transcribe_audio(audio_file, model, language, prompt)
+                return await self.transcribe_audio(audio, model, language, prompt)
+        
+        return await asyncio.gather(*[_one(audio) for audio in audio_files],
+                                    return_exceptions=return_exceptions)
 
 async def test_transcription():
     """Test the audio transcription functionality"""
@@ -169,6 +242,7 @@ async def test_transcription():
         print(f"Error: {type(e).__name__}: {str(e)}")
         raise
     finally:
+        await agent.aclose()
         # Clean up test file
         try:
             if output_wav.exists():
@@ -0,0 +1,109 @@
+import asyncio
+import re
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional
+from accounting import estimate_text_tokens
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+# A run of 1-6 words immediately repeated one or more times ("thank you thank you thank you")
+_REPEATED_RUN = re.compile(r'\b(\w+(?:\s+\w+){0,5})(?:[\s,]+\1\b)+', re.IGNORECASE)
+
+@lru_cache(maxsize=8)
+def _tokenizer(model: Optional[str]):
+    """tiktoken encoding for the model, or None when tiktoken isn't installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """Token count using tiktoken if available, else a characters-per-token heuristic."""
+    encoding = _tokenizer(model)
+    if encoding is None:
+        return estimate_text_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_END.split(text.strip()) if s]
+
+def dedupe_phrases(text: str) -> str:
+    """Collapse stuttered word runs and drop sentences already seen (case/punctuation-insensitive)."""
+    collapsed = _REPEATED_RUN.sub(r'\1', text)
+    seen = set()
+    kept = []
+    for sentence in split_sentences(collapsed):
+        key = re.sub(r'\W+', ' ', sentence).strip().lower()
+        if key and key in seen:
+            continue
+        seen.add(key)
+        kept.append(sentence)
+    return " ".join(kept)
+
+def chunk_text(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """Group whole sentences into chunks of at most ``max_tokens`` (long sentences are split)."""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for sentence in split_sentences(text):
+        tokens = estimate_tokens(sentence, model)
+        if tokens > max_tokens:
+            # A single oversized sentence: cut it by characters
+            if current:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            step = max(1, len(sentence) * max_tokens // tokens)
+            chunks.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Keep the start and end of ``text`` within ``max_tokens``, eliding the middle."""
+    tokens = estimate_tokens(text, model)
+    if tokens <= max_tokens:
+        return text
+    keep = max(1, len(text) * max_tokens // tokens - 5)
+    head = keep * 2 // 3
+    return f"{text[:head]} ... {text[len(text) - (keep - head):]}"
+
+async def compress_transcript(
+    text: str,
+    summarize: Callable[[str, int], Awaitable[str]],
+    max_tokens: int,
+    chunk_tokens: int = 2000,
+    max_concurrency: int = 4,
+    max_rounds: int = 2,
+    model: Optional[str] = None
+) -> str:
+    """Bring a transcript under ``max_tokens`` before it is sent to chat.
+
+    Deduplicates first; if still too long, summarizes chunks concurrently
+    (map) and joins the summaries (reduce), repeating up to ``max_rounds``
+    times, then truncates as a last resort so the prompt size is bounded.
+    """
+    text = dedupe_phrases(text)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _summarize(chunk: str, target: int) -> str:
+        async with semaphore:
+            return await summarize(chunk, target)
+
+    for _ in range(max_rounds):
+        if estimate_tokens(text, model) <= max_tokens:
+            return text
+        chunks = chunk_text(text, chunk_tokens, model)
+        target = max(32, max_tokens // len(chunks))
+        summaries = await asyncio.gather(*[_summarize(chunk, target) for chunk in chunks])
+        text = dedupe_phrases(" ".join(s.strip() for s in summaries))
+
+    return truncate_to_tokens(text, max_tokens, model)
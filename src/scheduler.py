@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+import contextvars
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+class PreemptedError(Exception):
+    """A queued call was pushed out by higher-priority work; retry after ``retry_after`` seconds."""
+
+    def __init__(self, priority: str, retry_after: float = 1.0, reason: str = "preempted"):
+        super().__init__(f"{priority} call {reason}; retry in {retry_after:.1f}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+_current: contextvars.ContextVar[str] = contextvars.ContextVar("priority", default=INTERACTIVE)
+
+def current_priority() -> str:
+    """Priority of the work this task is doing; interactive unless marked otherwise."""
+    return _current.get()
+
+@contextlib.contextmanager
+def priority_scope(priority: str) -> Iterator[str]:
+    token = _current.set(priority)
+    try:
+        yield priority
+    finally:
+        _current.reset(token)
+
+class PriorityScheduler:
+    """Admits outbound calls by priority class.
+
+    - At most ``max_concurrency`` calls run at once. ``reserved`` slots are
+      held back for a class and those above it, so a burst of batch calls
+      can never occupy every slot. Reservations are shrunk when they would
+      leave some class no slot at all.
+    - Waiting calls sit in one FIFO queue per class. Free slots go to the
+      class with the lowest virtual time, which advances by 1/weight per
+      dispatch, so busy classes share slots in proportion to ``weights``
+      and an idle class's capacity goes to whoever is waiting.
+    - At most ``max_queued`` calls wait. When the queue is full, a new call
+      pushes out the newest queued call of a lower class (which gets
+      PreemptedError); with nothing lower to push out, it is refused.
+
+    Classes rank by weight, highest first.
+    """
+
+    def __init__(self, max_concurrency: int = 8, weights: Optional[Dict[str, float]] = None,
+                 reserved: Optional[Dict[str, int]] = None, max_queued: int = 256):
+        self.max_concurrency = max_concurrency
+        self.weights = dict(weights or {INTERACTIVE: 8.0, BATCH: 1.0})
+        self.reserved = dict(reserved if reserved is not None else {INTERACTIVE: 1})
+        self.max_queued = max_queued
+        self.ranking = sorted(self.weights, key=lambda p: -self.weights[p])
+        unknown = set(self.reserved) - set(self.weights)
+        if unknown:
+            raise ValueError(f"Reserved slots for unknown priorities: {sorted(unknown)}")
+        if max_concurrency < 1 or any(n < 0 for n in self.reserved.values()):
+            raise ValueError("max_concurrency must be at least 1 and reservations non-negative")
+        self._clamp_reserved()
+        self._queues: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in self.ranking}
+        self._vtime: Dict[str, float] = {p: 0.0 for p in self.ranking}
+        self._clock = 0.0
+        self.active = 0
+        self.active_by: Dict[str, int] = defaultdict(int)
+        self.dispatched: Dict[str, int] = defaultdict(int)
+        self.preempted: Dict[str, int] = defaultdict(int)
+        self.wait_seconds: Dict[str, float] = defaultdict(float)
+
+    def _clamp_reserved(self):
+        """Shrink reservations, lowest class first, until every class can get a slot.
+
+        Without this a small ``max_concurrency`` (e.g. 1 with one interactive
+        slot reserved) would leave batch calls queued forever.
+        """
+        for priority in reversed(self.ranking):
+            excess = 1 - self._limit(self.ranking[-1])
+            if excess <= 0:
+                return
+            held = self.reserved.get(priority, 0)
+            if held and priority != self.ranking[-1]:
+                self.reserved[priority] = max(0, held - excess)
+                print(f"Scheduler: {self.max_concurrency} slots can't reserve {held} for {priority}; "
+                      f"reserving {self.reserved[priority]}")
+
+    def _limit(self, priority: str) -> int:
+        """Slots a class may fill: everything but what's reserved for classes above it."""
+        rank = self.ranking.index(priority)
+        return self.max_concurrency - sum(self.reserved.get(p, 0) for p in self.ranking[:rank])
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _check(self, priority: str):
+        if priority not in self.weights:
+            raise ValueError(f"Unknown priority {priority!r}; expected one of {self.ranking}")
+
+    async def acquire(self, priority: str):
+        self._check(priority)
+        if self.queued() >= self.max_queued:
+            self._preempt_below(priority)
+
+        future = asyncio.get_running_loop().create_future()
+        future.queued_at = time.monotonic()
+        queue = self._queues[priority]
+        if not queue:
+            # Coming back from idle: no credit for the time spent away
+            self._vtime[priority] = max(self._vtime[priority], self._clock)
+        queue.append(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(priority)  # Granted just as the caller gave up
+            elif future in queue:
+                queue.remove(future)
+            raise
+
+    def _preempt_below(self, priority: str):
+        rank = self.ranking.index(priority)
+        for lower in reversed(self.ranking[rank + 1:]):
+            queue = self._queues[lower]
+            while queue:
+                victim = queue.pop()
+                if not victim.done():
+                    self.preempted[lower] += 1
+                    victim.set_exception(PreemptedError(lower, retry_after=1.0))
+                    return
+        self.preempted[priority] += 1
+        raise PreemptedError(priority, retry_after=1.0, reason="refused, scheduler queue full")
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency:
+            candidates = [p for p in self.ranking
+                          if self._queues[p] and self.active < self._limit(p)]
+            if not candidates:
+                return
+            # Lowest virtual time wins; ties go to the higher-ranked class
+            priority = min(candidates, key=lambda p: (self._vtime[p], self.ranking.index(p)))
+            future = self._queues[priority].popleft()
+            if future.done():
+                continue  # Cancelled while queued
+            self._clock = self._vtime[priority]
+            self._vtime[priority] += 1.0 / self.weights[priority]
+            self.active += 1
+            self.active_by[priority] += 1
+            self.dispatched[priority] += 1
+            self.wait_seconds[priority] += time.monotonic() - future.queued_at
+            future.set_result(None)
+
+    def _release(self, priority: str):
+        self.active -= 1
+        self.active_by[priority] -= 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold one slot for the duration of a call, at ``priority`` or the current task's."""
+        priority = priority or current_priority()
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {p: {
+            'active': self.active_by[p],
+            'queued': len(self._queues[p]),
+            'dispatched': self.dispatched[p],
+            'preempted': self.preempted[p],
+            'mean_wait_seconds': round(self.wait_seconds[p] / self.dispatched[p], 4) if self.dispatched[p] else 0.0,
+        } for p in self.ranking}
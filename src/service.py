@@ -0,0 +1,386 @@
+"""ASGI front-end exposing the multi-modal pipeline over HTTP.
+
+One warmed MultiModalAgent (and its connection pool) serves every request.
+Endpoints:
+
+    POST /transcribe   raw WAV body                 -> {"transcription": ...}
+    POST /respond      {"text": ...}                -> {"response": ..., "image_prompt": ...}
+    POST /image        {"prompt": ..., "n", "sizes"} -> {"images": [...]}
+    POST /pipeline     raw WAV body                 -> text/event-stream of stage results
+    GET  /metrics      Prometheus text format
+
+Work is admitted through a bounded queue: at most ``max_inflight`` requests
+run at once and at most ``max_queue`` wait; beyond that the service answers
+503 with Retry-After instead of piling up memory.
+
+Requests run at interactive priority unless they send ``x-priority: batch``
+(or another class known to the agent's scheduler).
+
+Clients may send ``x-request-timeout: <seconds>`` (capped by the service's
+``request_timeout``); work still running at the deadline is cancelled and
+answered with 504.
+
+Usage records (see accounting) carry the request's ``x-request-id``, or
+an id generated for it.
+"""
+import asyncio
+import json
+import math
+import re
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from accounting import request_scope
+from deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope, run_stage
+from scheduler import INTERACTIVE, PreemptedError, priority_scope
+from key_pool import NoUsableKeyError
+
+MAX_BODY_BYTES = 50 * 1024 * 1024
+# Bounds for POST /image, so one request can't ask the gateway for unbounded work
+MAX_IMAGES_PER_SIZE = 10
+MAX_IMAGE_SIZES = 4
+IMAGE_SIZE = re.compile(r"[1-9][0-9]{1,4}x[1-9][0-9]{1,4}")
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+class AdmissionQueue:
+    """Bounded admission: ``max_inflight`` running, ``max_queue`` waiting, the rest rejected.
+
+    A request waits for its slot no longer than its deadline allows.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def __aenter__(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPError(503, "Server busy, retry later", {"retry-after": "1"})
+        deadline = current_deadline()
+        self.waiting += 1
+        try:
+            if deadline is None:
+                await self._semaphore.acquire()
+            else:
+                await asyncio.wait_for(self._semaphore.acquire(), deadline.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("admission") from None
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.inflight -= 1
+        self._semaphore.release()
+
+class ServiceMetrics:
+    def __init__(self):
+        self.requests: Dict[tuple, int] = defaultdict(int)
+        self.latency_sum: Dict[str, float] = defaultdict(float)
+        self.latency_count: Dict[str, int] = defaultdict(int)
+
+    def observe(self, endpoint: str, status: int, seconds: float):
+        self.requests[(endpoint, status)] += 1
+        self.latency_sum[endpoint] += seconds
+        self.latency_count[endpoint] += 1
+
+class AgentService:
+    def __init__(self, agent, max_inflight: int = 16, max_queue: int = 64,
+                 output_dir: str = "output/service", warmup: bool = True,
+                 request_timeout: Optional[float] = None):
+        self.agent = agent
+        self.request_timeout = request_timeout
+        self.admission = AdmissionQueue(max_inflight, max_queue)
+        self.metrics = ServiceMetrics()
+        self.output_dir = Path(output_dir)
+        self.warmup = warmup
+        self.routes: Dict[tuple, Callable[[Dict[str, Any], bytes, Callable], Awaitable[int]]] = {
+            ("POST", "/transcribe"): self.handle_transcribe,
+            ("POST", "/respond"): self.handle_respond,
+            ("POST", "/image"): self.handle_image,
+            ("POST", "/pipeline"): self.handle_pipeline,
+            ("GET", "/metrics"): self.handle_metrics,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        started = time.perf_counter()
+        path = scope["path"]
+        status = 500
+        try:
+            handler = self.routes.get((scope["method"], path))
+            if handler is None:
+                raise HTTPError(404, f"No route for {scope['method']} {path}")
+            self._check_content_length(scope)
+            if path == "/metrics":
+                status = await handler(scope, await self._read_body(receive), send)
+            else:
+                timeout = self._request_timeout(scope)
+                with deadline_scope(Deadline.after(timeout) if timeout is not None else None), \
+                        priority_scope(self._priority(scope)), request_scope(self._request_id(scope)):
+                    # Bodies are only buffered by admitted requests, so admission bounds memory too
+                    async with self.admission:
+                        body = await run_stage("upload", 1.0, lambda: self._read_body(receive))
+                        status = await handler(scope, body, send)
+        except HTTPError as e:
+            status = e.status
+            await self._send_json(send, e.status, {"error": e.message}, e.headers)
+        except Exception as e:
+            status = self._error_status(e)
+            print(f"Error: {type(e).__name__}: {str(e)}")
+            headers = {}
+            if hasattr(e, "retry_after"):
+                headers["retry-after"] = str(max(1, math.ceil(e.retry_after)))
+            await self._send_json(send, status, {"error": f"{type(e).__name__}: {str(e)}"}, headers)
+        finally:
+            self.metrics.observe(path, status, time.perf_counter() - started)
+
+    @staticmethod
+    def _error_status(error: Exception) -> int:
+        import httpx
+        from accounting import BudgetExceededError
+        from circuit_breaker import CircuitOpenError
+        from structured_output import StructuredOutputError
+
+        if isinstance(error, BudgetExceededError):
+            return 429
+        if isinstance(error, (CircuitOpenError, PreemptedError, NoUsableKeyError)):
+            return 503  # Backend known to be down; fail fast
+        if isinstance(error, DeadlineExceeded):
+            return 504
+        if isinstance(error, (httpx.HTTPError, StructuredOutputError)):
+            return 502  # Upstream gateway or model failure
+        return 500
+
+    def _priority(self, scope) -> str:
+        value = dict(scope.get("headers") or []).get(b"x-priority")
+        if value is None:
+            return INTERACTIVE
+        priority = value.decode("latin-1").strip().lower()
+        scheduler = getattr(self.agent, "scheduler", None)
+        known = scheduler.ranking if scheduler is not None else [INTERACTIVE]
+        if priority not in known:
+            raise HTTPError(400, f"x-priority must be one of {known}")
+        return priority
+
+    @staticmethod
+    def _request_id(scope) -> Optional[str]:
+        value = dict(scope.get("headers") or []).get(b"x-request-id")
+        if value is None:
+            return None
+        return value.decode("latin-1").strip()[:128] or None
+
+    def _request_timeout(self, scope) -> Optional[float]:
+        """Seconds this request may take: the client's header, never above the service limit."""
+        value = dict(scope.get("headers") or []).get(b"x-request-timeout")
+        if value is None:
+            return self.request_timeout
+        try:
+            timeout = float(value)
+        except ValueError:
+            raise HTTPError(400, "x-request-timeout must be a number of seconds")
+        if timeout <= 0:
+            raise HTTPError(400, "x-request-timeout must be positive")
+        return timeout if self.request_timeout is None else min(timeout, self.request_timeout)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.warmup:
+                    await self.agent.warmup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.agent.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    def _check_content_length(scope):
+        value = dict(scope.get("headers") or []).get(b"content-length")
+        if value is None:
+            return
+        try:
+            length = int(value)
+        except ValueError:
+            raise HTTPError(400, "Invalid content-length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+
+    async def _read_body(self, receive) -> bytes:
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(499, "Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise HTTPError(413, "Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    @staticmethod
+    def _json_body(body: bytes) -> Dict[str, Any]:
+        try:
+            value = json.loads(body or b"{}")
+        except json.JSONDecodeError as e:
+            raise HTTPError(400, f"Invalid JSON body: {e}")
+        if not isinstance(value, dict):
+            raise HTTPError(400, "JSON body must be an object")
+        return value
+
+    async def _send_json(self, send, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> int:
+        body = json.dumps(payload, default=str).encode()
+        raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        raw_headers += [(k.encode(), v.encode()) for k, v in (headers or {}).items()]
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
+        return status
+
+    async def handle_transcribe(self, scope, body: bytes, send) -> int:
+        if not body:
+            raise HTTPError(400, "Request body must contain WAV audio")
+        text = await run_stage("transcribe", 1.0, lambda: self.agent.transcribe_bytes(body))
+        return await self._send_json(send, 200, {"transcription": text})
+
+    async def handle_respond(self, scope, body: bytes, send) -> int:
+        text = self._json_body(body).get("text")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, "Field 'text' is required")
+        response = await run_stage("respond", 1.0, lambda: self.agent.generate_response(text))
+        return await self._send_json(send, 200, response)
+
+    async def handle_image(self, scope, body: bytes, send) -> int:
+        request = self._json_body(body)
+        prompt = request.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise HTTPError(400, "Field 'prompt' is required")
+        n = request.get("n", 1)
+        if not isinstance(n, int) or isinstance(n, bool) or not 1 <= n <= MAX_IMAGES_PER_SIZE:
+            raise HTTPError(400, f"Field 'n' must be an integer from 1 to {MAX_IMAGES_PER_SIZE}")
+        sizes = request.get("sizes")
+        if sizes is not None and (
+                not isinstance(sizes, list) or not 1 <= len(sizes) <= MAX_IMAGE_SIZES
+                or not all(isinstance(size, str) and IMAGE_SIZE.fullmatch(size) for size in sizes)):
+            raise HTTPError(400, f"Field 'sizes' must be a list of 1 to {MAX_IMAGE_SIZES} 'WxH' strings")
+        images = await run_stage("image", 1.0, lambda: self.agent.generate_images(
+            prompt, self.output_dir, n=n, sizes=sizes, name=f"image_{uuid.uuid4().hex[:12]}"
+        ))
+        return await self._send_json(send, 200, {"images": images})
+
+    async def handle_pipeline(self, scope, body: bytes, send) -> int:
+        """Run all three stages, streaming each result as a server-sent event.
+
+        This does not go through ``process_input``, which only returns once
+        every stage is done and reads its audio from a file. The service's
+        agent (see ``create_app``) has no artifact store, vector index or
+        profilers configured, so there is nothing to reuse or record here.
+        """
+        if not body:
+            raise HTTPError(400, "Request body must contain WAV audio")
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")
+        ]})
+
+        async def event(name: str, data: Any):
+            payload = f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+            await send({"type": "http.response.body", "body": payload, "more_body": True})
+
+        try:
+            text = await run_stage("transcribe", 1.0, lambda: self.agent.transcribe_bytes(body))
+            await event("transcription", {"transcription": text})
+            response = await run_stage("respond", 1.0, lambda: self.agent.generate_response(text))
+            await event("response", response)
+            images = await run_stage("image", 1.0, lambda: self.agent.generate_images(
+                response["image_prompt"], self.output_dir, name=f"pipeline_{uuid.uuid4().hex[:12]}"
+            ))
+            await event("image", {"images": images})
+            await event("done", {})
+        except Exception as e:
+            # Headers are already sent; report the failure in-stream
+            await event("error", {"error": f"{type(e).__name__}: {str(e)}"})
+        await send({"type": "http.response.body", "body": b""})
+        return 200
+
+    async def handle_metrics(self, scope, body: bytes, send) -> int:
+        lines = [
+            "# TYPE service_requests_total counter",
+            *[f'service_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+              for (endpoint, status), count in sorted(self.metrics.requests.items())],
+            "# TYPE service_request_seconds summary",
+            *[f'service_request_seconds_sum{{endpoint="{endpoint}"}} {total:.6f}'
+              for endpoint, total in sorted(self.metrics.latency_sum.items())],
+            *[f'service_request_seconds_count{{endpoint="{endpoint}"}} {count}'
+              for endpoint, count in sorted(self.metrics.latency_count.items())],
+            "# TYPE service_inflight gauge",
+            f"service_inflight {self.admission.inflight}",
+            "# TYPE service_queued gauge",
+            f"service_queued {self.admission.waiting}",
+            "# TYPE service_rejected_total counter",
+            f"service_rejected_total {self.admission.rejected}",
+            "# TYPE agent_coalesced_total counter",
+            f"agent_coalesced_total {self.agent.single_flight.coalesced}",
+        ]
+        scheduler = getattr(self.agent, "scheduler", None)
+        if scheduler is not None:
+            lines.append("# TYPE agent_scheduler gauge")
+            for priority, stats in scheduler.snapshot().items():
+                for key, value in stats.items():
+                    lines.append(f'agent_scheduler{{priority="{priority}",kind="{key}"}} {value}')
+        key_pool = getattr(self.agent, "key_pool", None)
+        if key_pool is not None:
+            lines.append("# TYPE agent_api_key_requests_total counter")
+            for key in key_pool.snapshot():
+                lines.append(f'agent_api_key_requests_total{{key="{key["key"]}",state="{key["state"]}"}} {key["requests"]}')
+        lines.append("# TYPE agent_circuit_open gauge")
+        for (base_url, route, model), breaker in sorted(self.agent.breakers.items()):
+            lines.append(f'agent_circuit_open{{route="{route}",model="{model}"}} {int(breaker.state == "open")}')
+        for model, totals in sorted(self.agent.ledger.by_model().items()):
+            for key, value in sorted(totals.items()):
+                lines.append(f'agent_usage{{model="{model}",kind="{key}"}} {value}')
+        body = ("\n".join(lines) + "\n").encode()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; version=0.0.4")]})
+        await send({"type": "http.response.body", "body": body})
+        return 200
+
+def create_app(api_key: str, base_url: str, max_upstream: Optional[int] = None,
+               key_pool=None, ledger=None, **kwargs) -> AgentService:
+    """Service around a new agent; ``max_upstream`` bounds concurrent gateway calls, shared by priority."""
+    from multi_modal_agent import MultiModalAgent
+    from scheduler import PriorityScheduler
+
+    scheduler = PriorityScheduler(max_concurrency=max_upstream) if max_upstream else None
+    agent = MultiModalAgent(api_key, base_url, scheduler=scheduler, key_pool=key_pool, ledger=ledger)
+    return AgentService(agent, **kwargs)
+
+def serve(app: AgentService, host: str = "127.0.0.1", port: int = 8000):
+    """Run the app under uvicorn (optional dependency)."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("The HTTP service needs uvicorn: pip install uvicorn")
+    uvicorn.run(app, host=host, port=port, lifespan="on")
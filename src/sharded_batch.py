@@ -0,0 +1,289 @@
+"""Batch runs split into deterministic shards that any number of hosts can work on.
+
+Every input belongs to shard ``sha256(path) % shards``, so hosts that see
+the same input list (same relative paths) agree on the split without
+talking to each other. Shards live under a shared directory::
+
+    <root>/shards/shard-0003-of-0008/
+        claim           which worker owns the shard
+        manifest.json   inputs, owner, heartbeat and progress
+        results.jsonl   checkpoint: one line per finished input
+        outputs/<key>/  files written by process_input for that input
+
+A restarted shard skips inputs already recorded as ok in its checkpoint.
+``merge_shards`` combines the checkpoints and reports shards that are
+missing, stalled (no heartbeat for ``stale_after`` seconds), still running
+or much slower than the rest.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import statistics
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from scheduler import BATCH, priority_scope
+
+def input_key(path: str) -> str:
+    return hashlib.sha256(Path(path).as_posix().encode("utf-8")).hexdigest()[:16]
+
+def shard_of(path: str, shards: int) -> int:
+    return int(hashlib.sha256(Path(path).as_posix().encode("utf-8")).hexdigest(), 16) % shards
+
+def partition(inputs: Iterable[str], shard: int, shards: int) -> List[str]:
+    """This shard's inputs, deduplicated and sorted."""
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard {shard} out of range for {shards} shards")
+    return sorted({str(p) for p in inputs if shard_of(str(p), shards) == shard})
+
+def shard_dir(root: Path, shard: int, shards: int) -> Path:
+    return Path(root) / "shards" / f"shard-{shard:04d}-of-{shards:04d}"
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _write_json(path: Path, data: Dict[str, Any]):
+    temp = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+    temp.write_text(json.dumps(data, indent=2, default=str))
+    os.replace(temp, path)
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+def read_checkpoint(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Latest record per input; a torn last line from a crash is ignored."""
+    records: Dict[str, Dict[str, Any]] = {}
+    if not path.exists():
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record['input']] = record
+    return records
+
+def claim_shard(root: Path, shards: int, stale_after: float = 300.0,
+                worker: Optional[str] = None) -> Optional[int]:
+    """Claim the first shard nobody owns, or whose owner stopped heartbeating.
+
+    A claim is written to a temp file and hard-linked into place, which
+    fails if the claim exists and is atomic on a local or shared
+    filesystem, so a claim is never seen half written. Taking over a
+    stalled shard is not atomic: two workers may both take it, and the
+    checkpoint then simply records some inputs twice, which
+    ``merge_shards`` tolerates.
+    """
+    worker = worker or worker_id()
+    for shard in range(shards):
+        directory = shard_dir(root, shard, shards)
+        directory.mkdir(parents=True, exist_ok=True)
+        claim = directory / "claim"
+        manifest = _read_json(directory / "manifest.json")
+        if manifest is not None and manifest.get('finished_at'):
+            continue
+        if _link_claim(claim, {'worker': worker, 'claimed_at': time.time()}):
+            return shard
+        # Alive if the shard heartbeated or was (re)claimed recently
+        owner = _read_json(claim)
+        if owner is None:
+            # Unreadable (e.g. written by an older version): judge it by when it was written
+            try:
+                owner = {'claimed_at': claim.stat().st_mtime}
+            except FileNotFoundError:
+                owner = {}
+        last_seen = max((manifest or {}).get('heartbeat_at', 0), owner.get('claimed_at', 0))
+        if time.time() - last_seen < stale_after:
+            continue
+        print(f"Taking over stalled shard {shard} from {owner.get('worker')}")
+        _write_json(claim, {'worker': worker, 'claimed_at': time.time(), 'took_over': owner.get('worker')})
+        return shard
+    return None
+
+def _link_claim(claim: Path, data: Dict[str, Any]) -> bool:
+    """Create ``claim`` complete with ``data``; False if it already exists."""
+    temp = claim.with_name(f"{claim.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+    temp.write_text(json.dumps(data))
+    try:
+        os.link(temp, claim)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        temp.unlink(missing_ok=True)
+
+class ShardRunner:
+    """Runs one shard of a batch through ``agent.process_input`` with a checkpoint.
+
+    Up to ``concurrency`` inputs are in flight, at batch priority; like
+    StagedPipeline's workers, that is per usable key when the agent signs
+    requests from a key pool (with ``scale_with_keys``). The manifest's heartbeat is refreshed every ``heartbeat_seconds`` while
+    the shard runs, so long inputs don't make it look stalled.
+    """
+
+    def __init__(self, agent, root: Path, shard: int, shards: int, concurrency: int = 4,
+                 heartbeat_seconds: float = 10.0, scale_with_keys: bool = True, **process_kwargs: Any):
+        self.agent = agent
+        self.root = Path(root)
+        self.shard = shard
+        self.shards = shards
+        key_pool = getattr(agent, "key_pool", None)
+        scale = max(1, key_pool.usable()) if scale_with_keys and key_pool is not None else 1
+        self.concurrency = concurrency * scale
+        self.heartbeat_seconds = heartbeat_seconds
+        self.process_kwargs = process_kwargs
+        self.directory = shard_dir(self.root, shard, shards)
+        self.manifest: Dict[str, Any] = {}
+
+    def _save_manifest(self, **updates: Any):
+        self.manifest.update(updates, heartbeat_at=time.time())
+        _write_json(self.directory / "manifest.json", self.manifest)
+
+    async def run(self, inputs: Iterable[str]) -> Dict[str, Any]:
+        """Process this shard's share of ``inputs``; returns the final manifest."""
+        mine = partition(inputs, self.shard, self.shards)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        checkpoint = self.directory / "results.jsonl"
+        done = {i for i, r in read_checkpoint(checkpoint).items() if r['status'] == 'ok'}
+        pending = [p for p in mine if p not in done]
+        previous = _read_json(self.directory / "manifest.json") or {}
+        self.manifest = {
+            'shard': self.shard,
+            'shards': self.shards,
+            'worker': worker_id(),
+            'inputs': mine,
+            'started_at': previous.get('started_at') or time.time(),
+            'attempts': previous.get('attempts', 0) + 1,
+            'completed': len(done),
+            'failed': 0,
+            'finished_at': None,
+        }
+        self._save_manifest()
+        print(f"Shard {self.shard}/{self.shards}: {len(mine)} inputs, {len(done)} already done")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            with open(checkpoint, "a", encoding="utf-8") as log, priority_scope(BATCH):
+                async def _one(path: str):
+                    async with semaphore:
+                        record = await self._process(path)
+                    log.write(json.dumps(record, default=str) + "\n")
+                    log.flush()
+                    if record['status'] == 'ok':
+                        self.manifest['completed'] += 1
+                    else:
+                        self.manifest['failed'] += 1
+                    self._save_manifest()
+
+                await asyncio.gather(*[_one(p) for p in pending])
+        finally:
+            heartbeat.cancel()
+        self._save_manifest(finished_at=time.time())
+        return self.manifest
+
+    async def _process(self, path: str) -> Dict[str, Any]:
+        key = input_key(path)
+        record: Dict[str, Any] = {'input': path, 'key': key, 'shard': self.shard}
+        started = time.perf_counter()
+        try:
+            record['result'] = await self.agent.process_input(
+                path, self.directory / "outputs" / key, **self.process_kwargs)
+            record['status'] = 'ok'
+        except Exception as e:
+            record['status'] = 'failed'
+            record['error'] = f"{type(e).__name__}: {str(e)}"
+            print(f"Shard {self.shard}: {path} failed: {record['error']}")
+        record['seconds'] = round(time.perf_counter() - started, 3)
+        record['finished_at'] = time.time()
+        return record
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            self._save_manifest()
+
+def merge_shards(root: Path, shards: Optional[int] = None, stale_after: float = 300.0,
+                 slow_factor: float = 2.0, min_slow_seconds: float = 10.0) -> Dict[str, Any]:
+    """Combine shard checkpoints into ``<root>/merged`` and report stragglers.
+
+    ``shards`` defaults to the count found on disk. A finished shard is a
+    straggler when it took over ``slow_factor`` times the median shard time
+    and at least ``min_slow_seconds`` longer than it, so jitter on short
+    shards isn't reported.
+    """
+    root = Path(root)
+    directories = sorted((root / "shards").glob("shard-*-of-*"))
+    counts = {int(d.name.rsplit("-", 1)[1]) for d in directories}
+    if shards is None:
+        if not counts:
+            raise FileNotFoundError(f"No shard directories under {root / 'shards'}")
+        if len(counts) > 1:
+            raise ValueError(f"Shard directories from different shard counts: {sorted(counts)}")
+        shards = counts.pop()
+
+    now = time.time()
+    records: Dict[str, Dict[str, Any]] = {}
+    shard_reports = []
+    for shard in range(shards):
+        directory = shard_dir(root, shard, shards)
+        manifest = _read_json(directory / "manifest.json")
+        checkpoint = read_checkpoint(directory / "results.jsonl")
+        for path, record in checkpoint.items():
+            # An input recorded twice (a takeover) keeps its successful record
+            if record['status'] == 'ok' or path not in records:
+                records[path] = record
+        report: Dict[str, Any] = {'shard': shard}
+        if manifest is None:
+            report['status'] = 'missing'
+        else:
+            total = len(manifest.get('inputs', []))
+            ok = sum(1 for r in checkpoint.values() if r['status'] == 'ok')
+            report.update(worker=manifest.get('worker'), total=total, completed=ok,
+                          failed=sum(1 for r in checkpoint.values() if r['status'] == 'failed'),
+                          heartbeat_age=round(now - manifest.get('heartbeat_at', 0), 1))
+            if manifest.get('finished_at'):
+                report['status'] = 'finished'
+                report['seconds'] = round(manifest['finished_at'] - manifest['started_at'], 3)
+            elif report['heartbeat_age'] > stale_after:
+                report['status'] = 'stalled'
+            else:
+                report['status'] = 'running'
+        shard_reports.append(report)
+
+    durations = [r['seconds'] for r in shard_reports if r['status'] == 'finished']
+    median = statistics.median(durations) if durations else 0.0
+    for report in shard_reports:
+        if (report['status'] == 'finished' and median and report['seconds'] > slow_factor * median
+                and report['seconds'] - median >= min_slow_seconds):
+            report['slow'] = True
+    stragglers = [r for r in shard_reports if r['status'] != 'finished' or r.get('slow')]
+
+    merged_dir = root / "merged"
+    merged_dir.mkdir(parents=True, exist_ok=True)
+    temp = merged_dir / f"results.jsonl.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        for path in sorted(records):
+            f.write(json.dumps(records[path], default=str) + "\n")
+    os.replace(temp, merged_dir / "results.jsonl")
+
+    summary = {
+        'shards': shards,
+        'complete': bool(shards) and all(r['status'] == 'finished' for r in shard_reports),
+        'inputs': sum(r.get('total', 0) for r in shard_reports),
+        'completed': sum(1 for r in records.values() if r['status'] == 'ok'),
+        'failed': sum(1 for r in records.values() if r['status'] == 'failed'),
+        'median_shard_seconds': round(median, 3),
+        'stragglers': stragglers,
+        'shard_reports': shard_reports,
+    }
+    _write_json(merged_dir / "report.json", summary)
+    return summary
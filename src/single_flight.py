@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+def fingerprint(*parts: Any) -> str:
+    """Canonical hash of a request description.
+
+    Parts are serialized as sorted-key JSON so logically identical requests
+    (e.g. dicts built in a different order) map to the same key. Bytes are
+    hashed rather than embedded.
+    """
+    def _default(value: Any) -> Any:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return {"sha256": hashlib.sha256(value).hexdigest()}
+        return str(value)
+
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=_default)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """One shared call: its task, the deadline it runs under and how many callers await it."""
+
+    def __init__(self, task: asyncio.Task, deadline: Optional[float]):
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+def _outlasts(flight_deadline: Optional[float], deadline: Optional[float]) -> bool:
+    if flight_deadline is None:
+        return True
+    return deadline is not None and flight_deadline >= deadline
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls so concurrent callers share one upstream request.
+
+    ``scope``, if given, is called on every ``do`` and its result prefixes
+    the key, so only callers in the same scope share a call (the agent
+    scopes by priority: a shared call is admitted at its first caller's
+    priority, and an interactive caller must not wait behind a batch call
+    that can be preempted).
+    """
+
+    def __init__(self, scope: Optional[Callable[[], Any]] = None):
+        self.scope = scope
+        self._inflight: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """Run ``fn`` unless a call with the same key is already running, then await its result.
+
+        ``deadline`` is the ``time.monotonic()`` time by which this caller
+        needs the result. ``fn`` runs in the context of the caller that
+        starts it, under that caller's deadline, so a caller only joins a
+        running call whose deadline is no earlier than its own; otherwise
+        it starts a call of its own, which later callers join. A caller
+        still waiting at its deadline gets asyncio.TimeoutError.
+
+        A caller leaving early does not cancel the shared call for the
+        others; the shared call is cancelled once every waiter has gone, and
+        the last one waits for it to wind down.
+        """
+        self.calls += 1
+        if self.scope is not None:
+            key = f"{self.scope()}:{key}"
+        flight = self._inflight.get(key)
+        if flight is None or not _outlasts(flight.deadline, deadline):
+            flight = _Flight(asyncio.ensure_future(fn()), deadline)
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda t, k=key, f=flight: self._forget(k, f))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await self._wait(flight.task, deadline)
+        except BaseException:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+                # Let it clean up (e.g. remove partial files) before the last caller moves on
+                await asyncio.wait([flight.task])
+            raise
+        finally:
+            flight.waiters -= 1
+
+    @staticmethod
+    async def _wait(task: asyncio.Task, deadline: Optional[float]):
+        if deadline is None:
+            return await asyncio.shield(task)
+        return await asyncio.wait_for(asyncio.shield(task), max(0.0, deadline - time.monotonic()))
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # Mark the exception as retrieved when every waiter was cancelled
+        if not flight.task.cancelled():
+            flight.task.exception()
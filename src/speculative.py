@@ -0,0 +1,28 @@
+import re
+from collections import Counter
+
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from have he her his i if in into is it its
+just like me my no not of on or our she so that the their them then there they this to uh um us
+was we were what when where which who will with would you your
+""".split())
+
+def content_terms(text: str) -> Counter:
+    """Term frequencies of lower-cased words, minus stopwords and fillers."""
+    return Counter(w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS and len(w) > 1)
+
+def intent_similarity(partial: str, final: str) -> float:
+    """Share of the partial transcript's content words found in the final one, in [0, 1].
+
+    A partial transcript is only a prefix of the final one, so this asks
+    whether the final transcript still says what the draft was made from,
+    not whether the two match: the longer the rest of the recording, the
+    lower a symmetric measure such as cosine scores even an on-topic one.
+    Multiset containment stays near 1 however long the rest is, and drops
+    when the prefix was misheard or retracted.
+    """
+    a, b = content_terms(partial), content_terms(final)
+    if not a:
+        return 1.0 if not b else 0.0
+    return sum((a & b).values()) / sum(a.values())
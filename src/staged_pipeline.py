@@ -0,0 +1,184 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from scheduler import BATCH, PreemptedError, priority_scope
+
+_DONE = object()
+
+class StageMetrics:
+    def __init__(self, name: str, workers: int, queue: asyncio.Queue):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.max_queue_depth = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'queue_capacity': self.queue.maxsize,
+            'processed': self.processed,
+            'failed': self.failed,
+            'busy_seconds': round(self.busy_seconds, 3),
+        }
+
+
+class StagedPipeline:
+    """Runs transcription, chat and image generation as separate stages joined by bounded queues.
+
+    Each stage has its own worker count. A full queue blocks the stage in
+    front of it, so the slowest stage sets the pace and at most
+    ``queue_size`` items wait between any two stages.
+
+    Outbound calls are made at ``priority`` (batch by default), so with a
+    scheduler on the agent a pipeline run only uses capacity that
+    interactive requests leave; calls preempted from the scheduler's queue
+    are retried.
+
+    When the agent signs requests from a key pool, worker counts are per
+    key (with ``scale_with_keys``), so throughput grows with the number of
+    provisioned keys instead of being capped by one key's rate limit.
+    """
+
+    def __init__(
+        self,
+        agent,
+        output_dir: Path,
+        transcribe_workers: int = 4,
+        respond_workers: int = 2,
+        image_workers: int = 1,
+        queue_size: int = 8,
+        priority: str = BATCH,
+        scale_with_keys: bool = True
+    ):
+        self.agent = agent
+        self.output_dir = Path(output_dir)
+        key_pool = getattr(agent, "key_pool", None)
+        scale = max(1, key_pool.usable()) if scale_with_keys and key_pool is not None else 1
+        self.worker_counts = {
+            'transcribe': transcribe_workers * scale,
+            'respond': respond_workers * scale,
+            'image': image_workers * scale,
+        }
+        self.queue_size = queue_size
+        self.priority = priority
+        self.metrics: Dict[str, StageMetrics] = {}
+
+    def stage_metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {name: metrics.snapshot() for name, metrics in self.metrics.items()}
+
+    async def run(self, audio_files: Iterable[str],
+                  on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """Process every audio file; returns results in input order.
+
+        A failed item carries an ``error`` entry and does not stop the others.
+        """
+        with priority_scope(self.priority):
+            return await self._run(audio_files, on_result)
+
+    async def _run(self, audio_files: Iterable[str],
+                   on_result: Optional[Callable[[Dict[str, Any]], None]]) -> List[Dict[str, Any]]:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        queues = {name: asyncio.Queue(maxsize=self.queue_size) for name in self.worker_counts}
+        self.metrics = {name: StageMetrics(name, self.worker_counts[name], queues[name])
+                        for name in self.worker_counts}
+        results: Dict[int, Dict[str, Any]] = {}
+
+        def finish(item: Dict[str, Any]):
+            results[item['index']] = item
+            if on_result:
+                on_result(item)
+
+        stages = [
+            ('transcribe', self._transcribe, queues['respond']),
+            ('respond', self._respond, queues['image']),
+            ('image', self._image, None),
+        ]
+        workers = []
+        for name, fn, downstream in stages:
+            remaining = [self.worker_counts[name]]
+            for _ in range(self.worker_counts[name]):
+                workers.append(asyncio.ensure_future(
+                    self._worker(name, fn, queues[name], downstream, remaining, finish)
+                ))
+
+        try:
+            count = 0
+            for index, audio_file in enumerate(audio_files):
+                await self._put(queues['transcribe'], 'transcribe',
+                                {'index': index, 'input': str(audio_file)})
+                count += 1
+            for _ in range(self.worker_counts['transcribe']):
+                await queues['transcribe'].put(_DONE)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+        return [results[i] for i in range(count)]
+
+    async def _put(self, queue: asyncio.Queue, name: str, item: Any):
+        await queue.put(item)
+        metrics = self.metrics[name]
+        metrics.max_queue_depth = max(metrics.max_queue_depth, queue.qsize())
+
+    async def _worker(self, name: str, fn: Callable[[Dict[str, Any]], Awaitable[None]],
+                      queue: asyncio.Queue, downstream: Optional[asyncio.Queue],
+                      remaining: List[int], finish: Callable[[Dict[str, Any]], None]):
+        metrics = self.metrics[name]
+        downstream_name = next((n for n, m in self.metrics.items() if m.queue is downstream), None)
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+
+            started = time.perf_counter()
+            try:
+                await self._run_stage(fn, item)
+                metrics.processed += 1
+            except Exception as e:
+                metrics.failed += 1
+                item['error'] = f"{name}: {type(e).__name__}: {str(e)}"
+                print(f"Error in {name} stage for {item['input']}: {item['error']}")
+            finally:
+                metrics.busy_seconds += time.perf_counter() - started
+
+            if 'error' in item or downstream is None:
+                finish(item)
+            else:
+                # Blocks while the next stage is saturated: this is the backpressure
+                await self._put(downstream, downstream_name, item)
+
+        # The last worker of a stage tells the next stage's workers to stop
+        remaining[0] -= 1
+        if remaining[0] == 0 and downstream is not None:
+            for _ in range(self.worker_counts[downstream_name]):
+                await downstream.put(_DONE)
+
+    @staticmethod
+    async def _run_stage(fn: Callable[[Dict[str, Any]], Awaitable[None]], item: Dict[str, Any]):
+        while True:
+            try:
+                return await fn(item)
+            except PreemptedError as e:
+                # Interactive work needed the queue space; batch items just wait their turn again
+                await asyncio.sleep(e.retry_after)
+
+    async def _transcribe(self, item: Dict[str, Any]):
+        item['transcription'] = await self.agent.transcribe_audio(item['input'])
+
+    async def _respond(self, item: Dict[str, Any]):
+        response = await self.agent.generate_response(item['transcription'])
+        item['response_text'] = response['response']
+        item['image_prompt'] = response['image_prompt']
+
+    async def _image(self, item: Dict[str, Any]):
+        item['image_file'] = await self.agent.generate_image(
+            item['image_prompt'], str(self.output_dir / f"response_{item['index']:05d}.png")
+        )
@@ -0,0 +1,109 @@
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Validator = Callable[[Any], List[str]]
+
+_CODE_FENCE = re.compile(r'^\s*```[a-zA-Z]*\s*\n?(.*?)\n?\s*```\s*$', re.DOTALL)
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+class StructuredOutputError(ValueError):
+    """Model output could not be parsed or repaired into the expected schema."""
+
+    def __init__(self, message: str, raw: str, errors: List[str]):
+        super().__init__(message)
+        self.raw = raw
+        self.errors = errors
+
+def compile_schema(fields: Dict[str, type], required: Optional[List[str]] = None) -> Validator:
+    """Build a validator for a flat JSON object once, instead of interpreting a schema per call.
+
+    ``fields`` maps keys to expected Python types; every field is required
+    unless ``required`` lists a subset. The validator returns a list of errors.
+    """
+    required_fields = tuple(required if required is not None else fields)
+    checks: Tuple[Tuple[str, type], ...] = tuple(fields.items())
+
+    def validate(value: Any) -> List[str]:
+        if not isinstance(value, dict):
+            return [f"expected a JSON object, got {type(value).__name__}"]
+        errors = [f"missing field '{name}'" for name in required_fields if name not in value]
+        for name, expected in checks:
+            if name in value and not isinstance(value[name], expected):
+                errors.append(f"field '{name}' must be {expected.__name__}, got {type(value[name]).__name__}")
+            elif isinstance(value.get(name), str) and name in required_fields and not value[name].strip():
+                errors.append(f"field '{name}' is empty")
+        return errors
+
+    return validate
+
+RESPONSE_SCHEMA = compile_schema({"response": str, "image_prompt": str})
+
+def extract_first_object(text: str) -> Optional[str]:
+    """The first balanced ``{...}`` in ``text``, ignoring braces inside strings."""
+    start = text.find("{")
+    while start != -1:
+        depth = 0
+        in_string = False
+        escape = False
+        for i in range(start, len(text)):
+            char = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == "\\":
+                    escape = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        start = text.find("{", start + 1)
+    return None
+
+def _candidates(raw: str):
+    """Progressively more aggressive local repairs, cheapest first."""
+    yield raw
+    fenced = _CODE_FENCE.match(raw)
+    text = fenced.group(1) if fenced else raw
+    if fenced:
+        yield text
+    obj = extract_first_object(text)
+    if obj is not None and obj != text:
+        yield obj
+    base = obj if obj is not None else text
+    without_commas = _TRAILING_COMMA.sub(r'\1', base)
+    if without_commas != base:
+        yield without_commas
+
+def parse_structured(raw: Optional[str], validator: Validator = RESPONSE_SCHEMA) -> Dict[str, Any]:
+    """Parse and validate model output, trying local repairs before giving up.
+
+    Raises StructuredOutputError carrying the last validation errors, which
+    callers can feed into a targeted repair prompt.
+    """
+    raw = raw or ""
+    errors: List[str] = ["empty response"] if not raw.strip() else []
+    for candidate in _candidates(raw):
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError as e:
+            errors = [f"invalid JSON: {e}"]
+            continue
+        errors = validator(value)
+        if not errors:
+            return value
+    raise StructuredOutputError(f"Could not parse structured output: {'; '.join(errors)}", raw, errors)
+
+def repair_prompt(raw: str, errors: List[str]) -> str:
+    """User message asking the model to fix only what is wrong with its last reply."""
+    return (
+        "Your previous reply could not be used: " + "; ".join(errors) + ".\n"
+        "Previous reply:\n" + raw[:2000] + "\n"
+        "Reply with only a corrected JSON object with string fields 'response' and 'image_prompt'."
+    )
@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+import httpx
+from accounting import Budget, BudgetExceededError, UsageLedger, UsageRecord, current_request_id, request_scope
+from multi_modal_agent import MultiModalAgent
+
+def test_accounting():
+    asyncio.run(run_accounting_checks())
+
+class FakeCompletions:
+    def __init__(self):
+        self.models = []
+
+    async def create(self, model, messages, **kwargs):
+        self.models.append(model)
+        message = SimpleNamespace(content='{"response": "hi", "image_prompt": "a cat"}')
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+async def run_accounting_checks():
+    print("\nTesting usage accounting and budgets:")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = str(Path(tmp) / "usage.jsonl")
+
+        # 1. Aggregation per model and flush to the local store
+        ledger = UsageLedger(store_path=store)
+        ledger.record(UsageRecord(model="gpt", kind="chat", prompt_tokens=10, completion_tokens=5))
+        ledger.record(UsageRecord(model="gpt", kind="chat", prompt_tokens=20, completion_tokens=5))
+        ledger.record(UsageRecord(model="whisper-1", kind="transcription", audio_seconds=3.5))
+        assert ledger.by_model()["gpt"]["prompt_tokens"] == 30
+        assert ledger.totals()["requests"] == 3
+        assert ledger.flush() == 3 and ledger.flush() == 0
+        assert len(UsageLedger.load(store)) == 3
+        print("1. Aggregation and flush OK")
+
+        # 2. Budgets refuse or downgrade before the call
+        ledger = UsageLedger(budgets=[
+            Budget(model="big-model", max_tokens=100, downgrade_to="small-model"),
+            Budget(model="small-model", max_tokens=150),
+            Budget(max_images=2),
+        ])
+        assert ledger.check("big-model", tokens=50) == "big-model"
+        ledger.record(UsageRecord(model="big-model", kind="chat", prompt_tokens=90))
+        assert ledger.check("big-model", tokens=50) == "small-model"
+        try:
+            ledger.check("small-model", tokens=200)
+            raise AssertionError("over-budget call allowed")
+        except BudgetExceededError:
+            pass
+        ledger.record(UsageRecord(model="titan", kind="image", images=2))
+        try:
+            ledger.check("titan", images=1)
+            raise AssertionError("image budget ignored")
+        except BudgetExceededError:
+            pass
+        print("2. Budget downgrade and refusal OK")
+
+    # 3. Agent records chat usage from the response and images from the stream
+    agent = MultiModalAgent("test-key", "http://gateway.test", ledger=UsageLedger(budgets=[
+        Budget(model=MultiModalAgent.CHAT_MODEL, max_tokens=200, downgrade_to="azure-gpt-4o-mini")
+    ]))
+    completions = FakeCompletions()
+    agent._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    def handler(request):
+        data = [{"b64_json": base64.b64encode(b"png").decode()}] * 2
+        return httpx.Response(200, json={"data": data})
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    await agent.generate_response("first question")
+    await agent.generate_response("second question")
+    assert completions.models == [MultiModalAgent.CHAT_MODEL, "azure-gpt-4o-mini"]
+    assert agent.ledger.by_model()[MultiModalAgent.CHAT_MODEL]["completion_tokens"] == 30
+
+    with tempfile.TemporaryDirectory() as tmp:
+        await agent.generate_images("a cat", Path(tmp), n=2)
+    assert agent.ledger.by_model()[MultiModalAgent.IMAGE_MODEL]["images"] == 2
+    print("3. Agent usage recorded")
+
+    # 4. Each pipeline request gets an id that its usage records carry
+    seen_ids = []
+
+    async def fake_process(*args):
+        seen_ids.append(current_request_id())
+        return {}
+
+    agent._process_input = fake_process
+    result = await agent.process_input("input.wav", Path("output"))
+    assert result['request_id'] == seen_ids[0] is not None
+    with request_scope("from-service"):
+        assert (await agent.process_input("input.wav", Path("output")))['request_id'] == "from-service"
+    await agent.http_client.aclose()
+    agent._client = None
+    await agent.close()
+    print("4. Requests carry their id")
+
+    # 5. With a store, records are flushed in the background from the first record on
+    with tempfile.TemporaryDirectory() as tmp:
+        store = str(Path(tmp) / "usage.jsonl")
+        ledger = UsageLedger(store_path=store, flush_interval=0.05)
+        with request_scope("req-1"):
+            ledger.record(UsageRecord(model="gpt", kind="chat", prompt_tokens=10))
+        for _ in range(40):
+            await asyncio.sleep(0.025)
+            if UsageLedger.load(store):
+                break
+        assert [r['request_id'] for r in UsageLedger.load(store)] == ["req-1"]
+        ledger.record(UsageRecord(model="gpt", kind="chat", prompt_tokens=5))
+        await ledger.aclose()
+        assert [r['request_id'] for r in UsageLedger.load(store)] == ["req-1", None]
+        print("5. Periodic flush wrote records without an explicit flush; close wrote the rest")
+
+    # 6. Calls in flight hold their estimate against budgets until settled or released
+    ledger = UsageLedger(budgets=[Budget(model="gpt", max_tokens=100)])
+    with ledger.reserve("gpt", tokens=60):
+        try:
+            ledger.reserve("gpt", tokens=60)
+            raise AssertionError("concurrent reservation overshot the budget")
+        except BudgetExceededError:
+            pass
+    with ledger.reserve("gpt", tokens=60) as reservation:
+        reservation.settle(UsageRecord(model="gpt", kind="chat", prompt_tokens=30))
+    assert ledger.check("gpt", tokens=60) == "gpt" and ledger.totals("gpt")["prompt_tokens"] == 30
+
+    class SlowCompletions(FakeCompletions):
+        async def create(self, model, messages, **kwargs):
+            await asyncio.sleep(0.02)
+            return await super().create(model, messages, **kwargs)
+
+    agent = MultiModalAgent("test-key", "http://gateway.test", ledger=UsageLedger(budgets=[
+        Budget(model=MultiModalAgent.CHAT_MODEL, max_tokens=300)]))
+    agent._client = SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions()))
+    messages = [{"role": "user", "content": "x" * 600}]
+    results = await asyncio.gather(agent._chat(messages), agent._chat(messages), return_exceptions=True)
+    assert [isinstance(r, BudgetExceededError) for r in results] == [False, True], results
+    agent._client = None
+    await agent.close()
+    print("6. Concurrent calls cannot overshoot a budget together")
+
+if __name__ == "__main__":
+    test_accounting()
@@ -0,0 +1,114 @@
+import asyncio
+import tempfile
+import time
+import wave
+from pathlib import Path
+from artifact_store import ArtifactStore, RunRecord, sha256_file
+from multi_modal_agent import MultiModalAgent
+
+def test_artifact_store():
+    asyncio.run(run_artifact_store_checks())
+
+def write_tone(path: Path, seconds: float, level: int = 0):
+    with wave.open(str(path), 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(8000)
+        wav_file.writeframes(level.to_bytes(2, 'little', signed=True) * int(seconds * 8000))
+
+def make_agent(store: ArtifactStore):
+    agent = MultiModalAgent("test-key", "http://localhost:9", store=store)
+    calls = {'transcribe': 0}
+
+    async def transcribe_bytes(audio_bytes):
+        calls['transcribe'] += 1
+        return f"a lighthouse, take {len(audio_bytes)}"
+
+    async def generate_response(text):
+        return {'response': f"re: {text}", 'image_prompt': "a lighthouse at dusk"}
+
+    async def generate_image(prompt, output_path):
+        Path(output_path).write_bytes(b"png:" + prompt.encode())
+        return output_path
+
+    agent.transcribe_bytes = transcribe_bytes
+    agent.generate_response = generate_response
+    agent.generate_image = generate_image
+    return agent, calls
+
+async def run_artifact_store_checks():
+    print("\nTesting artifact store:")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # 1. Blobs are content addressed and written once
+        with ArtifactStore(str(tmp / "plain")) as store:
+            first = store.put_bytes(b"image bytes")
+            (tmp / "copy.png").write_bytes(b"image bytes")
+            assert store.put_file(str(tmp / "copy.png")) == first
+            assert len(list(store.blob_dir.rglob("*"))) == 2  # one prefix dir, one blob
+            store.materialize(first, str(tmp / "out" / "again.png"))
+            assert (tmp / "out" / "again.png").read_bytes() == b"image bytes"
+        print("1. Identical content stored once and materialized on demand")
+
+        # 2. Indexed queries by input, model and time
+        with ArtifactStore(str(tmp / "plain")) as store:
+            day = 24 * 3600
+            now = time.time()
+            for i in range(6):
+                store.record_run(RunRecord(
+                    input_sha256="abc" if i % 2 else "def",
+                    chat_model="azure-gpt-4o" if i < 4 else "azure-gpt-4o-mini",
+                    respond_seconds=float(i), total_seconds=float(i) + 1,
+                    created_at=now - (5 - i) * day,
+                ))
+            assert [r.respond_seconds for r in store.find_by_input("abc", limit=5)] == [5.0, 3.0, 1.0]
+            assert len(store.query(model="azure-gpt-4o-mini")) == 2
+            assert len(store.query(since=now - 2.5 * day)) == 3
+            trend = store.latency_by_day()
+            assert len(trend) == 6 and trend[0]['respond_seconds'] == 0.0
+            plan = store._db.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM runs WHERE input_sha256 = ? ORDER BY created_at", ("abc",)
+            ).fetchall()
+            assert any("runs_input" in row[-1] for row in plan)
+        print("2. Queries by input hash, model and date use the indexes")
+
+        # 3. The agent records runs and re-serves identical audio from the store
+        store = ArtifactStore(str(tmp / "agent"))
+        agent, calls = make_agent(store)
+        audio = tmp / "input.wav"
+        write_tone(audio, 1.0)
+        first = await agent.process_input(str(audio), tmp / "run1")
+        run = store.get_run(first['run_id'])
+        assert run.transcription == first['transcription'] and run.chat_model == agent.CHAT_MODEL
+        assert run.total_seconds >= run.respond_seconds >= 0
+        assert set(first['timings']) == {'transcribe', 'respond', 'image', 'total'}
+
+        again = await agent.process_input(str(audio), tmp / "run2")
+        assert again['reused'] and again['run_id'] == first['run_id'] and calls['transcribe'] == 1
+        assert Path(again['image_file']).read_bytes() == Path(first['image_file']).read_bytes()
+
+        fresh = await agent.process_input(str(audio), tmp / "run3", reuse=False)
+        assert 'reused' not in fresh and calls['transcribe'] == 2
+        assert len(store.find_by_input(run.input_sha256, limit=10)) == 2
+        assert len(list(store.blob_dir.rglob("*.png"))) == 0  # blobs are named by hash only
+        print("3. Runs recorded; identical audio served from the store")
+
+        # 4. Rewriting a reused output in place leaves the stored blob intact
+        async def generate_other_image(prompt, output_path):
+            with open(output_path, 'wb') as f:  # Truncates in place, as the streaming writer does
+                f.write(b"a different image")
+            return output_path
+
+        agent.generate_image = generate_other_image
+        await agent.process_input(str(audio), tmp / "run2", reuse=False)
+        assert (tmp / "run2" / "response.png").read_bytes() == b"a different image"
+        blob = store.blob_path(run.image_sha256)
+        assert sha256_file(str(blob)) == run.image_sha256
+        assert blob.read_bytes() == b"png:a lighthouse at dusk"
+        await agent.close()
+        store.close()
+        print("4. Stored blobs survive in-place rewrites of reused outputs")
+
+if __name__ == "__main__":
+    test_artifact_store()
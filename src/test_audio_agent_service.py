@@ -0,0 +1,56 @@
+import asyncio
+import io
+import tempfile
+from pathlib import Path
+import httpx
+from multi_modal_agent_audio import MultiModalAgentAudio
+
+def test_audio_agent_service():
+    asyncio.run(run_audio_agent_checks())
+
+async def run_audio_agent_checks():
+    print("\nTesting reusable audio transcription client:")
+    counts = {"models": 0, "transcriptions": 0, "active": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/v1/models"):
+            counts["models"] += 1
+            return httpx.Response(200, json={"data": [{"id": "azure-gpt-4o"}, {"id": "azure-whisper"}]})
+        counts["transcriptions"] += 1
+        counts["active"] += 1
+        counts["peak"] = max(counts["peak"], counts["active"])
+        await asyncio.sleep(0.02)
+        counts["active"] -= 1
+        body = request.content
+        if b"broken" in body:
+            return httpx.Response(500, text="decode failed")
+        return httpx.Response(200, json={"text": f"heard {len(body)} bytes"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    async with MultiModalAgentAudio("test-key", "http://gateway.test", quiet=True,
+                                    max_concurrency=2, http_client=client) as agent:
+        # 1. Model selection is cached across requests
+        first = await agent.transcribe_audio(io.BytesIO(b"RIFF-one"))
+        second = await agent.transcribe_audio(io.BytesIO(b"RIFF-two"))
+        assert "text" in first and "text" in second
+        assert counts["models"] == 1 and agent._selected_model == "azure-whisper"
+        print("1. Model catalog fetched once")
+
+        # 2. transcribe_many runs files concurrently, bounded, in input order, isolating failures
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i, payload in enumerate([b"a" * 10, b"broken", b"c" * 30, b"d" * 40]):
+                path = Path(tmp) / f"clip_{i}.wav"
+                path.write_bytes(payload)
+                paths.append(str(path))
+            results = await agent.transcribe_many(paths)
+        assert isinstance(results[1], httpx.HTTPStatusError)
+        assert all(isinstance(r, dict) for i, r in enumerate(results) if i != 1)
+        assert counts["peak"] == 2 and counts["models"] == 1
+        print(f"2. Transcribed {len(results)} files, peak concurrency {counts['peak']}")
+
+    assert client.is_closed
+    print("3. Client closed with the agent")
+
+if __name__ == "__main__":
+    test_audio_agent_service()
@@ -0,0 +1,40 @@
+import tempfile
+import wave
+from pathlib import Path
+import numpy as np
+from audio_generator import SignalConfig, generate_blocks, write_wav_stream, corpus_configs, create_corpus
+
+def test_audio_generator():
+    print("\nTesting streaming audio generator:")
+
+    # 1. Blocks cover the requested duration exactly
+    config = SignalConfig(duration=2.5, sample_rate=8000, channels=2, block_seconds=1.0,
+                          silence_every=1.0, silence_length=0.25, noise_level=0.0, seed=1)
+    blocks = list(generate_blocks(config))
+    assert [len(b) for b in blocks] == [8000, 8000, 4000]
+    assert all(b.dtype == np.int16 and b.shape[1] == 2 for b in blocks)
+    # Last quarter of each second is a silence gap
+    assert not blocks[0][7000:].any()
+    assert blocks[0][:6000].any()
+    print(f"1. Generated {len(blocks)} blocks")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 2. Incremental WAV write
+        path = write_wav_stream(str(Path(tmp) / "clip.wav"), config)
+        with wave.open(path, 'rb') as wav_file:
+            assert wav_file.getnframes() == 20000
+            assert wav_file.getnchannels() == 2
+        print(f"2. Wrote streaming WAV: {path}")
+
+        # 3. Parallel corpus generation
+        configs = corpus_configs(6, SignalConfig(duration=0.5), seed=7)
+        files = create_corpus(str(Path(tmp) / "corpus"), configs, max_workers=2)
+        assert len(files) == 6
+        for file, cfg in zip(files, configs):
+            with wave.open(file, 'rb') as wav_file:
+                assert wav_file.getframerate() == cfg.sample_rate
+                assert wav_file.getnchannels() == cfg.channels
+        print("3. Corpus generation OK")
+
+if __name__ == "__main__":
+    test_audio_generator()
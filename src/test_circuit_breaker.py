@@ -0,0 +1,98 @@
+import asyncio
+import base64
+import tempfile
+import wave
+from pathlib import Path
+import httpx
+from circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+from multi_modal_agent import MultiModalAgent
+
+def test_circuit_breaker():
+    asyncio.run(run_circuit_breaker_checks())
+
+async def run_circuit_breaker_checks():
+    print("\nTesting circuit breakers:")
+
+    # 1. Consecutive failures open the circuit; half-open trial closes it again
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=0.05)
+
+    async def fail():
+        raise httpx.ConnectError("refused")
+
+    async def ok():
+        return "ok"
+
+    for _ in range(3):
+        try:
+            await breaker.call(fail)
+        except httpx.ConnectError:
+            pass
+    assert breaker.state == "open"
+    try:
+        await breaker.call(ok)
+        raise AssertionError("open circuit let a call through")
+    except CircuitOpenError as e:
+        assert 0 < e.retry_after <= 0.05
+    await asyncio.sleep(0.06)
+    assert await breaker.call(ok) == "ok" and breaker.state == "closed"
+    print("1. Opens after 3 failures, closes after a successful half-open trial")
+
+    # 2. Error rate over the window opens it too; client errors don't count
+    breaker = CircuitBreaker("rate", failure_threshold=100, window_size=10, min_calls=10, error_rate=0.5)
+    bad_request = httpx.HTTPStatusError("bad", request=httpx.Request("POST", "http://x"),
+                                        response=httpx.Response(400))
+    for i in range(10):
+        breaker.record_failure() if i % 2 else breaker.record_success()
+    assert breaker.state == "open"
+    assert not breaker.is_failure(bad_request) and breaker.is_failure(asyncio.TimeoutError())
+    print("2. Opens at 50% errors over 10 calls; 4xx ignored")
+
+    # 3. A dead image route stops being called and process_input degrades to text only
+    image_calls = []
+    image_route_up = [False]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/images/generations"):
+            image_calls.append(request)
+            if not image_route_up[0]:
+                return httpx.Response(404, text="endpoint not found")
+            return httpx.Response(200, json={"data": [{"b64_json": base64.b64encode(b"png").decode()}]})
+        return httpx.Response(200, json={"text": "draw a fox"})
+
+    agent = MultiModalAgent("test-key", "http://gateway.test",
+                            breakers=CircuitBreakerRegistry(failure_threshold=2, reset_timeout=0.1))
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def generate_response(text):
+        return {'response': f"re: {text}", 'image_prompt': "a fox"}
+
+    agent.generate_response = generate_response
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = Path(tmp) / "input.wav"
+        with wave.open(str(audio), 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(8000)
+            wav_file.writeframes(b"\x00\x00" * 8000)
+
+        for i in range(2):
+            try:
+                await agent.generate_image("a fox", str(Path(tmp) / f"fail_{i}.png"))
+            except httpx.HTTPStatusError:
+                pass
+        result = await agent.process_input(str(audio), Path(tmp) / "out")
+        assert len(image_calls) == 2
+        assert result['response_text'] == "re: draw a fox" and result['image_file'] is None
+        assert "Circuit open" in result['image_error']
+        snapshot = agent.breakers.snapshot()
+        assert any(v['state'] == "open" for k, v in snapshot.items() if k.startswith("images/generations"))
+
+        image_route_up[0] = True
+        await asyncio.sleep(0.11)
+        result = await agent.process_input(str(audio), Path(tmp) / "out")
+        assert result['image_file'].endswith("response.png") and len(image_calls) == 3
+    await agent.close()
+    print("3. Dead image route skipped without a request; recovered after the reset timeout")
+
+if __name__ == "__main__":
+    test_circuit_breaker()
@@ -0,0 +1,96 @@
+import asyncio
+import base64
+import os
+import tempfile
+import time
+import wave
+from pathlib import Path
+from cpu_profile import CpuProfiler, render_profile
+from multi_modal_agent import MultiModalAgent
+
+def test_cpu_profile():
+    asyncio.run(run_cpu_profile_checks())
+
+def burn_cpu(seconds: float) -> int:
+    """Stand-in for decoding work: base64 round trips for ``seconds``."""
+    payload = os.urandom(64 * 1024)
+    rounds = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        base64.b64decode(base64.b64encode(payload))
+        rounds += 1
+    return rounds
+
+async def run_cpu_profile_checks():
+    print("\nTesting sampled CPU profiling:")
+
+    # 1. Only about sample_rate of requests are profiled
+    profiler = CpuProfiler(sample_rate=0.25, seed=7)
+    chosen = sum(profiler.sample() for _ in range(2000))
+    assert 400 < chosen < 600, chosen
+    assert not any(CpuProfiler(sample_rate=0.0).sample() for _ in range(100))
+    print(f"1. {chosen} of 2000 requests sampled at 25%")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = Path(tmp) / "input.wav"
+        with wave.open(str(audio), 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(b"\x00\x00" * 1600)
+
+        async def transcribe(audio_bytes):
+            burn_cpu(0.15)
+            return "draw a lighthouse"
+
+        async def respond(text):
+            await asyncio.sleep(0.05)  # Waiting on the gateway
+            return {'response': "Here it is", 'image_prompt': "a lighthouse"}
+
+        async def draw(prompt, output_path):
+            Path(output_path).write_bytes(b"png")
+            return output_path
+
+        def make_agent(profiler):
+            agent = MultiModalAgent("test-key", "http://gateway.test", cpu_profiler=profiler)
+            agent.transcribe_bytes, agent.generate_response, agent.generate_image = transcribe, respond, draw
+            return agent
+
+        # 2. A sampled request gets collapsed stacks that point at the hot function
+        profiles = Path(tmp) / "profiles"
+        agent = make_agent(CpuProfiler(str(profiles), sample_rate=1.0, interval=0.002))
+        result = await agent.process_input(str(audio), Path(tmp) / "out")
+        profile = result['profile']
+        stacks = Path(profile['path']).read_text()
+        assert profile['samples'] > 20 and "burn_cpu (test_cpu_profile.py" in stacks
+        assert any(line.startswith("MainThread;") for line in stacks.splitlines())
+        top = {frame['frame'].split(" ")[0]: frame['share'] for frame in profile['top']}
+        # About 3/4 of the request is base64 work and 1/4 waiting on the "gateway"
+        assert top.get("b64decode", 0) + top.get("b64encode", 0) + top.get("burn_cpu", 0) > 0.5, profile['top']
+        assert top.get("select", 0) > 0.1, profile['top']
+        await agent.close()
+        print(f"2. {profile['samples']} samples; top frames {profile['top'][:2]}")
+
+        # 3. Unsampled requests write nothing
+        agent = make_agent(CpuProfiler(str(Path(tmp) / "none"), sample_rate=0.0))
+        result = await agent.process_input(str(audio), Path(tmp) / "out")
+        assert 'profile' not in result and not (Path(tmp) / "none").exists()
+        await agent.close()
+        print("3. Unsampled request left no profile")
+
+        # 4. cProfile mode writes a .prof that renders to a summary
+        agent = make_agent(CpuProfiler(str(profiles), sample_rate=1.0, mode="cprofile"))
+        result = await agent.process_input(str(audio), Path(tmp) / "out")
+        assert result['profile']['path'].endswith(".prof")
+        assert "burn_cpu" in render_profile(result['profile']['path'])
+        await agent.close()
+        print(f"4. cProfile top: {result['profile']['top'][0]['frame']}")
+
+        # 5. A directory of profiles merges into one flame graph input, filterable by thread
+        merged = render_profile(str(profiles), threads="MainThread")
+        assert merged and all(line.startswith("MainThread;") for line in merged.splitlines())
+        assert all(line.rpartition(" ")[2].isdigit() for line in merged.splitlines())
+        print(f"5. Merged {len(merged.splitlines())} distinct stacks")
+
+if __name__ == "__main__":
+    test_cpu_profile()
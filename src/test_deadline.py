@@ -0,0 +1,86 @@
+import asyncio
+import tempfile
+import time
+import wave
+from pathlib import Path
+from types import SimpleNamespace
+import httpx
+from deadline import Deadline, DeadlineExceeded, call_timeout, deadline_scope, run_stage
+from multi_modal_agent import MultiModalAgent
+
+def test_deadline():
+    asyncio.run(run_deadline_checks())
+
+async def run_deadline_checks():
+    print("\nTesting deadline propagation:")
+
+    # 1. Stage shares, per-call timeouts and enforcement
+    assert call_timeout(30.0) == 30.0
+    with deadline_scope(Deadline.after(1.0)):
+        assert 0.9 < call_timeout(30.0) <= 1.0
+        assert 0.25 < await run_stage("a", 0.3, lambda: asyncio.sleep(0, result=call_timeout(30.0))) <= 0.3
+        started = time.monotonic()
+        try:
+            await run_stage("slow", 0.1, lambda: asyncio.sleep(5))
+            raise AssertionError("stage outlived its deadline")
+        except DeadlineExceeded as e:
+            assert e.stage == "slow" and time.monotonic() - started < 0.2
+    print("1. Stages get a share of the remaining time and are cancelled at expiry")
+
+    # 2. A slow image backend: the request fails at its deadline and leaves no partial file
+    seen_timeouts = []
+
+    async def slow_image_body():
+        yield b'{"data": [{"b64_json": "'
+        while True:
+            yield b"AAAA" * 64
+            await asyncio.sleep(0.05)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_timeouts.append((request.url.path, request.extensions["timeout"]["read"]))
+        if request.url.path.endswith("/images/generations"):
+            return httpx.Response(200, content=slow_image_body())
+        return httpx.Response(200, json={"text": "draw a lighthouse"})
+
+    chat_kwargs = []
+
+    async def create(**kwargs):
+        chat_kwargs.append(kwargs)
+        content = '{"response": "Here it is", "image_prompt": "a lighthouse"}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    agent = MultiModalAgent("test-key", "http://gateway.test")
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    agent._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = Path(tmp) / "input.wav"
+        with wave.open(str(audio), 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(8000)
+            wav_file.writeframes(b"\x00\x00" * 8000)
+
+        out = Path(tmp) / "out"
+        started = time.monotonic()
+        try:
+            await agent.process_input(str(audio), out, deadline=0.5)
+            raise AssertionError("process_input outlived its deadline")
+        except DeadlineExceeded as e:
+            elapsed = time.monotonic() - started
+            assert e.stage in ("image", "pipeline") and elapsed < 0.7, (e, elapsed)
+        assert not (out / "response.png").exists()
+        await asyncio.sleep(0)
+        assert len(agent.single_flight) == 0
+
+    transcribe_timeout = dict(seen_timeouts)["/audio/transcriptions"]
+    assert transcribe_timeout <= 0.5 * MultiModalAgent.STAGE_SHARES['transcribe'] + 0.01
+    assert 0 < chat_kwargs[0]["timeout"] <= 0.5
+    assert dict(seen_timeouts)["/images/generations"] <= 0.5
+    assert all(b['consecutive_failures'] == 0 for b in agent.breakers.snapshot().values())
+    agent._client = None
+    await agent.close()
+    print(f"2. Deadline hit after {elapsed:.2f}s; partial image removed; backends not blamed")
+
+if __name__ == "__main__":
+    test_deadline()
@@ -0,0 +1,135 @@
+import asyncio
+import tempfile
+import wave
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+from embeddings import EmbeddingBatcher
+from multi_modal_agent import MultiModalAgent
+from vector_index import VectorIndex
+
+def test_embeddings():
+    asyncio.run(run_embedding_checks())
+
+def bag_of_words(text, dim=64):
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        vector[hash(word) % dim] += 1.0
+    return vector.tolist()
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    async def create(self, model, input):
+        self.batches.append(list(input))
+        await asyncio.sleep(0.001)
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=i, embedding=bag_of_words(text)) for i, text in enumerate(input)],
+            usage=SimpleNamespace(prompt_tokens=len(input))
+        )
+
+async def run_embedding_checks():
+    print("\nTesting embeddings and vector index:")
+
+    # 1. Concurrent calls share embeddings requests
+    sent = []
+
+    async def embed_many(texts):
+        sent.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+    batcher = EmbeddingBatcher(embed_many, max_batch=8, max_delay=0.005)
+    vectors = await batcher.embed_all([f"text {'x' * i}" for i in range(20)])
+    assert [v[0] for v in vectors] == [float(len(f"text {'x' * i}")) for i in range(20)]
+    assert sent == [8, 8, 4], sent
+    print(f"1. 20 texts sent in {len(sent)} requests")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 2. Exact and approximate search agree on clustered data; the index survives a reopen
+        rng = np.random.default_rng(1)
+        centers = rng.standard_normal((50, 128)).astype(np.float32)
+        data = centers[np.arange(5000) % 50] + 0.05 * rng.standard_normal((5000, 128)).astype(np.float32)
+        index = VectorIndex(str(Path(tmp) / "index"), initial_capacity=256)
+        for start in range(0, 5000, 1000):
+            index.add(data[start:start + 1000], [{'row': i} for i in range(start, start + 1000)])
+        queries = centers[:20] + 0.05 * rng.standard_normal((20, 128)).astype(np.float32)
+        recall = []
+        for query in queries:
+            exact = {hit['id'] for hit in index.search(query, k=10)}
+            approximate = {hit['id'] for hit in index.search(query, k=10, exact=False, candidates=200)}
+            recall.append(len(exact & approximate) / 10)
+        assert np.mean(recall) >= 0.9, recall
+
+        reopened = VectorIndex(str(Path(tmp) / "index"))
+        assert len(reopened) == 5000 and reopened.dim == 128
+        assert reopened.search(data[1234], k=1)[0]['payload'] == {'row': 1234}
+        print(f"2. Approximate recall@10 {np.mean(recall):.2f}; index reopened from disk")
+
+        # 3. The agent indexes transcripts and reuses the response of a near-identical one
+        agent = MultiModalAgent("test-key", "http://localhost:9",
+                                vector_index=VectorIndex(str(Path(tmp) / "agent_index")))
+        fake = FakeEmbeddings()
+        agent._client = SimpleNamespace(embeddings=fake)
+        transcripts = iter(["draw a red fox in the snow", "draw a red fox in the snow",
+                            "what were quarterly sales figures"])
+        chats = []
+
+        async def transcribe_bytes(audio_bytes):
+            return next(transcripts)
+
+        async def generate_response(text):
+            chats.append(text)
+            return {'response': f"re: {text}", 'image_prompt': f"picture of {text}"}
+
+        async def generate_image(prompt, output_path):
+            Path(output_path).write_bytes(b"png")
+            return output_path
+
+        agent.transcribe_bytes = transcribe_bytes
+        agent.generate_response = generate_response
+        agent.generate_image = generate_image
+
+        audio = Path(tmp) / "input.wav"
+        with wave.open(str(audio), 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(8000)
+            wav_file.writeframes(b"\x00\x00" * 8000)
+
+        first = await agent.process_input(str(audio), Path(tmp) / "a")
+        second = await agent.process_input(str(audio), Path(tmp) / "b")
+        third = await agent.process_input(str(audio), Path(tmp) / "c")
+        assert 'similar_run' not in first and 'similar_run' in second and 'similar_run' not in third
+        assert second['response_text'] == first['response_text']
+        assert chats == ["draw a red fox in the snow", "what were quarterly sales figures"]
+        assert len(agent.vector_index) == 3
+        assert agent.ledger.by_model()[agent.EMBEDDING_MODEL]['requests'] == len(fake.batches)
+
+        hits = await agent.search_transcripts("red fox snow", k=2)
+        assert hits[0]['payload']['transcription'] == "draw a red fox in the snow"
+        agent._client = None
+        await agent.close()
+        print("3. Similar transcript reused a stored response; search finds past calls")
+
+        # 4. Only one writer at a time; an index cut short before its first rows opens empty
+        try:
+            reopened.add(data[:1], [{'row': 0}])
+            raise AssertionError("second writer was not refused")
+        except RuntimeError:
+            pass
+        index.close()
+        reopened.add(data[:1], [{'row': 0}])
+        reopened.close()
+        interrupted = Path(tmp) / "interrupted"
+        interrupted.mkdir()
+        (interrupted / "meta.json").write_text('{"dim": 128, "bits": 64, "seed": 0}')
+        empty = VectorIndex(str(interrupted))
+        assert len(empty) == 0 and empty.search(data[0]) == []
+        empty.add(data[:2], [{'row': 0}, {'row': 1}])
+        assert len(VectorIndex(str(interrupted))) == 2
+        empty.close()
+        print("4. A second writer is refused; a half-created index opens empty")
+
+if __name__ == "__main__":
+    test_embeddings()
@@ -0,0 +1,51 @@
+import asyncio
+import base64
+import json
+import tempfile
+from pathlib import Path
+import httpx
+from multi_modal_agent import MultiModalAgent
+
+def test_image_batch():
+    asyncio.run(run_image_batch_checks())
+
+def fake_image(prompt: str, size: str, index: int) -> bytes:
+    return f"{prompt}|{size}|{index}".encode() * 100
+
+async def run_image_batch_checks():
+    print("\nTesting multi-image and batched generation:")
+    requests_seen = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        requests_seen.append(payload)
+        await asyncio.sleep(0.01)
+        data = [{"b64_json": base64.b64encode(fake_image(payload["prompt"], payload["size"], i)).decode()}
+                for i in range(payload.get("n", 1))]
+        return httpx.Response(200, json={"data": data})
+
+    agent = MultiModalAgent("test-key", "http://gateway.test")
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1. n variants for each of two sizes, one request per size
+        images = await agent.generate_images("a cat", Path(tmp), n=3, sizes=["512x512", "1024x1024"])
+        assert len(images) == 6 and len(requests_seen) == 2
+        for image in images:
+            assert Path(image['path']).read_bytes() == fake_image("a cat", image['size'], image['index'])
+            assert image['seconds'] >= 0
+        print(f"1. Generated {len(images)} images in {len(requests_seen)} requests")
+
+        # 2. Batched prompts run concurrently and keep their order
+        prompts = ["a dog", "a bird", "a fish"]
+        batch = await agent.generate_image_batch(prompts, Path(tmp) / "batch", n=2, max_concurrency=2)
+        assert [len(result) for result in batch] == [2, 2, 2]
+        for prompt, result in zip(prompts, batch):
+            assert Path(result[1]['path']).read_bytes() == fake_image(prompt, "1024x1024", 1)
+        print("2. Batched prompts OK")
+
+    await agent.http_client.aclose()
+    await agent.close()
+
+if __name__ == "__main__":
+    test_image_batch()
@@ -0,0 +1,121 @@
+import asyncio
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+import httpx
+from image_stream import Base64FieldStreamDecoder, decode_to_memory
+import multi_modal_agent
+from multi_modal_agent import MultiModalAgent
+
+def test_image_stream():
+    asyncio.run(run_image_stream_checks())
+
+def chunked(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+async def run_image_stream_checks():
+    print("\nTesting streaming base64 image decode:")
+    images = [os.urandom(200_000), os.urandom(5_000)]
+    body = json.dumps({
+        "created": 1,
+        "data": [
+            {"b64_json": base64.b64encode(images[0]).decode(), "revised_prompt": "a \"quoted\" cat"},
+            {"b64_json": base64.b64encode(images[1]).decode().replace("/", "\\/")},
+        ]
+    }).encode()
+
+    # 1. Any chunk boundary decodes identically, with escaped slashes
+    for size in (3, 1000, 65536, len(body)):
+        assert [bytes(b) for b in decode_to_memory(chunked(body, size))] == images
+    print("1. Decoded across arbitrary chunk boundaries")
+
+    # 2. Encoded text held at once stays bounded by the chunk size
+    decoder = Base64FieldStreamDecoder(lambda index: io.BytesIO(), chunk_size=4096)
+    for chunk in chunked(body, 100_000):
+        decoder.feed(chunk)
+        assert len(decoder._pending) < 4096
+    decoder.close()
+    print("2. Pending buffer bounded")
+
+    # 3. URL responses are collected, truncated bodies rejected
+    decoder = Base64FieldStreamDecoder(lambda index: None)
+    decoder.feed(b'{"data": [{"url": "https://example.com/a.png"}]}')
+    decoder.close()
+    assert decoder.urls == ["https://example.com/a.png"] and decoder.images == 0
+    truncated = Base64FieldStreamDecoder(lambda index: io.BytesIO())
+    truncated.feed(body[:5000])
+    try:
+        truncated.close()
+        raise AssertionError("truncated body accepted")
+    except ValueError:
+        pass
+    print("3. URL and truncation handling OK")
+
+    # 4. Agent writes the image straight to disk from the streamed body
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path.endswith("/images/generations")
+        return httpx.Response(200, content=body)
+
+    agent = MultiModalAgent("test-key", "http://gateway.test")
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = str(Path(tmp) / "response.png")
+        await agent.generate_image("a cat", output_path)
+        assert Path(output_path).read_bytes() == images[0]
+        assert Path(tmp, "response_1.png").read_bytes() == images[1]
+        assert bytes(await agent.generate_image_bytes("a cat")) == images[0]
+    print("4. Agent direct-to-file decode OK")
+
+    # 5. Decoding and writing happen on pool threads, never on the event loop
+    threads = set()
+
+    class RecordingDecoder(Base64FieldStreamDecoder):
+        def feed(self, data: bytes):
+            threads.add(threading.current_thread().name)
+            super().feed(data)
+
+    original = multi_modal_agent.Base64FieldStreamDecoder
+    multi_modal_agent.Base64FieldStreamDecoder = RecordingDecoder
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            await agent.generate_image("a cat", str(Path(tmp) / "response.png"))
+            assert Path(tmp, "response.png").read_bytes() == images[0]
+    finally:
+        multi_modal_agent.Base64FieldStreamDecoder = original
+    assert threads and all(name.startswith("worker-pool") for name in threads), threads
+    print("5. Decode ran on pool threads")
+
+    # 6. A failed URL download stops the others and removes every partly written file
+    class SlowBody(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            yield b"partial image"
+            await asyncio.sleep(5)
+            yield b"never arrives"
+
+    def url_handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/images/generations"):
+            return httpx.Response(200, json={"data": [{"url": "http://cdn.test/a.png"},
+                                                      {"url": "http://cdn.test/b.png"}]})
+        if request.url.path == "/a.png":
+            return httpx.Response(200, stream=SlowBody())
+        return httpx.Response(500)
+
+    await agent.http_client.aclose()
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(url_handler))
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            await asyncio.wait_for(agent.generate_image("a cat", str(Path(tmp) / "response.png")), 2.0)
+            raise AssertionError("failed download was not reported")
+        except httpx.HTTPStatusError:
+            pass
+        assert os.listdir(tmp) == [], os.listdir(tmp)
+    print("6. Partial URL downloads removed")
+    await agent.http_client.aclose()
+    await agent.close()
+
+if __name__ == "__main__":
+    test_image_stream()
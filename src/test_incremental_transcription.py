@@ -0,0 +1,95 @@
+import asyncio
+import tempfile
+from pathlib import Path
+import numpy as np
+from audio_windows import WavInfo, encode_wav, read_wav
+from multi_modal_agent import MultiModalAgent
+from window_cache import WindowCache
+
+def test_incremental_transcription():
+    asyncio.run(run_incremental_checks())
+
+RATE = 8000
+INFO = WavInfo(channels=1, sample_width=2, frame_rate=RATE, frames=0)
+
+def noise(seconds: float, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    return rng.integers(-2000, 2000, int(seconds * RATE), dtype=np.int16).tobytes()
+
+async def run_incremental_checks():
+    print("\nTesting incremental re-transcription:")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / "windows.json"
+        agent = MultiModalAgent("test-key", "http://localhost:9", window_seconds=30.0,
+                                window_cache=WindowCache(str(cache_path)))
+        uploads = []
+
+        async def upstream(audio_bytes):
+            info, _ = read_wav(audio_bytes)
+            uploads.append(info.duration)
+            return f"words{len(uploads)}"
+
+        agent._transcribe_bytes = upstream
+
+        # 1. First submission sends every window
+        recording = noise(90, seed=1)
+        first = await agent.transcribe_bytes(encode_wav(INFO, recording))
+        assert uploads == [30.0, 30.0, 30.0] and first == "words1 words2 words3"
+        print("1. 90s recording sent as 3 windows")
+
+        # 2. Appended audio: only the new windows are sent, cached text merged in order
+        uploads.clear()
+        recording += noise(40, seed=2)
+        grown = await agent.transcribe_bytes(encode_wav(INFO, recording))
+        assert uploads == [30.0, 10.0], uploads
+        assert grown.startswith("words1 words2 words3 ") and len(grown.split()) == 5
+        print(f"2. After appending 40s, uploaded {sum(uploads):.0f}s of 130s")
+
+        # 3. Editing the middle re-sends just that window
+        uploads.clear()
+        edited = bytearray(recording)
+        middle = 45 * RATE * 2
+        edited[middle:middle + 2000] = bytes(2000)
+        await agent.transcribe_bytes(encode_wav(INFO, bytes(edited)))
+        assert uploads == [30.0], uploads
+        print("3. Edit in one window re-sends only that window")
+
+        # 4. Short audio is sent whole, and the cache is reused by a new process
+        uploads.clear()
+        await agent.transcribe_bytes(encode_wav(INFO, noise(5, seed=3)))
+        assert uploads == [5.0]
+        await agent.close()
+
+        restarted = MultiModalAgent("test-key", "http://localhost:9", window_seconds=30.0,
+                                    window_cache=WindowCache(str(cache_path)))
+        restarted._transcribe_bytes = upstream
+        uploads.clear()
+        again = await restarted.transcribe_bytes(encode_wav(INFO, recording))
+        assert uploads == [] and again == grown, (uploads, again, grown)
+        assert restarted.window_cache.hits == 5
+        await restarted.close()
+        print("4. Window cache persisted across agents")
+
+        # 5. Saving writes a snapshot; entries put while it's written are saved next time
+        cache = WindowCache(str(Path(tmp) / "snapshot.json"))
+        cache.put("a", "one")
+        data = cache.snapshot()
+        cache.put("b", "two")
+        cache.write(data)
+        assert cache.dirty and len(WindowCache(str(cache.path))) == 1
+        cache.save()
+        assert not cache.dirty and WindowCache(str(cache.path)).get("b") == "two"
+        assert cache.snapshot() is None
+        print("5. Cache saves a snapshot without losing later entries")
+
+        # 6. A snapshot written after a newer one is skipped
+        cache.put("c", "three")
+        older = cache.snapshot()
+        cache.put("d", "four")
+        newer = cache.snapshot()
+        assert cache.write(newer) and not cache.write(older)
+        assert WindowCache(str(cache.path)).get("d") == "four"
+        print("6. Out-of-order snapshot writes keep the newest entries")
+
+if __name__ == "__main__":
+    test_incremental_transcription()
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import Counter
+from types import SimpleNamespace
+import httpx
+from key_pool import REMOVED, RESTING, KeyPool, NoUsableKeyError, parse_reset
+from multi_modal_agent import MultiModalAgent
+from staged_pipeline import StagedPipeline
+
+def test_key_pool():
+    asyncio.run(run_key_pool_checks())
+
+def key_of(request: httpx.Request) -> str:
+    return request.headers["Authorization"].split(" ", 1)[1]
+
+async def run_key_pool_checks():
+    print("\nTesting API key pool:")
+
+    # 1. Rate-limit reset headers
+    assert parse_reset("6m0s") == 360.0 and parse_reset("20ms") == 0.02
+    assert parse_reset("1.5") == 1.5 and parse_reset("soon") is None
+    print("1. Reset headers parsed")
+
+    # 2. Requests follow remaining quota: the key with more left carries more traffic
+    quota = {"key-big": 100, "key-small": 3}
+
+    def quota_handler(request: httpx.Request) -> httpx.Response:
+        key = key_of(request)
+        quota[key] -= 1
+        return httpx.Response(200, json={}, headers={
+            "x-ratelimit-remaining-requests": str(quota[key]), "x-ratelimit-reset-requests": "60s"})
+
+    pool = KeyPool(["key-big", "key-small"])
+    client = httpx.AsyncClient(transport=httpx.MockTransport(quota_handler))
+    pool.install(client, "http://gateway.test")
+    used = Counter()
+    for _ in range(20):
+        response = await client.get("http://gateway.test/v1/models")
+        used[key_of(response.request)] += 1
+    assert used["key-small"] == 1 and used["key-big"] == 19, used
+    print(f"2. Spread by quota: {dict(used)}")
+
+    # 3. Keys without quota rest; other hosts never see a key
+    pool = KeyPool(["key-a", "key-b"])
+    calls = []
+
+    def limited_handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host != "gateway.test":
+            calls.append(request.headers.get("Authorization"))
+            return httpx.Response(200, content=b"image")
+        key = key_of(request)
+        calls.append(key)
+        if key == "key-a":
+            return httpx.Response(429, headers={"retry-after": "30"})
+        return httpx.Response(200, json={})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(limited_handler))
+    pool.install(client, "http://gateway.test")
+    for _ in range(4):
+        await client.get("http://gateway.test/v1/models")
+    await client.get("https://images.example.com/result.png")
+    assert calls[:5].count("key-a") == 1 and calls[-1] is None, calls
+    assert pool.keys[0].state == RESTING
+    print("3. Rate-limited key rests; foreign hosts are not signed")
+
+    # 4. Repeated 401s remove a key; with none left the pool refuses
+    pool = KeyPool(["key-revoked", "key-good"], max_strikes=2, default_rest=0.0)
+    revoked = {"key-revoked"}
+
+    def auth_handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(401 if key_of(request) in revoked else 200, json={})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(auth_handler))
+    pool.install(client, "http://gateway.test")
+    for _ in range(6):
+        await client.get("http://gateway.test/v1/models")
+    assert pool.keys[0].state == REMOVED and pool.keys[0].requests == 2 and pool.usable() == 1
+    revoked.add("key-good")
+    for _ in range(2):
+        await client.get("http://gateway.test/v1/models")
+    try:
+        await client.get("http://gateway.test/v1/models")
+        raise AssertionError("request sent without a usable key")
+    except NoUsableKeyError as e:
+        assert e.retry_after > 0
+    print("4. Revoked keys removed; empty pool refuses")
+
+    # 5. Quota windows: an exhausted key comes back when its window resets
+    pool = KeyPool(["key-only"])
+    pool.observe("key-only", 200, {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "50ms"})
+    started = time.monotonic()
+    assert await pool.acquire() == "key-only"
+    assert time.monotonic() - started >= 0.04
+    print("5. Exhausted key waited out until its window reset")
+
+    # 6. The agent signs every gateway call from the pool; batch workers scale per key
+    pool = KeyPool(["key-1", "key-2", "key-3"])
+    seen = []
+
+    def gateway(request: httpx.Request) -> httpx.Response:
+        seen.append(key_of(request))
+        return httpx.Response(200, json={"text": "hello"})
+
+    agent = MultiModalAgent("", "http://gateway.test", key_pool=pool)
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(gateway))
+    await asyncio.gather(*[agent.transcribe_bytes(bytes([i]) * 64) for i in range(6)])
+    assert agent.api_key == "key-1" and Counter(seen) == {"key-1": 2, "key-2": 2, "key-3": 2}, seen
+    pipeline = StagedPipeline(agent, "output", transcribe_workers=2, respond_workers=1, image_workers=1)
+    assert pipeline.worker_counts == {'transcribe': 6, 'respond': 3, 'image': 3}
+    single = StagedPipeline(SimpleNamespace(), "output", transcribe_workers=2)
+    assert single.worker_counts['transcribe'] == 2
+    await agent.close()
+    print(f"6. Agent calls rotate keys {dict(Counter(seen))}; pipeline workers {pipeline.worker_counts}")
+
+if __name__ == "__main__":
+    test_key_pool()
@@ -0,0 +1,34 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+OPTIONAL = ["artifact_store", "vector_index", "window_cache", "transcript_index", "scheduler",
+            "key_pool", "memory_profile", "cpu_profile", "numpy", "sqlite3", "tracemalloc"]
+
+def loaded_after(code: str):
+    """Which OPTIONAL modules a fresh interpreter has loaded after running ``code``."""
+    script = f"import json, sys\n{code}\nprint(json.dumps([m for m in {OPTIONAL!r} if m in sys.modules]))"
+    output = subprocess.run([sys.executable, "-c", script], cwd=Path(__file__).parent,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_lazy_imports():
+    print("\nTesting lazy imports of optional features:")
+
+    # 1. Importing the agent loads none of the optional features
+    assert loaded_after("import multi_modal_agent") == []
+    print("1. Agent import leaves optional modules unloaded")
+
+    # 2. Neither does an agent that doesn't use them
+    assert loaded_after("from multi_modal_agent import MultiModalAgent\n"
+                        "MultiModalAgent('test-key', 'http://localhost:9')") == []
+    print("2. Default agent construction leaves them unloaded")
+
+    # 3. A feature is loaded on first use
+    assert loaded_after("from multi_modal_agent import MultiModalAgent\n"
+                        "MultiModalAgent('test-key', 'http://localhost:9').window_cache.put('k', 'v')") == ["window_cache"]
+    print("3. Window cache loaded on first use")
+
+if __name__ == "__main__":
+    test_lazy_imports()
@@ -0,0 +1,92 @@
+import asyncio
+import tempfile
+import tracemalloc
+import wave
+from pathlib import Path
+from memory_profile import MemoryProfiler, memory_report
+from multi_modal_agent import MultiModalAgent
+
+MB = 1024 * 1024
+
+def line_of(marker: str) -> str:
+    """``file:line`` of the line in this file ending with ``marker``."""
+    lines = Path(__file__).read_text().splitlines()
+    return f"{Path(__file__).name}:{next(i + 1 for i, line in enumerate(lines) if line.endswith(marker))}"
+
+def test_memory_profile():
+    try:
+        asyncio.run(run_memory_profile_checks())
+    finally:
+        tracemalloc.stop()  # Don't slow down whatever runs next
+
+async def run_memory_profile_checks():
+    print("\nTesting per-stage memory profiling:")
+    retained = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1. A stage's growth, peak and allocation sites
+        profiler = MemoryProfiler(str(Path(tmp) / "memory.jsonl"), top=5)
+        with profiler.request("direct") as memory:
+            with profiler.stage("decode"):
+                scratch = bytearray(8 * MB)
+                del scratch
+                retained.append(bytearray(2 * MB))  # decode-retained
+        stage = memory.stages[0]
+        assert 2 * MB <= stage['allocated_bytes'] < 3 * MB, stage
+        assert stage['peak_bytes'] >= 8 * MB and memory.peak_bytes >= 8 * MB
+        assert stage['top'][0]['site'].endswith(line_of("# decode-retained")), stage['top'][0]
+        print(f"1. Stage grew {stage['allocated_bytes'] / MB:.1f}MB with a {stage['peak_bytes'] / MB:.1f}MB peak")
+
+        # 2. Every process_input stage is measured and reported next to the timings
+        audio = Path(tmp) / "input.wav"
+        with wave.open(str(audio), 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(b"\x00\x00" * 1600)
+
+        agent = MultiModalAgent("test-key", "http://gateway.test", memory_profiler=profiler)
+
+        async def transcribe(audio_bytes):
+            return "draw a lighthouse"
+
+        async def respond(text):
+            return {'response': "Here it is", 'image_prompt': "a lighthouse"}
+
+        async def draw(prompt, output_path):
+            retained.append(bytearray(4 * MB))  # An image buffer that is never released
+            Path(output_path).write_bytes(b"png")
+            return output_path
+
+        agent.transcribe_bytes, agent.generate_response, agent.generate_image = transcribe, respond, draw
+        for _ in range(2):
+            result = await agent.process_input(str(audio), Path(tmp) / "out")
+        assert [s['stage'] for s in result['memory']['stages']] == ['transcribe', 'respond', 'image']
+        assert 'top' not in result['memory']['stages'][0] and 'image' in result['timings']
+        await agent.close()
+        print(f"2. Request peak {result['memory']['peak_bytes'] / MB:.1f}MB")
+
+        # 3. The report blames the image stage and the line that allocated
+        report = memory_report(profiler.path)
+        assert report['requests'] == 3
+        assert list(report['stages'])[0] == 'image' and report['stages']['image']['calls'] == 2
+        assert report['stages']['image']['mean_allocated_bytes'] >= 4 * MB
+        top = report['top_sites'][0]
+        assert top['stage'] == 'image' and top['site'].endswith(line_of("# An image buffer that is never released")), top
+        print(f"3. Top site: {top['site']} in {top['stage']} (+{top['size_diff'] / MB:.1f}MB)")
+
+        # 4. Requests that overlap are marked, and left out of the peak figures
+        async def overlapping(label):
+            with profiler.request(label) as memory:
+                await asyncio.sleep(0.01)
+            return memory
+
+        first, second = await asyncio.gather(overlapping("first"), overlapping("second"))
+        with profiler.request("alone") as alone:
+            pass
+        assert first.overlapped and second.overlapped and not alone.overlapped
+        assert memory_report(profiler.path)['overlapped'] == 2
+        print("4. Overlapping requests marked as such")
+
+if __name__ == "__main__":
+    test_memory_profile()
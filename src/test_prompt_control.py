@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+from prompt_control import chunk_text, compress_transcript, dedupe_phrases, estimate_tokens, truncate_to_tokens
+from multi_modal_agent import MultiModalAgent
+
+def test_prompt_control():
+    asyncio.run(run_prompt_control_checks())
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, model, messages, **kwargs):
+        self.calls.append(kwargs)
+        if "max_tokens" in kwargs:
+            content = "Summary of part."
+        else:
+            content = '{"response": "ok", "image_prompt": "a cat"}'
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+async def run_prompt_control_checks():
+    print("\nTesting transcript size control:")
+
+    # 1. Deduplication of stutters and repeated sentences
+    text = "Thank you thank you thank you. The order is late. the order is late! Where is it?"
+    assert dedupe_phrases(text) == "Thank you. The order is late. Where is it?"
+    print("1. Deduplication OK")
+
+    # 2. Chunking respects the token limit; truncation keeps both ends
+    long_text = " ".join(f"Sentence number {i} talks about topic {i % 7}." for i in range(400))
+    chunks = chunk_text(long_text, 200)
+    assert len(chunks) > 1 and all(estimate_tokens(c) <= 200 for c in chunks)
+    truncated = truncate_to_tokens(long_text, 100)
+    assert estimate_tokens(truncated) <= 100
+    assert truncated.startswith("Sentence number 0") and truncated.endswith("topic 0.")
+    print(f"2. Split into {len(chunks)} chunks")
+
+    # 3. Map-reduce summarization runs chunks concurrently and bounds the result
+    active = 0
+    peak = 0
+
+    async def summarize(chunk, target):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return chunk[:40] + "."
+
+    result = await compress_transcript(long_text, summarize, max_tokens=300, chunk_tokens=200, max_concurrency=3)
+    assert estimate_tokens(result) <= 300 and peak == 3
+    print(f"3. Compressed to ~{estimate_tokens(result)} tokens")
+
+    # 4. Agent compresses long transcripts before the chat call
+    agent = MultiModalAgent("test-key", "http://gateway.test", max_prompt_tokens=500)
+    completions = FakeCompletions()
+    agent._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    await agent.generate_response(long_text)
+    summary_calls = [c for c in completions.calls if "max_tokens" in c]
+    assert summary_calls and len(completions.calls) == len(summary_calls) + 1
+    print(f"4. Agent ran {len(summary_calls)} summary calls before chat")
+    agent._client = None
+    await agent.close()
+
+if __name__ == "__main__":
+    test_prompt_control()
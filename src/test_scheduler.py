@@ -0,0 +1,131 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import httpx
+from multi_modal_agent import MultiModalAgent
+from scheduler import BATCH, INTERACTIVE, PreemptedError, PriorityScheduler, current_priority, priority_scope
+
+def test_scheduler():
+    asyncio.run(run_scheduler_checks())
+
+async def run_scheduler_checks():
+    print("\nTesting priority scheduling:")
+
+    # 1. Busy classes share slots by weight
+    scheduler = PriorityScheduler(max_concurrency=1, weights={INTERACTIVE: 3.0, BATCH: 1.0}, reserved={})
+    order = []
+
+    async def job(priority: str):
+        async with scheduler.slot(priority):
+            order.append(priority)
+            await asyncio.sleep(0.001)
+
+    await asyncio.gather(*[job(p) for p in [BATCH] * 20 + [INTERACTIVE] * 20])
+    first = order[:16]
+    assert first.count(INTERACTIVE) == 12 and first.count(BATCH) == 4, first
+    print(f"1. First 16 dispatches: {first.count(INTERACTIVE)} interactive, {first.count(BATCH)} batch")
+
+    # 2. A batch burst never takes the reserved slot, so interactive calls start at once
+    scheduler = PriorityScheduler(max_concurrency=4)
+
+    async def call(priority: str, seconds: float):
+        queued_at = time.monotonic()
+        async with scheduler.slot(priority):
+            waited = time.monotonic() - queued_at
+            await asyncio.sleep(seconds)
+        return waited
+
+    batch = [asyncio.create_task(call(BATCH, 0.05)) for _ in range(30)]
+    await asyncio.sleep(0.01)
+    assert scheduler.active_by[BATCH] == 3
+    interactive_wait = await call(INTERACTIVE, 0.0)
+    assert interactive_wait < 0.01, interactive_wait
+    await asyncio.gather(*batch)
+    print(f"2. Interactive waited {interactive_wait * 1000:.1f}ms behind a 30-call batch burst")
+
+    # 3. A full queue evicts batch waiters for interactive ones and refuses batch outright
+    scheduler = PriorityScheduler(max_concurrency=1, reserved={}, max_queued=2)
+    release = asyncio.Event()
+
+    async def hold(priority: str):
+        async with scheduler.slot(priority):
+            await release.wait()
+
+    running = asyncio.create_task(hold(BATCH))
+    waiting = [asyncio.create_task(hold(BATCH)) for _ in range(2)]
+    await asyncio.sleep(0)
+    urgent = asyncio.create_task(hold(INTERACTIVE))
+    await asyncio.wait([waiting[1]], timeout=1.0)
+    assert waiting[1].done() and isinstance(waiting[1].exception(), PreemptedError)
+    try:
+        await scheduler.acquire(BATCH)
+        raise AssertionError("batch call admitted to a full queue")
+    except PreemptedError as e:
+        assert e.retry_after > 0
+    release.set()
+    await asyncio.gather(running, waiting[0], urgent)
+    assert scheduler.snapshot()[BATCH]['preempted'] == 2 and scheduler.active == 0
+    print("3. Full queue preempts batch waiters for interactive work")
+
+    # 4. Cancelling a queued call frees its place without leaking a slot
+    scheduler = PriorityScheduler(max_concurrency=1, reserved={})
+    release = asyncio.Event()
+    running = asyncio.create_task(hold(BATCH))
+    queued = asyncio.create_task(hold(INTERACTIVE))
+    await asyncio.sleep(0)
+    queued.cancel()
+    await asyncio.sleep(0)
+    assert scheduler.queued() == 0
+    release.set()
+    await running
+    assert scheduler.active == 0
+    print("4. Cancellation while queued is clean")
+
+    # 5. Agent calls go through the scheduler at the caller's priority
+    scheduler = PriorityScheduler(max_concurrency=2)
+    seen = []
+
+    async def create(**kwargs):
+        seen.append((current_priority(), dict(scheduler.active_by)))
+        content = '{"response": "ok", "image_prompt": "a cat"}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    agent = MultiModalAgent("test-key", "http://gateway.test", scheduler=scheduler)
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200)))
+    agent._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    await agent.generate_response("hello")
+    with priority_scope(BATCH):
+        await agent.generate_response("hello again")
+    assert [s[0] for s in seen] == [INTERACTIVE, BATCH]
+    assert seen[0][1][INTERACTIVE] == 1 and seen[1][1][BATCH] == 1
+    assert scheduler.snapshot()[BATCH]['dispatched'] == 1 and scheduler.active == 0
+
+    # Interactive callers don't join a batch caller's call, so they aren't admitted at batch priority
+    seen.clear()
+    with priority_scope(BATCH):
+        batch = asyncio.ensure_future(agent.generate_response("shared"))
+    interactive = asyncio.ensure_future(agent.generate_response("shared"))
+    await asyncio.gather(batch, interactive, agent.generate_response("shared"))
+    assert sorted(s[0] for s in seen) == [BATCH, INTERACTIVE] and agent.single_flight.coalesced == 1
+    agent._client = None
+    await agent.close()
+    print("5. Agent calls are admitted by priority, and only shared within one")
+
+    # 6. Reservations that would starve a class are shrunk: batch calls still run on one slot
+    scheduler = PriorityScheduler(max_concurrency=1)
+    assert scheduler.reserved == {INTERACTIVE: 0}
+
+    async def batch_call():
+        async with scheduler.slot(BATCH):
+            return True
+
+    assert await asyncio.wait_for(batch_call(), 1.0) and scheduler.active == 0
+    try:
+        PriorityScheduler(max_concurrency=0)
+        raise AssertionError("accepted a scheduler without slots")
+    except ValueError:
+        pass
+    print("6. One slot with an interactive reservation still admits batch calls")
+
+if __name__ == "__main__":
+    test_scheduler()
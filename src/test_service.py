@@ -0,0 +1,157 @@
+import asyncio
+import json
+import tempfile
+import time
+from accounting import UsageLedger
+from circuit_breaker import CircuitBreakerRegistry
+from single_flight import SingleFlight
+from service import MAX_BODY_BYTES, AgentService
+
+def test_service():
+    asyncio.run(run_service_checks())
+
+class FakeAgent:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.single_flight = SingleFlight()
+        self.ledger = UsageLedger()
+        self.breakers = CircuitBreakerRegistry()
+        self.warmed = False
+        self.closed = False
+
+    async def warmup(self):
+        self.warmed = True
+
+    async def close(self):
+        self.closed = True
+
+    async def transcribe_bytes(self, audio_bytes):
+        await asyncio.sleep(self.delay)
+        return f"{len(audio_bytes)} bytes of speech"
+
+    async def generate_response(self, text):
+        return {"response": f"re: {text}", "image_prompt": "a cat"}
+
+    async def generate_images(self, prompt, output_dir, n=1, sizes=None, name="image"):
+        return [{"path": f"{output_dir}/{name}.png", "index": i, "size": "1024x1024"} for i in range(n)]
+
+async def call(app, method, path, body=b"", headers=()):
+    """Drive the ASGI app directly and collect the response."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "method": method, "path": path, "headers": list(headers)}, receive, send)
+    start = sent[0]
+    payload = b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], dict(start["headers"]), payload
+
+async def run_service_checks():
+    print("\nTesting HTTP service front-end:")
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = FakeAgent()
+        app = AgentService(agent, output_dir=tmp)
+
+        # 1. JSON endpoints
+        status, _, body = await call(app, "POST", "/transcribe", b"RIFF" * 10)
+        assert status == 200 and json.loads(body)["transcription"] == "40 bytes of speech"
+        status, _, body = await call(app, "POST", "/respond", json.dumps({"text": "hi"}).encode())
+        assert status == 200 and json.loads(body)["image_prompt"] == "a cat"
+        status, _, body = await call(app, "POST", "/image", json.dumps({"prompt": "a dog", "n": 2}).encode())
+        assert status == 200 and len(json.loads(body)["images"]) == 2
+        for bad in [{"n": "2"}, {"n": 0}, {"n": 1000}, {"n": True}, {"sizes": "1024x1024"},
+                    {"sizes": ["large"]}, {"sizes": [1024]}, {"sizes": []}]:
+            status, _, _ = await call(app, "POST", "/image", json.dumps({"prompt": "a dog", **bad}).encode())
+            assert status == 400, bad
+        status, _, body = await call(app, "POST", "/image",
+                                     json.dumps({"prompt": "a dog", "sizes": ["512x512", "1024x1024"]}).encode())
+        assert status == 200
+        status, _, _ = await call(app, "POST", "/respond", b"not json")
+        assert status == 400
+        status, _, _ = await call(app, "GET", "/nowhere")
+        assert status == 404
+        print("1. Endpoints OK")
+
+        # 2. Pipeline streams one SSE event per stage
+        status, headers, body = await call(app, "POST", "/pipeline", b"RIFF")
+        events = [line.split(": ", 1)[1] for line in body.decode().splitlines() if line.startswith("event:")]
+        assert headers[b"content-type"] == b"text/event-stream"
+        assert events == ["transcription", "response", "image", "done"]
+        print(f"2. Pipeline events: {events}")
+
+        # 3. Bounded admission rejects overflow with 503
+        slow = AgentService(FakeAgent(delay=0.05), max_inflight=2, max_queue=1, output_dir=tmp)
+        results = await asyncio.gather(*[call(slow, "POST", "/transcribe", b"RIFF") for _ in range(5)])
+        statuses = sorted(r[0] for r in results)
+        assert statuses == [200, 200, 200, 503, 503]
+        assert results[[r[0] for r in results].index(503)][1][b"retry-after"] == b"1"
+        print(f"3. Backpressure statuses: {statuses}")
+
+        # 4. Metrics endpoint
+        status, _, body = await call(slow, "GET", "/metrics")
+        text = body.decode()
+        assert 'service_requests_total{endpoint="/transcribe",status="503"} 2' in text
+        assert "service_rejected_total 2" in text
+        print("4. Metrics exported")
+
+        # 5. Lifespan warms and closes the shared agent
+        lifespan = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return lifespan.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        await app({"type": "lifespan"}, receive, send)
+        assert agent.warmed and agent.closed
+        assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        print("5. Lifespan OK")
+
+        # 6. Requests past their deadline are cancelled and answered with 504
+        timed = AgentService(FakeAgent(delay=1.0), output_dir=tmp, request_timeout=5.0)
+        status, _, body = await call(timed, "POST", "/transcribe", b"RIFF", [(b"x-request-timeout", b"0.05")])
+        assert status == 504 and "DeadlineExceeded" in json.loads(body)["error"]
+        status, _, _ = await call(timed, "POST", "/transcribe", b"RIFF", [(b"x-request-timeout", b"soon")])
+        assert status == 400
+        print("6. Request deadline enforced")
+
+        # 7. Priority header is validated against the classes the agent knows
+        status, _, _ = await call(app, "POST", "/transcribe", b"RIFF", [(b"x-priority", b"interactive")])
+        assert status == 200
+        status, _, _ = await call(app, "POST", "/transcribe", b"RIFF", [(b"x-priority", b"urgent")])
+        assert status == 400
+        print("7. Priority header validated")
+
+        # 8. Oversized bodies are refused up front; bodies are read only once admitted, within the deadline
+        status, _, _ = await call(app, "POST", "/transcribe", b"",
+                                  [(b"content-length", str(MAX_BODY_BYTES + 1).encode())])
+        assert status == 413
+        single = AgentService(FakeAgent(delay=0.2), max_inflight=1, output_dir=tmp)
+        reads = []
+
+        async def queued():
+            async def receive():
+                reads.append(time.monotonic())
+                return {"type": "http.request", "body": b"RIFF", "more_body": False}
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+            await single({"type": "http", "method": "POST", "path": "/transcribe",
+                          "headers": [(b"x-request-timeout", b"0.05")]}, receive, send)
+            return sent[0]["status"], json.loads(sent[1]["body"])
+
+        first, second = await asyncio.gather(call(single, "POST", "/transcribe", b"RIFF"), queued())
+        assert first[0] == 200 and second[0] == 504 and "admission" in second[1]["error"], second
+        assert reads == []
+        print("8. Content-length checked; admission wait bounded by the deadline")
+
+if __name__ == "__main__":
+    test_service()
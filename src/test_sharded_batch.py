@@ -0,0 +1,117 @@
+import asyncio
+import json
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from key_pool import KeyPool
+from sharded_batch import ShardRunner, claim_shard, merge_shards, partition, shard_dir
+
+INPUTS = [f"audio/clip_{i:03d}.wav" for i in range(40)]
+
+def test_sharded_batch():
+    asyncio.run(run_sharded_batch_checks())
+
+class FakeAgent:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+
+    async def process_input(self, audio_file_path, output_dir, **kwargs):
+        self.calls.append(audio_file_path)
+        await asyncio.sleep(0.001)
+        if audio_file_path in self.fail:
+            raise RuntimeError("gateway unavailable")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / "response.png").write_bytes(b"png")
+        return {'transcription': audio_file_path, 'image_file': str(output_dir / "response.png")}
+
+def claim_and_run(root: str, shards: int):
+    """One worker process: claim shards until none are left."""
+    async def _run():
+        agent = FakeAgent()
+        while True:
+            shard = claim_shard(Path(root), shards)
+            if shard is None:
+                return
+            await ShardRunner(agent, Path(root), shard, shards, concurrency=2).run(INPUTS)
+    asyncio.run(_run())
+
+async def run_sharded_batch_checks():
+    print("\nTesting sharded batch execution:")
+
+    # 1. Partitioning is deterministic and covers every input exactly once
+    parts = [partition(INPUTS, shard, 4) for shard in range(4)]
+    assert sorted(sum(parts, [])) == sorted(INPUTS)
+    assert parts == [partition(reversed(INPUTS), shard, 4) for shard in range(4)]
+    assert all(parts), [len(p) for p in parts]
+    print(f"1. Partition sizes: {[len(p) for p in parts]}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 2. Three processes share four shards through the filesystem, then merge
+        root = Path(tmp) / "batch"
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=claim_and_run, args=(str(root), 4)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+        assert [worker.exitcode for worker in workers] == [0, 0, 0]
+        report = merge_shards(root)
+        assert report['complete'] and report['completed'] == len(INPUTS) and not report['stragglers'], report
+        merged = [json.loads(line) for line in (root / "merged" / "results.jsonl").read_text().splitlines()]
+        assert [r['input'] for r in merged] == sorted(INPUTS)
+        assert all(Path(r['result']['image_file']).exists() for r in merged)
+        workers_seen = {r['worker'] for r in report['shard_reports']}
+        # Short shards differing by jitter are fine; one that took a minute longer is a straggler
+        path = shard_dir(root, 0, 4) / "manifest.json"
+        manifest = json.loads(path.read_text())
+        manifest['finished_at'] = manifest['started_at'] + 60
+        path.write_text(json.dumps(manifest))
+        assert [(r['shard'], r.get('slow')) for r in merge_shards(root)['stragglers']] == [(0, True)]
+        print(f"2. {len(workers)} processes finished 4 shards ({len(workers_seen)} distinct workers)")
+
+        # 3. A restarted shard only retries what failed
+        root = Path(tmp) / "resume"
+        mine = partition(INPUTS, 0, 2)
+        flaky = FakeAgent(fail=mine[:2])
+        manifest = await ShardRunner(flaky, root, 0, 2).run(INPUTS)
+        assert manifest['failed'] == 2 and manifest['completed'] == len(mine) - 2
+        retry = FakeAgent()
+        manifest = await ShardRunner(retry, root, 0, 2).run(INPUTS)
+        assert sorted(retry.calls) == sorted(mine[:2]) and manifest['completed'] == len(mine)
+        assert manifest['attempts'] == 2
+        print(f"3. Resume retried {len(retry.calls)} failed input(s) only")
+
+        # 4. Stragglers: a missing shard and a stalled one, which another worker then takes over
+        report = merge_shards(root, stale_after=60.0)
+        assert not report['complete']
+        assert [(r['shard'], r['status']) for r in report['stragglers']] == [(1, 'missing')]
+        assert claim_shard(root, 2, stale_after=60.0, worker="host-a:1") == 1
+        directory = shard_dir(root, 1, 2)
+        stalled = {'shard': 1, 'shards': 2, 'worker': "host-a:1", 'inputs': partition(INPUTS, 1, 2),
+                   'started_at': time.time() - 600, 'heartbeat_at': time.time() - 600, 'finished_at': None}
+        (directory / "manifest.json").write_text(json.dumps(stalled))
+        (directory / "claim").write_text(json.dumps({'worker': "host-a:1", 'claimed_at': time.time() - 600}))
+        report = merge_shards(root, stale_after=60.0)
+        assert [(r['shard'], r['status']) for r in report['stragglers']] == [(1, 'stalled')]
+        assert claim_shard(root, 2, stale_after=60.0, worker="host-b:1") == 1
+        assert claim_shard(root, 2, stale_after=60.0, worker="host-c:1") is None
+        (directory / "claim").write_text("")  # Unreadable but just written: still owned
+        assert claim_shard(root, 2, stale_after=60.0, worker="host-c:1") is None
+        await ShardRunner(FakeAgent(), root, 1, 2).run(INPUTS)
+        report = merge_shards(root, stale_after=60.0)
+        assert report['complete'] and report['completed'] == len(INPUTS)
+        print("4. Missing and stalled shards reported; stalled shard taken over and merged")
+
+    # 5. Inputs in flight scale with the agent's usable API keys
+    keyed = FakeAgent()
+    keyed.key_pool = KeyPool(["key-a", "key-b", "key-c"])
+    with tempfile.TemporaryDirectory() as root:
+        assert ShardRunner(keyed, Path(root), 0, 1, concurrency=2).concurrency == 6
+        assert ShardRunner(keyed, Path(root), 0, 1, concurrency=2, scale_with_keys=False).concurrency == 2
+        assert ShardRunner(FakeAgent(), Path(root), 0, 1).concurrency == 4
+    print("5. Shard concurrency scales with the key pool")
+
+if __name__ == "__main__":
+    test_sharded_batch()
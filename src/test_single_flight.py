@@ -0,0 +1,127 @@
+import asyncio
+from accounting import UsageRecord, request_scope
+from deadline import Deadline, DeadlineExceeded, call_timeout, deadline_scope
+from single_flight import SingleFlight, fingerprint
+from multi_modal_agent import MultiModalAgent
+
+def test_single_flight():
+    asyncio.run(run_single_flight_checks())
+
+async def run_single_flight_checks():
+    print("\nTesting request coalescing:")
+
+    # 1. Canonical fingerprints ignore dict ordering
+    assert fingerprint("respond", {"a": 1, "b": 2}) == fingerprint("respond", {"b": 2, "a": 1})
+    assert fingerprint("transcribe", b"abc") != fingerprint("transcribe", b"abd")
+    print("1. Fingerprints are canonical")
+
+    # 2. Concurrent identical calls share one upstream call
+    flight = SingleFlight()
+    upstream_calls = 0
+
+    async def upstream():
+        nonlocal upstream_calls
+        upstream_calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    results = await asyncio.gather(*[flight.do("same", upstream) for _ in range(10)])
+    assert results == ["result"] * 10
+    assert upstream_calls == 1 and flight.coalesced == 9 and len(flight) == 0
+    print(f"2. {flight.calls} calls -> {upstream_calls} upstream request")
+
+    # 3. Cancelling one waiter leaves the shared call running for the others
+    waiter = asyncio.ensure_future(flight.do("cancel", upstream))
+    other = asyncio.ensure_future(flight.do("cancel", upstream))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    assert await other == "result"
+    started = asyncio.Event()
+    upstream_cancelled = asyncio.Event()
+
+    async def long_upstream():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            upstream_cancelled.set()
+            raise
+
+    waiters = [asyncio.ensure_future(flight.do("abandon", long_upstream)) for _ in range(2)]
+    await started.wait()
+    for w in waiters:
+        w.cancel()
+    await asyncio.wait_for(upstream_cancelled.wait(), 1.0)
+    print("3. Cancellation isolated per caller; abandoned calls cancelled")
+
+    # 4. Errors propagate to every waiter and are not cached
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("gateway down")
+
+    outcomes = await asyncio.gather(flight.do("fail", failing), flight.do("fail", failing),
+                                    return_exceptions=True)
+    assert all(isinstance(o, RuntimeError) for o in outcomes) and len(flight) == 0
+    print("4. Errors shared, not cached")
+
+    # 5. Agent chat calls for the same text are coalesced
+    agent = MultiModalAgent("test-key", "http://localhost:9")
+    chat_calls = 0
+
+    async def fake_generate(text):
+        nonlocal chat_calls
+        chat_calls += 1
+        await asyncio.sleep(0.02)
+        return {"response": f"re: {text}", "image_prompt": "a cat"}
+
+    agent._generate_response = fake_generate
+    responses = await asyncio.gather(*[agent.generate_response("hello") for _ in range(5)])
+    assert chat_calls == 1 and responses[0] is not responses[1]
+    print("5. Agent chat requests coalesced")
+
+    # 6. A shared call runs under its starter's deadline; only callers it won't cut short join it
+    async def slow_generate(text):
+        nonlocal chat_calls
+        chat_calls += 1
+        # Like an HTTP call, time out at the deadline in effect
+        await asyncio.wait_for(asyncio.sleep(0.3), call_timeout(30.0))
+        return {"response": f"re: {text}", "image_prompt": "a cat"}
+
+    async def with_deadline(seconds):
+        with deadline_scope(Deadline.after(seconds)):
+            return await agent.generate_response("hello")
+
+    agent._generate_response = slow_generate
+    chat_calls = 0
+    patient, hurried = await asyncio.gather(agent.generate_response("hello"), with_deadline(0.1),
+                                            return_exceptions=True)
+    assert isinstance(hurried, DeadlineExceeded) and hurried.stage == "respond", hurried
+    assert patient["response"] == "re: hello" and chat_calls == 1
+    hurried, patient = await asyncio.gather(with_deadline(0.1), agent.generate_response("hello"),
+                                            return_exceptions=True)
+    assert isinstance(hurried, DeadlineExceeded) and patient["response"] == "re: hello"
+    assert chat_calls == 3 and len(agent.single_flight) == 0
+    print("6. Mixed deadlines: callers join only calls that outlast them; the hurried one gives up")
+
+    # 7. Usage of a shared call is counted once, with a shared copy for each request that joined
+    async def metered_generate(text):
+        await asyncio.sleep(0.02)
+        agent.ledger.record(UsageRecord(model="gpt", kind="chat", prompt_tokens=10))
+        return {"response": f"re: {text}", "image_prompt": "a cat"}
+
+    async def as_request(request_id):
+        with request_scope(request_id):
+            return await agent.generate_response("metered")
+
+    agent._generate_response = metered_generate
+    await asyncio.gather(as_request("first"), as_request("second"))
+    records = [(r.request_id, r.shared) for r in agent.ledger._pending if r.model == "gpt"]
+    assert records == [("first", False), ("second", True)], records
+    assert agent.ledger.by_model()["gpt"]["requests"] == 1
+    scoped = SingleFlight(scope=lambda: "batch")
+    assert await scoped.do("k", lambda: asyncio.sleep(0, "ok")) == "ok" and scoped.calls == 1
+    print("7. Shared usage recorded per request; key scope supplied by the caller")
+    await agent.close()
+
+if __name__ == "__main__":
+    test_single_flight()
@@ -0,0 +1,133 @@
+import asyncio
+import tempfile
+import wave
+from pathlib import Path
+from audio_windows import read_wav, slice_wav
+from multi_modal_agent import MultiModalAgent
+from speculative import intent_similarity
+from vector_index import VectorIndex
+
+def test_speculative():
+    asyncio.run(run_speculative_checks())
+
+def write_silence(path: Path, seconds: float, rate: int = 8000):
+    with wave.open(str(path), 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(b"\x00\x00" * int(seconds * rate))
+
+def make_agent(full_text: str, partial_text: str, image_delay: float = 0.0):
+    agent = MultiModalAgent("test-key", "http://localhost:9")
+    calls = {'responses': [], 'images': [], 'cancelled': 0}
+
+    async def transcribe_bytes(audio_bytes):
+        info, _ = read_wav(audio_bytes)
+        if info.duration < 20:
+            return partial_text
+        await asyncio.sleep(0.05)  # the full file takes longer
+        return full_text
+
+    async def generate_response(text):
+        calls['responses'].append(text)
+        return {'response': f"re: {text}", 'image_prompt': f"picture of {text}"}
+
+    async def generate_image(prompt, output_path):
+        calls['images'].append(output_path)
+        try:
+            await asyncio.sleep(image_delay)
+        except asyncio.CancelledError:
+            calls['cancelled'] += 1
+            raise
+        Path(output_path).write_bytes(b"png")
+        return output_path
+
+    agent.transcribe_bytes = transcribe_bytes
+    agent.generate_response = generate_response
+    agent.generate_image = generate_image
+    return agent, calls
+
+async def run_speculative_checks():
+    print("\nTesting speculative drafting:")
+
+    # 1. Window helpers and the similarity measure
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = Path(tmp) / "long.wav"
+        write_silence(audio, 40)
+        prefix, _ = read_wav(slice_wav(audio.read_bytes(), 0.0, 15.0))
+        assert prefix.frames == 15 * 8000
+    same = intent_similarity("Draw a red fox in the snowy forest",
+                             "Please draw a red fox sleeping in the snowy forest at night")
+    different = intent_similarity("Draw a red fox in the snowy forest",
+                                  "Actually, tell me about quarterly sales figures")
+    longer = intent_similarity("Draw a red fox in the snowy forest",
+                               "Draw a red fox in the snowy forest, curled up under a pine tree while "
+                               "snow falls, with a frozen river and mountains behind it in soft light")
+    assert same > 0.6 > different and longer > 0.6, (same, different, longer)
+    print(f"1. Prefix sliced; similarity {same:.2f} (same topic) vs {different:.2f} (changed topic)")
+
+    # 2. Full transcript on the same topic: the draft is kept and renamed
+    agent, calls = make_agent("draw a red fox in the snowy forest at dusk",
+                              "draw a red fox in the snowy forest")
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp)
+        audio = out / "long.wav"
+        write_silence(audio, 40)
+        result = await agent.process_input(str(audio), out, speculative=True)
+        assert result['speculation']['kept']
+        assert result['transcription'] == "draw a red fox in the snowy forest at dusk"
+        assert result['image_file'] == str(out / 'response.png')
+        assert (out / 'response.png').exists() and not (out / 'response.draft.png').exists()
+        assert len(calls['responses']) == 1
+    await agent.close()
+    print("2. Matching draft kept without regenerating")
+
+    # 3. Topic changed: the in-flight draft is cancelled and the response regenerated
+    agent, calls = make_agent("forget that, summarize quarterly sales figures",
+                              "draw a red fox in the snowy forest", image_delay=0.2)
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp)
+        audio = out / "long.wav"
+        write_silence(audio, 40)
+        result = await agent.process_input(str(audio), out, speculative=True)
+        assert not result['speculation']['kept']
+        assert calls['cancelled'] == 1
+        assert calls['responses'][-1] == "forget that, summarize quarterly sales figures"
+        assert (out / 'response.png').exists() and not (out / 'response.draft.png').exists()
+    await agent.close()
+    print("3. Diverging draft cancelled and regenerated")
+
+    # 4. Short recordings skip speculation
+    agent, calls = make_agent("full text", "draw a red fox")
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp)
+        audio = out / "short.wav"
+        write_silence(audio, 10)
+        result = await agent.process_input(str(audio), out, speculative=True)
+        assert 'speculation' not in result and len(calls['responses']) == 1
+    await agent.close()
+    print("4. Short recording processed without a draft")
+
+    # 5. With a vector index, speculative runs are indexed like any other
+    agent, calls = make_agent("draw a red fox in the snowy forest at dusk",
+                              "draw a red fox in the snowy forest")
+    embedded = []
+
+    async def embed_text(text):
+        embedded.append(text)
+        return [1.0, 0.0, 0.5, 0.25]
+
+    agent.embed_text = embed_text
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp)
+        agent.vector_index = VectorIndex(str(out / "index"))
+        audio = out / "long.wav"
+        write_silence(audio, 40)
+        result = await agent.process_input(str(audio), out, speculative=True)
+        assert result['speculation']['kept'] and len(agent.vector_index) == 1
+        assert embedded == ["draw a red fox in the snowy forest at dusk"]
+    await agent.close()
+    print("5. Speculative run indexed")
+
+if __name__ == "__main__":
+    test_speculative()
@@ -0,0 +1,67 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from staged_pipeline import StagedPipeline
+
+def test_staged_pipeline():
+    asyncio.run(run_staged_pipeline_checks())
+
+class SlowImageAgent:
+    """Fast transcription, slow image generation, one input that fails to transcribe."""
+
+    def __init__(self):
+        self.active_images = 0
+        self.peak_images = 0
+
+    async def transcribe_audio(self, path):
+        await asyncio.sleep(0.001)
+        if path.endswith("bad.wav"):
+            raise ValueError("unreadable audio")
+        return f"text for {Path(path).name}"
+
+    async def generate_response(self, text):
+        await asyncio.sleep(0.002)
+        return {"response": f"re: {text}", "image_prompt": f"picture of {text}"}
+
+    async def generate_image(self, prompt, output_path):
+        self.active_images += 1
+        self.peak_images = max(self.peak_images, self.active_images)
+        await asyncio.sleep(0.01)
+        self.active_images -= 1
+        return output_path
+
+async def run_staged_pipeline_checks():
+    print("\nTesting staged pipeline with bounded queues:")
+    agent = SlowImageAgent()
+    inputs = [f"clip_{i}.wav" for i in range(30)] + ["bad.wav"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = StagedPipeline(agent, Path(tmp), transcribe_workers=4, respond_workers=2,
+                                  image_workers=2, queue_size=3)
+        depth_samples = []
+
+        async def sample():
+            while True:
+                depth_samples.append({k: v['queue_depth'] for k, v in pipeline.stage_metrics().items()})
+                await asyncio.sleep(0.005)
+
+        sampler = asyncio.ensure_future(sample())
+        results = await pipeline.run(inputs)
+        sampler.cancel()
+
+    # 1. Results in input order, failures isolated
+    assert [r['input'] for r in results] == inputs
+    assert results[-1]['error'].startswith("transcribe: ValueError")
+    assert all(r['image_file'].endswith(f"response_{i:05d}.png") for i, r in enumerate(results[:-1]))
+    print(f"1. {len(results)} results in order, 1 failure isolated")
+
+    # 2. Queues never exceed their bound and image workers stay within their count
+    metrics = pipeline.stage_metrics()
+    assert all(m['max_queue_depth'] <= 3 for m in metrics.values())
+    assert all(depth <= 3 for sample_ in depth_samples for depth in sample_.values())
+    assert agent.peak_images == 2
+    assert metrics['image']['processed'] == 30 and metrics['transcribe']['failed'] == 1
+    print(f"2. Stage metrics: {metrics}")
+
+if __name__ == "__main__":
+    test_staged_pipeline()
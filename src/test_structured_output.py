@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+from structured_output import StructuredOutputError, compile_schema, extract_first_object, parse_structured
+from multi_modal_agent import MultiModalAgent
+
+def test_structured_output():
+    asyncio.run(run_structured_output_checks())
+
+class ScriptedCompletions:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def create(self, model, messages, **kwargs):
+        self.calls.append(messages)
+        message = SimpleNamespace(content=self.replies.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+async def run_structured_output_checks():
+    print("\nTesting structured output validation and repair:")
+    expected = {"response": "Hello", "image_prompt": "a cat"}
+
+    # 1. Local repairs: code fences, surrounding prose, trailing commas
+    assert parse_structured('{"response": "Hello", "image_prompt": "a cat"}') == expected
+    assert parse_structured('```json\n{"response": "Hello", "image_prompt": "a cat"}\n```') == expected
+    assert parse_structured('Sure! {"response": "Hello", "image_prompt": "a cat"} Hope this helps') == expected
+    assert parse_structured('{"response": "Hello", "image_prompt": "a cat",}') == expected
+    assert extract_first_object('x {"a": "}{"} y') == '{"a": "}{"}'
+    print("1. Local repairs OK")
+
+    # 2. Schema violations are reported with specific errors
+    try:
+        parse_structured('{"response": 3}')
+        raise AssertionError("invalid output accepted")
+    except StructuredOutputError as e:
+        assert "missing field 'image_prompt'" in e.errors
+        assert "field 'response' must be str, got int" in e.errors
+    validator = compile_schema({"a": str, "b": int}, required=["a"])
+    assert validator({"a": "x"}) == [] and validator({"a": "x", "b": "y"})
+    print("2. Schema validation OK")
+
+    # 3. Agent repairs locally without a second model call
+    agent = MultiModalAgent("test-key", "http://gateway.test")
+    completions = ScriptedCompletions(['```json\n{"response": "Hello", "image_prompt": "a cat",}\n```'])
+    agent._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    assert await agent.generate_response("hi") == expected and len(completions.calls) == 1
+    print("3. Local repair avoided a re-generation")
+
+    # 4. Falls back to a targeted repair prompt only when local repair fails
+    completions = ScriptedCompletions(['{"response": "Hello"}', '{"response": "Hello", "image_prompt": "a cat"}'])
+    agent._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    assert await agent.generate_response("hello again") == expected
+    assert len(completions.calls) == 2 and "missing field 'image_prompt'" in completions.calls[1][-1]["content"]
+    print("4. Model repair used as last resort")
+    agent._client = None
+    await agent.close()
+
+if __name__ == "__main__":
+    test_structured_output()
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import re
+import tempfile
+from pathlib import Path
+import httpx
+from audio_windows import WavInfo, encode_wav, read_wav
+from multi_modal_agent import MultiModalAgent
+from transcript_index import Segment, TranscriptIndex, window_segments
+
+def test_transcript_index():
+    asyncio.run(run_transcript_index_checks())
+
+def wav_from_body(body: bytes) -> bytes:
+    start = body.index(b"RIFF")
+    size = int.from_bytes(body[start + 4:start + 8], "little") + 8
+    return body[start:start + size]
+
+async def run_transcript_index_checks():
+    print("\nTesting timestamped transcripts:")
+
+    # 1. Seek by time, substring search and a lossless file round trip
+    segments = [Segment(i * 2.0, i * 2.0 + 1.5, f"Sentence {i} über café") for i in range(10000)]
+    segments[5000] = Segment(10000.0, 10001.5, "the quarterly BUDGET")
+    segments[5001] = Segment(10002.0, 10003.5, "review happened here")
+    index = TranscriptIndex.from_segments(segments)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "talk.tidx"
+        index.save(str(path))
+        loaded = TranscriptIndex.load(str(path))
+        assert loaded.segments() == segments
+        assert path.stat().st_size < sum(len(s.text.encode()) + 64 for s in segments)
+    assert loaded.at(10000.7).text == "the quarterly BUDGET"
+    assert loaded.at(-1) is None and loaded.at(1e9) == segments[-1]
+    assert [s.text for s in loaded.between(10000, 10003)] == ["the quarterly BUDGET", "review happened here"]
+    hits = loaded.search("budget review")
+    assert len(hits) == 1 and hits[0]['start'] == 10000.0 and hits[0]['end'] == 10003.5
+    assert loaded.search("budget", case_sensitive=True) == []
+    assert len(loaded.search("CAFÉ", limit=5)) == 5
+    print("1. Seek, cross-segment search and round trip over 10000 segments")
+
+    # 2. Windows are shifted by their offset, clamped and kept monotonic
+    merged = window_segments([
+        (0.0, 30.0, {"segments": [{"start": 0.0, "end": 12.0, "text": " first "},
+                                  {"start": 12.0, "end": 30.9, "text": "runs over"}]}),
+        (30.0, 60.0, {"segments": [{"start": 0.0, "end": 5.0, "text": "second"}]}),
+        (60.0, 70.0, {"text": "no timestamps"}),
+    ])
+    assert merged == [Segment(0.0, 12.0, "first"), Segment(12.0, 30.0, "runs over"),
+                      Segment(30.0, 35.0, "second"), Segment(60.0, 70.0, "no timestamps")]
+    print("2. Per-window timestamps merged into one timeline")
+
+    # 3. The agent requests verbose_json per window and merges the results
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        requests.append(body)
+        assert b"verbose_json" in body and re.search(rb'timestamp_granularities\[\]"\r\n\r\nword', body)
+        info, _ = read_wav(wav_from_body(body))
+        words = [{"word": f"w{len(requests)}-{i}", "start": float(i), "end": i + 0.5}
+                 for i in range(int(info.duration))]
+        return httpx.Response(200, json={"text": " ".join(w["word"] for w in words),
+                                         "duration": info.duration, "words": words})
+
+    agent = MultiModalAgent("test-key", "http://gateway.test", window_seconds=10.0)
+    agent.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    info = WavInfo(channels=1, sample_width=2, frame_rate=8000, frames=0)
+    audio = encode_wav(info, os.urandom(25 * 8000 * 2))
+    timeline = await agent.transcribe_timestamps(audio, granularity="word")
+    assert len(requests) == 3 and len(timeline) == 25
+    assert list(timeline.starts) == sorted(timeline.starts) and timeline.starts[-1] == 24.0
+    assert timeline.at(13.2).text.endswith("-3")
+    again = await agent.transcribe_timestamps(audio, granularity="word")
+    assert len(requests) == 3 and again.segments() == timeline.segments()
+    await agent.close()
+    print("3. Agent merged 3 windows of word timestamps; cached windows reused")
+
+if __name__ == "__main__":
+    test_transcript_index()
@@ -0,0 +1,89 @@
+import asyncio
+import httpx
+from dns_cache import DNSCache, build_transport
+from multi_modal_agent import MultiModalAgent
+
+def test_warmup():
+    asyncio.run(run_warmup_checks())
+
+async def run_warmup_checks():
+    print("\nTesting connection warm-up:")
+    connections = 0
+
+    async def handle(reader, writer):
+        nonlocal connections
+        connections += 1
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            if not request:
+                break
+            body = b'{"status": "ok"}'
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+
+    async def handle_safely(reader, writer):
+        try:
+            await handle(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_safely, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    # 1. Cache serves repeat lookups until the TTL expires
+    cache = DNSCache(ttl=60)
+    assert await cache.resolve("localhost", port) == await cache.resolve("localhost", port)
+    assert cache.misses == 1 and cache.hits == 1
+    expired = DNSCache(ttl=0)
+    await expired.resolve("localhost", port)
+    await expired.resolve("localhost", port)
+    assert expired.misses == 2
+    print("1. DNS cache TTL OK")
+
+    # 2. Warm-up resolves once and pre-opens the requested connections
+    agent = MultiModalAgent("test-key", f"http://localhost:{port}/v1")
+    agent.http_client = httpx.AsyncClient(transport=build_transport(agent.dns_cache))
+    result = await agent.warmup(connections=3)
+    assert result['health'] == [200, 200, 200]
+    assert connections == 3 and agent.dns_cache.misses == 1
+    print(f"2. Warm-up opened {connections} connections")
+
+    # 3. Later requests reuse both the pooled connections and the cached addresses
+    response = await agent.http_client.get(f"http://localhost:{port}/health")
+    assert response.status_code == 200 and connections == 3
+    print("3. First real request reused a warm connection")
+
+    # 4. Unreachable gateways are reported, not raised
+    dead = MultiModalAgent("test-key", "http://127.0.0.1:9")
+    dead.http_client = httpx.AsyncClient(transport=build_transport(dead.dns_cache))
+    result = await dead.warmup(connections=1)
+    assert isinstance(result['health'][0], str)
+    print("4. Failed probe reported")
+
+    # 5. A transport without the expected pool fails loudly instead of skipping the cache
+    original = httpx.AsyncHTTPTransport.__init__
+
+    def without_pool(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        self._pool = object()
+
+    httpx.AsyncHTTPTransport.__init__ = without_pool
+    try:
+        build_transport(DNSCache())
+        raise AssertionError("missing network backend went unnoticed")
+    except RuntimeError as e:
+        assert "DNS cache" in str(e)
+    finally:
+        httpx.AsyncHTTPTransport.__init__ = original
+    print("5. Unsupported httpx internals reported")
+
+    await agent.close()
+    await dead.close()
+    server.close()
+    await server.wait_closed()
+
+if __name__ == "__main__":
+    test_warmup()
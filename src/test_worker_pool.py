@@ -0,0 +1,41 @@
+import asyncio
+import base64
+import os
+import tempfile
+import wave
+from pathlib import Path
+import numpy as np
+from worker_pool import WorkerPool, SharedPCMBuffer
+from create_speech_audio import create_speech_audio_async
+
+def test_worker_pool():
+    asyncio.run(run_worker_pool_checks())
+
+async def run_worker_pool_checks():
+    print("\nTesting worker pool offloading:")
+
+    with tempfile.TemporaryDirectory() as tmp, WorkerPool(max_processes=2) as pool:
+        # 1. Base64 decode in a worker process
+        payload = os.urandom(256 * 1024)
+        decoded = await pool.run_cpu(base64.b64decode, base64.b64encode(payload).decode())
+        assert decoded == payload
+        print(f"1. Decoded {len(decoded)} bytes in worker process")
+
+        # 2. Shared PCM buffer visible across processes
+        with SharedPCMBuffer.create(1000, channels=2) as buffer:
+            buffer.array()[:] = np.arange(2000, dtype=np.int16).reshape(1000, 2)
+            attached = SharedPCMBuffer.attach(buffer.descriptor)
+            assert attached.array()[999, 1] == 1999
+            attached.close()
+        print("2. Shared PCM buffer round-trip OK")
+
+        # 3. Parallel speech synthesis matches the expected length
+        wav_path = str(Path(tmp) / "speech.wav")
+        await create_speech_audio_async(wav_path, duration=3.0, pool=pool, segment_seconds=1.0)
+        with wave.open(wav_path, 'rb') as wav_file:
+            assert wav_file.getnframes() == 48000
+            assert wav_file.getframerate() == 16000
+        print("3. Parallel speech synthesis OK")
+
+if __name__ == "__main__":
+    test_worker_pool()
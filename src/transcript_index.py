@@ -0,0 +1,180 @@
+"""Timestamped transcripts in a compact columnar file.
+
+Layout (little endian)::
+
+    b"TIDX" | version u32 | count u32 | text_bytes u64
+    starts  float64[count]
+    ends    float64[count]
+    offsets uint64[count + 1]   character offsets into the text table
+    text    UTF-8, all segment texts joined by single spaces
+
+Seeking by time is a binary search over ``starts``; substring search runs
+over the single text table and maps hits back to segments by binary
+search over ``offsets``.
+"""
+import bisect
+import re
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+MAGIC = b"TIDX"
+VERSION = 1
+_HEADER = struct.Struct("<4sIIQ")
+
+class Segment(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+def segments_from_verbose(result: Dict[str, Any], granularity: str = "segment",
+                          offset: float = 0.0, limit: Optional[float] = None) -> List[Segment]:
+    """Segments (or words) of a ``verbose_json`` transcription, shifted by ``offset`` seconds.
+
+    ``limit`` is the window length: timestamps past it are clamped, since
+    the model sometimes runs a segment slightly past the end of the audio.
+    """
+    key = "words" if granularity == "word" else "segments"
+    text_key = "word" if granularity == "word" else "text"
+    segments = []
+    for item in result.get(key) or []:
+        text = (item.get(text_key) or "").strip()
+        if not text:
+            continue
+        start, end = float(item["start"]), float(item["end"])
+        if limit is not None:
+            start, end = min(start, limit), min(end, limit)
+        segments.append(Segment(offset + start, offset + max(start, end), text))
+    if not segments and (result.get("text") or "").strip():
+        # No timestamps returned: keep the text, spanning the whole window
+        end = limit if limit is not None else float(result.get("duration") or 0.0)
+        segments.append(Segment(offset, offset + end, result["text"].strip()))
+    return segments
+
+def merge_windows(windows: Iterable[Sequence[Segment]]) -> List[Segment]:
+    """Concatenate per-window segments (already offset) into one monotonic timeline."""
+    merged: List[Segment] = []
+    for segments in windows:
+        for segment in sorted(segments, key=lambda s: s.start):
+            if merged and segment.start < merged[-1].end:
+                # Overlap at a window boundary: start where the previous segment ended
+                start = merged[-1].end
+                segment = Segment(start, max(start, segment.end), segment.text)
+            merged.append(segment)
+    return merged
+
+class TranscriptIndex:
+    """Segments stored column-wise: start times, end times and a shared text table."""
+
+    def __init__(self, starts: Sequence[float], ends: Sequence[float], offsets: Sequence[int], text: str):
+        self.starts = array("d", starts)
+        self.ends = array("d", ends)
+        self.offsets = array("Q", offsets)
+        self.text = text
+
+    @classmethod
+    def from_segments(cls, segments: Sequence[Segment]) -> "TranscriptIndex":
+        offsets = [0]
+        for segment in segments:
+            offsets.append(offsets[-1] + len(segment.text) + 1)
+        offsets[-1] = max(0, offsets[-1] - 1) if segments else 0
+        return cls([s.start for s in segments], [s.end for s in segments], offsets,
+                   " ".join(s.text for s in segments))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> Segment:
+        return Segment(self.starts[i], self.ends[i], self._text(i))
+
+    def _text(self, i: int) -> str:
+        end = self.offsets[i + 1] - (1 if i + 1 < len(self) else 0)
+        return self.text[self.offsets[i]:end]
+
+    @property
+    def duration(self) -> float:
+        return max(self.ends) if len(self) else 0.0
+
+    def segments(self) -> List[Segment]:
+        return [self[i] for i in range(len(self))]
+
+    def at(self, seconds: float) -> Optional[Segment]:
+        """The segment being spoken at ``seconds`` (or the last one before it)."""
+        i = bisect.bisect_right(self.starts, seconds) - 1
+        return self[i] if i >= 0 else None
+
+    def between(self, start: float, end: float) -> List[Segment]:
+        """Segments starting in ``[start, end)``."""
+        first = bisect.bisect_left(self.starts, start)
+        last = bisect.bisect_left(self.starts, end)
+        return [self[i] for i in range(first, last)]
+
+    def search(self, query: str, case_sensitive: bool = False, limit: int = 100) -> List[Dict[str, Any]]:
+        """Where ``query`` was said: one hit per occurrence, with the time span it covers."""
+        if not query or not len(self):
+            return []
+        # A literal pattern; IGNORECASE keeps match positions aligned with the text table
+        pattern = re.compile(re.escape(query), 0 if case_sensitive else re.IGNORECASE)
+        hits = []
+        for match in pattern.finditer(self.text):
+            first = bisect.bisect_right(self.offsets, match.start()) - 1
+            last = bisect.bisect_right(self.offsets, match.end() - 1) - 1
+            first, last = min(first, len(self) - 1), min(last, len(self) - 1)
+            hits.append({'start': self.starts[first], 'end': self.ends[last],
+                         'segment': first, 'text': self._text(first)})
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def to_bytes(self) -> bytes:
+        text = self.text.encode("utf-8")
+        columns = [array("d", self.starts), array("d", self.ends), array("Q", self.offsets)]
+        if sys.byteorder != "little":
+            for column in columns:
+                column.byteswap()
+        return b"".join([_HEADER.pack(MAGIC, VERSION, len(self), len(text)),
+                         *[column.tobytes() for column in columns], text])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TranscriptIndex":
+        magic, version, count, text_bytes = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a transcript index file")
+        view = memoryview(data)
+        position = _HEADER.size
+        columns: List[array] = []
+        for typecode, length in (("d", count), ("d", count), ("Q", count + 1)):
+            column = array(typecode)
+            column.frombytes(view[position:position + length * column.itemsize])
+            if sys.byteorder != "little":
+                column.byteswap()
+            columns.append(column)
+            position += length * column.itemsize
+        text = bytes(view[position:position + text_bytes]).decode("utf-8")
+        return cls(*columns, text)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "TranscriptIndex":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'duration': self.duration,
+                'segments': [segment._asdict() for segment in self.segments()]}
+
+def window_segments(windows: Iterable[Tuple[float, Optional[float], Dict[str, Any]]],
+                    granularity: str = "segment") -> List[Segment]:
+    """Merge ``(window_start, window_end, verbose_json)`` results into one timeline.
+
+    ``window_end`` may be None when the window length is unknown.
+    """
+    return merge_windows(
+        segments_from_verbose(result, granularity, offset=start,
+                              limit=(end - start) if end is not None else None)
+        for start, end, result in windows
+    )
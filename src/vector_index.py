@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: the writer lock is not enforced
+    fcntl = None
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+class VectorIndex:
+    """On-disk cosine-similarity index over embedding vectors.
+
+    Vectors are L2-normalized and kept in ``vectors.npy``, opened as a
+    memory map so a large index costs page cache rather than heap; payloads
+    live alongside in ``items.jsonl``. Capacity doubles when full.
+
+    Search is exact (one matrix-vector product over every row) or
+    approximate: each vector also gets a ``bits``-bit random-hyperplane
+    signature, rows are ranked by Hamming distance between signatures, and
+    only the best ``candidates`` rows are read back and scored exactly.
+
+    One process writes an index at a time: the first ``add`` takes an
+    exclusive lock on ``lock`` in the index directory, and ``add`` in a
+    second process raises RuntimeError. Processes that only search may
+    share the directory but do not see rows added after they opened it.
+    """
+
+    def __init__(self, path: str, bits: int = 64, seed: int = 0, initial_capacity: int = 1024):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.bits = bits
+        self.seed = seed
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self.dim: Optional[int] = None
+        self.items: List[Dict[str, Any]] = []
+        self._vectors = None
+        self._signatures = None
+        self._planes = None
+        self._writer_lock = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.path / "meta.json"
+
+    @property
+    def _vector_file(self) -> Path:
+        return self.path / "vectors.npy"
+
+    @property
+    def _items_file(self) -> Path:
+        return self.path / "items.jsonl"
+
+    def _load(self):
+        if not self._meta_file.exists():
+            return
+        import numpy as np
+
+        meta = json.loads(self._meta_file.read_text())
+        self.bits, self.seed = meta["bits"], meta["seed"]
+        self._init_planes(meta["dim"])
+        if not self._vector_file.exists():
+            # Interrupted before the first rows landed: start empty
+            return
+        if self._items_file.exists():
+            with open(self._items_file) as f:
+                self.items = [json.loads(line) for line in f if line.strip()]
+        # Rows past the last item line belong to an interrupted add and are overwritten later
+        self._vectors = np.load(self._vector_file, mmap_mode="r+")
+        self.items = self.items[:self._vectors.shape[0]]
+        self._signatures = self._signature(self._vectors[:len(self.items)])
+
+    def _lock_writer(self):
+        if self._writer_lock is not None or fcntl is None:
+            return
+        lock = open(self.path / "lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            raise RuntimeError(f"Vector index {self.path} is being written by another process") from None
+        self._writer_lock = lock
+
+    def close(self):
+        """Release the writer lock; the index stays usable for searches."""
+        if self._writer_lock is not None:
+            self._writer_lock.close()
+            self._writer_lock = None
+
+    def _init_planes(self, dim: int):
+        import numpy as np
+
+        self.dim = dim
+        rng = np.random.default_rng(self.seed)
+        self._planes = rng.standard_normal((dim, self.bits)).astype(np.float32)
+
+    def _signature(self, vectors):
+        import numpy as np
+        return np.packbits(vectors @ self._planes > 0, axis=1)
+
+    @staticmethod
+    def _normalize(vectors):
+        import numpy as np
+
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _ensure_capacity(self, needed: int):
+        import numpy as np
+
+        if self._vectors is not None and self._vectors.shape[0] >= needed:
+            return
+        capacity = max(self.initial_capacity, needed,
+                       2 * (self._vectors.shape[0] if self._vectors is not None else 0))
+        temp = self._vector_file.with_suffix(".tmp.npy")
+        grown = np.lib.format.open_memmap(temp, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        if self._vectors is not None:
+            grown[:len(self.items)] = self._vectors[:len(self.items)]
+        grown.flush()
+        del grown
+        self._vectors = None
+        os.replace(temp, self._vector_file)
+        self._vectors = np.load(self._vector_file, mmap_mode="r+")
+
+    def add(self, vectors, payloads: Sequence[Dict[str, Any]]) -> List[int]:
+        """Append vectors with their payloads; returns the new row ids."""
+        import numpy as np
+
+        vectors = self._normalize(vectors)
+        if len(vectors) != len(payloads):
+            raise ValueError("Need exactly one payload per vector")
+        with self._lock:
+            self._lock_writer()
+            if self.dim is None:
+                self._init_planes(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            start = len(self.items)
+            self._ensure_capacity(start + len(vectors))
+            self._vectors[start:start + len(vectors)] = vectors
+            self._vectors.flush()
+            if not self._meta_file.exists():
+                self._meta_file.write_text(json.dumps({"dim": self.dim, "bits": self.bits, "seed": self.seed}))
+            # The items file is the commit point: rows without an item line are ignored on load
+            with open(self._items_file, "a") as f:
+                for payload in payloads:
+                    f.write(json.dumps(payload, default=str) + "\n")
+            signatures = self._signature(vectors)
+            self._signatures = signatures if self._signatures is None else np.vstack([self._signatures, signatures])
+            self.items.extend(payloads)
+            return list(range(start, start + len(vectors)))
+
+    def search(self, query, k: int = 5, exact: bool = True, candidates: int = 256) -> List[Dict[str, Any]]:
+        """The ``k`` most similar items as ``{'id', 'score', 'payload'}``, best first."""
+        import numpy as np
+
+        with self._lock:
+            count = len(self.items)
+            if count == 0:
+                return []
+            query = self._normalize(query)[0]
+            if exact or count <= candidates:
+                rows = np.arange(count)
+                scores = self._vectors[:count] @ query
+            else:
+                distances = np.unpackbits(
+                    self._signatures[:count] ^ self._signature(query[None, :]), axis=1
+                ).sum(axis=1)
+                rows = np.sort(np.argpartition(distances, candidates)[:candidates])
+                scores = self._vectors[rows] @ query
+            top = np.argsort(-scores)[:k]
+            return [{'id': int(rows[i]), 'score': float(scores[i]), 'payload': self.items[rows[i]]}
+                    for i in top]
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from audio_windows import AudioWindow, WavInfo
+
+def window_key(model: str, info: WavInfo, window: AudioWindow) -> str:
+    """Fingerprint of a window's PCM and format; independent of where the window sits in the file."""
+    digest = hashlib.sha256()
+    digest.update(f"{model}|{info.channels}|{info.sample_width}|{info.frame_rate}|".encode())
+    digest.update(window.pcm)
+    return digest.hexdigest()
+
+class WindowCache:
+    """LRU map from window fingerprints to transcription results.
+
+    With ``path`` set, the cache is loaded from and saved to a JSON file so
+    re-submissions from later processes reuse it too.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 10000):
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._version = 0  # Bumped by every snapshot
+        self._written = 0  # Version of the snapshot on disk
+        self._write_lock = threading.Lock()
+        if self.path and self.path.exists():
+            self._entries.update(json.loads(self.path.read_text()))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.dirty = True
+
+    def snapshot(self) -> Optional[Tuple[int, dict]]:
+        """``(version, entries)`` to write, or None when there's nothing new; marks the cache clean.
+
+        Take it on the thread that calls ``put`` and hand it to ``write``
+        elsewhere, so a write never iterates over entries being changed and
+        entries put meanwhile are saved next time.
+        """
+        if not self.path or not self.dirty:
+            return None
+        self.dirty = False
+        self._version += 1
+        return self._version, dict(self._entries)
+
+    def write(self, snapshot: Tuple[int, dict]) -> bool:
+        """Write a ``snapshot`` to ``path``; safe to call from a worker thread.
+
+        Writes are serialized, and a snapshot older than the one already on
+        disk is skipped, so writes finishing out of order never replace
+        newer entries. Returns whether the file was written.
+        """
+        version, data = snapshot
+        with self._write_lock:
+            if version <= self._written:
+                return False
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                temp = self.path.with_suffix(self.path.suffix + f".{uuid.uuid4().hex}.tmp")
+                temp.write_text(json.dumps(data))
+                os.replace(temp, self.path)
+            except BaseException:
+                self.dirty = True  # Try again on the next save
+                raise
+            self._written = version
+            return True
+
+    def save(self):
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            self.write(snapshot)
@@ -0,0 +1,113 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional, Tuple
+
+class SharedPCMBuffer:
+    """PCM sample buffer backed by shared memory so worker processes can
+    read and write samples without pickling the array."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, num_samples: int,
+                 channels: int = 1, dtype: str = "int16", owner: bool = False):
+        self.shm = shm
+        self.num_samples = num_samples
+        self.channels = channels
+        self.dtype = dtype
+        self.owner = owner
+
+    @classmethod
+    def create(cls, num_samples: int, channels: int = 1, dtype: str = "int16") -> "SharedPCMBuffer":
+        """Allocate a new zeroed buffer."""
+        import numpy as np
+        size = max(1, num_samples * channels * np.dtype(dtype).itemsize)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        return cls(shm, num_samples, channels, dtype, owner=True)
+
+    @classmethod
+    def attach(cls, descriptor: Tuple[str, int, int, str]) -> "SharedPCMBuffer":
+        """Attach to a buffer created in another process."""
+        name, num_samples, channels, dtype = descriptor
+        shm = shared_memory.SharedMemory(name=name)
+        # Only the creating process owns the segment; stop a worker's own
+        # resource tracker from unlinking it when the worker exits (bpo-39959)
+        if multiprocessing.parent_process() is not None:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, num_samples, channels, dtype)
+
+    @property
+    def descriptor(self) -> Tuple[str, int, int, str]:
+        """Picklable handle to pass to worker processes."""
+        return (self.shm.name, self.num_samples, self.channels, self.dtype)
+
+    def array(self):
+        """NumPy view over the shared samples, shaped (num_samples, channels)."""
+        import numpy as np
+        return np.ndarray((self.num_samples, self.channels), dtype=self.dtype, buffer=self.shm.buf)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_file_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class WorkerPool:
+    """Offloads CPU-bound work to a process pool and blocking I/O to a thread
+    pool so the asyncio event loop stays free for network traffic."""
+
+    def __init__(self, max_processes: Optional[int] = None, max_threads: Optional[int] = None):
+        self.max_processes = max_processes or os.cpu_count() or 1
+        self.max_threads = max_threads or min(32, (os.cpu_count() or 1) + 4)
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        # Created on first use so agents that never post-process don't fork workers
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.max_processes)
+        return self._process_pool
+
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.max_threads,
+                                                   thread_name_prefix="worker-pool")
+        return self._thread_pool
+
+    async def run_cpu(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a picklable function in a worker process."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.process_pool, fn, *args)
+
+    async def run_io(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking function (file I/O, GIL-releasing NumPy code) in a thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.thread_pool, fn, *args)
+
+    def shutdown(self, wait: bool = True):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait)
+            self._process_pool = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=wait)
+            self._thread_pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()